@@ -0,0 +1,185 @@
+from typing import Dict, List, Optional
+import re
+import unicodedata
+
+class AnswerClassifier:
+    """Deterministic YES/NO classifier for symptom answers, used before the LLM
+
+    Only settles answers that are unambiguous: short replies made of known
+    affirmative/negative words, negations and fillers. A YES needs a yes-word
+    or a statement such as "I have". Anything with a hedge, a contradiction,
+    a question back or an unknown word is left to the LLM (classify returns None).
+    """
+
+    YES = "YES"
+    NO = "NO"
+
+    # Longer replies usually carry context the LLM should read
+    MAX_TOKENS = 8
+
+    YES_WORDS = {
+        "yes", "yeah", "yea", "yep", "yup", "ya", "yah", "yeh", "ye", "aye", "y",
+        "sure", "correct", "true", "affirmative",
+        # Common typos
+        "yse", "ys", "yss", "yas", "ues", "tes", "yws", "yrs", "yez", "yesh", "yeas",
+    }
+    NO_WORDS = {
+        "no", "nope", "nah", "naw", "n", "none", "nothing", "negative",
+        # Common typos
+        "nop", "mo",
+    }
+    NEGATORS = {"not", "never", "neither", "nor"}
+    # Affirmative on their own ("definitely"), negative when negated ("absolutely not")
+    AFFIRMATIVES = {"definitely", "absolutely", "certainly", "totally", "indeed"}
+    AFFIRMATIVE_PHRASES = ("of course",)
+    # Strengthen a yes or no but mean nothing alone ("very", "much", "for")
+    INTENSIFIERS = {"really", "very", "much", "course", "of", "for", "quite", "exactly"}
+    # Words that carry no polarity on their own
+    FILLERS = {
+        "i", "it", "that", "this", "so", "well", "um", "uh", "hmm", "the", "me",
+        "my", "felt", "feel", "feeling", "bothered", "experienced", "at", "all",
+    }
+    # "I have", "I did", "it has been": affirmative unless negated, and only
+    # after a subject ("am I", "was it" are questions)
+    AUXILIARIES = {"have", "has", "had", "been", "did", "do", "does", "was", "were", "am", "is", "are"}
+    SUBJECTS = {"i", "it"}
+    # Any of these means the answer needs a closer reading
+    HEDGES = {
+        "maybe", "perhaps", "possibly", "unsure", "idk", "dunno", "depends",
+        "sometimes", "occasionally", "little", "bit", "kinda", "sorta", "kind",
+        "sort", "but", "though", "although", "except", "probably", "somewhat",
+        "mostly", "rarely", "hardly", "barely", "why", "what", "mean", "?",
+    }
+    HEDGE_PHRASES = ("not sure", "don't know", "do not know", "no idea", "not certain")
+
+    CONTRACTIONS = {
+        "n't": " not",
+        "'ve": " have",
+        "'m": " am",
+        "'s": " is",
+    }
+
+    _APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+    _NON_WORD = re.compile(r"[^a-z0-9'?\s]+")
+    _QUESTION = re.compile(r"\?")
+    _REPEATS = re.compile(r"(.)\1+")
+
+    def __init__(self):
+        self.fast_path = 0
+        self.fallbacks = 0
+        self.labels = {self.YES: 0, self.NO: 0}
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """Lowercase, fold Unicode and punctuation, keep apostrophes and '?'"""
+        text = unicodedata.normalize("NFKC", text).lower().translate(cls._APOSTROPHES)
+        text = cls._QUESTION.sub(" ? ", text)
+        return " ".join(cls._NON_WORD.sub(" ", text).split())
+
+    def tokenize(self, text: str) -> List[str]:
+        """Split a normalized reply into words with contractions expanded"""
+        for short, full in self.CONTRACTIONS.items():
+            text = text.replace(short, full)
+        return [token.replace("'", "") for token in text.split()]
+
+    def _lookup(self, token: str) -> Optional[str]:
+        for word in (token, self._REPEATS.sub(r"\1", token)):
+            if word in self.NO_WORDS:
+                return "no"
+            if word in self.NEGATORS:
+                return "negator"
+            if word in self.YES_WORDS:
+                return "yes"
+            if word in self.AFFIRMATIVES:
+                return "affirmative"
+            if word in self.HEDGES:
+                return "hedge"
+            if word in self.INTENSIFIERS:
+                return "intensifier"
+            if word in self.AUXILIARIES:
+                return "auxiliary"
+            if word in self.FILLERS:
+                return "filler"
+        return None
+
+    def _decide(self, text: str) -> Optional[str]:
+        normalized = self.normalize(text)
+        if not normalized or any(phrase in normalized for phrase in self.HEDGE_PHRASES):
+            return None
+
+        tokens = self.tokenize(normalized)
+        if len(tokens) > self.MAX_TOKENS:
+            return None
+
+        yes = no = negators = auxiliaries = 0
+        affirmatives = sum(phrase in normalized for phrase in self.AFFIRMATIVE_PHRASES)
+        for token in tokens:
+            kind = self._lookup(token)
+            if kind is None or kind == "hedge":
+                return None
+            if kind == "yes":
+                yes += 1
+            elif kind == "no":
+                no += 1
+            elif kind == "negator":
+                negators += 1
+            elif kind == "affirmative":
+                affirmatives += 1
+            elif kind == "auxiliary":
+                auxiliaries += 1
+
+        if yes and (no or negators):
+            return None  # "yes and no", "yes, not at all"
+        if no and auxiliaries and not negators:
+            return None  # "no, I have"
+        if auxiliaries and self._inverted(tokens):
+            return None  # "am I", "was it": a question back
+        if (no or negators) and "much" in tokens:
+            return None  # "not much", "nothing much" usually mean a little
+        if no or negators:
+            return self.NO  # "no", "not really", "absolutely not", "I haven't"
+        if yes or affirmatives:
+            return self.YES  # "yes", "yeah definitely", "of course"
+        if auxiliaries and self._statement(tokens):
+            return self.YES  # "I have", "I did", "it has"
+        return None
+
+    def _statement(self, tokens: List[str]) -> bool:
+        """Whether a subject is followed by an auxiliary ("I have", "it really has")"""
+        for index, token in enumerate(tokens):
+            if token in self.SUBJECTS:
+                following = [t for t in tokens[index + 1:] if self._lookup(t) != "intensifier"]
+                if following and self._lookup(following[0]) == "auxiliary":
+                    return True
+        return False
+
+    def _inverted(self, tokens: List[str]) -> bool:
+        """Whether an auxiliary comes right before a subject ("am I", "was it")"""
+        return any(self._lookup(token) == "auxiliary" and following in self.SUBJECTS
+                   for token, following in zip(tokens, tokens[1:]))
+
+    def classify(self, text: str) -> Optional[str]:
+        """
+        Classify a symptom answer locally
+
+        Returns:
+            "YES" or "NO" when the answer is clear, None when the LLM should decide
+        """
+        label = self._decide(text)
+        if label is None:
+            self.fallbacks += 1
+        else:
+            self.fast_path += 1
+            self.labels[label] += 1
+        return label
+
+    def stats(self) -> Dict:
+        """Get fast-path and fallback counts and rates"""
+        total = self.fast_path + self.fallbacks
+        return {
+            "fast_path": self.fast_path,
+            "fallbacks": self.fallbacks,
+            "fast_path_rate": self.fast_path / total if total else 0.0,
+            "fallback_rate": self.fallbacks / total if total else 0.0,
+            "labels": dict(self.labels)
+        }
@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+
+from .cache import LRUCache
+
+# Rough Llama-3 tokenizer: a token per punctuation mark and per ~4 letters of a word
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Role markers and separators the chat template adds around each message
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+class TokenEstimator:
+    """Local token count estimate for prompt text, cached per message"""
+
+    def __init__(self, maxsize: int = 8192):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def count(self, text: str) -> int:
+        """Estimated tokens in a piece of text"""
+        tokens = self._cache.get(text)
+        if tokens is None:
+            tokens = sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text))
+            self._cache.set(text, tokens)
+        return tokens
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        """Estimated tokens a chat message takes in the prompt"""
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+    def stats(self) -> Dict:
+        """Get hit/miss/eviction counters"""
+        return self._cache.stats()
+
+class ContextBuilder:
+    """
+    Fits conversation history into a prompt token budget
+
+    The newest messages are kept word for word, as many as fit next to the
+    system prompt, the current message and the session's summary. Older
+    messages are left to the session's rolling summary.
+    """
+
+    def __init__(self, token_budget: int = 1500, summary_budget: int = 300,
+                 estimator: Optional[TokenEstimator] = None):
+        """
+        Args:
+            token_budget: Estimated prompt tokens allowed for the whole request
+            summary_budget: Most tokens the summary may take of that budget
+        """
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.estimator = estimator or TokenEstimator()
+
+    def build(self, system_prompt: str, user_message: str, messages: List[Dict],
+              summary: Optional[str] = None) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Pick the history to send with a request
+
+        Args:
+            messages: Stored messages newer than the summary, oldest first
+                (chat_messages rows with message and sender)
+            summary: The session's rolling summary, if it has one
+
+        Returns:
+            (conversation_history, kept) where kept is how many of the newest
+            messages are in it; the summary, if it fits, comes first
+        """
+        estimator = self.estimator
+        remaining = (self.token_budget
+                     - estimator.count_message({"content": system_prompt})
+                     - estimator.count_message({"content": user_message}))
+
+        history = []
+        if summary:
+            summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+            tokens = estimator.count_message(summary_message)
+            if tokens <= min(self.summary_budget, remaining):
+                history.append(summary_message)
+                remaining -= tokens
+
+        kept = []
+        for row in reversed(messages):
+            message = to_chat_message(row)
+            tokens = estimator.count_message(message)
+            if tokens > remaining:
+                break
+            kept.append(message)
+            remaining -= tokens
+
+        return history + kept[::-1], len(kept)
+
+def to_chat_message(row: Dict) -> Dict[str, str]:
+    """A chat_messages row as an LLM chat message"""
+    return {"role": "user" if row["sender"] == "user" else "assistant", "content": row["message"]}
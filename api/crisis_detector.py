@@ -0,0 +1,148 @@
+from collections import deque
+from typing import Dict, Iterable, List
+import unicodedata
+
+class CrisisDetector:
+    """Aho-Corasick matcher for crisis phrases
+
+    The phrase list is compiled once into an automaton, so scanning a message
+    costs one pass over its characters however many phrases there are.
+    Phrases and messages go through the same normalization (Unicode
+    compatibility folding, case folding, accents removed, punctuation/symbols turned into spaces,
+    whitespace collapsed), so "Self-harm", "self  harm" and "SELF HARM" all
+    match "self harm". Matching is by substring, like the original check.
+    """
+
+    # Up to this many phrases, str.__contains__ per phrase (in C) beats walking
+    # the automaton character by character in Python. From benchmarks.bench_crisis:
+    # at 100 phrases the automaton takes ~100 us on a 500-char message against
+    # ~35 us for the scan; by 400 it is at least as fast for 3-1900 chars
+    SCAN_THRESHOLD = 400
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases = []
+        self._goto = [{}]       # state -> {char: next state}
+        self._fail = [0]        # state -> fallback state
+        self._output = [()]     # state -> indexes of phrases ending here (incl. via fail links)
+
+        seen = set()
+        for phrase in phrases:
+            normalized = self.normalize(phrase)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                self._add(normalized, len(self.phrases))
+                self.phrases.append(normalized)
+
+        self._build()
+        self._alphabet = frozenset(ch for edges in self._goto for ch in edges)
+
+    @classmethod
+    def from_file(cls, path: str, extra: Iterable[str] = ()) -> "CrisisDetector":
+        """Build from a UTF-8 file with one phrase per line ('#' starts a comment)"""
+        phrases = list(extra)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    phrases.append(line)
+        return cls(phrases)
+
+    # Punctuation, symbols and control characters in the ASCII range
+    _ASCII_SEPARATORS = str.maketrans({
+        chr(code): " " for code in range(128) if not chr(code).isalnum()
+    })
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """Fold case, accents, punctuation and whitespace"""
+        if text.isascii():
+            return " ".join(text.lower().translate(cls._ASCII_SEPARATORS).split())
+
+        text = unicodedata.normalize("NFKD", text.casefold())
+        chars = []
+        for ch in text:
+            category = unicodedata.category(ch)
+            if category == "Mn":
+                continue  # combining accent
+            if category[0] in "PSZC":
+                chars.append(" ")
+            else:
+                chars.append(ch)
+        return " ".join(unicodedata.normalize("NFC", "".join(chars)).split())
+
+    def _add(self, phrase: str, index: int):
+        state = 0
+        for ch in phrase:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state] = (index,)
+
+    def _build(self):
+        """Compute failure links breadth-first and propagate outputs along them"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def _scan(self, text: str, stop_at_first: bool):
+        """Yield (end position, phrase indexes) for matches in normalized text"""
+        goto, fail, output, alphabet = self._goto, self._fail, self._output, self._alphabet
+        state = 0
+        for position, ch in enumerate(text):
+            if ch not in alphabet:
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            matches = output[state]
+            if matches:
+                yield position, matches
+                if stop_at_first:
+                    return
+
+    def _contains_normalized(self, text: str) -> bool:
+        if len(self.phrases) <= self.SCAN_THRESHOLD:
+            return any(phrase in text for phrase in self.phrases)
+        for _ in self._scan(text, stop_at_first=True):
+            return True
+        return False
+
+    def contains(self, text: str) -> bool:
+        """True if the message contains any phrase"""
+        return self._contains_normalized(self.normalize(text))
+
+    def find(self, text: str) -> List[str]:
+        """Phrases found in the message, in order of where they end"""
+        found = []
+        for _, indexes in self._scan(self.normalize(text), stop_at_first=False):
+            for index in indexes:
+                phrase = self.phrases[index]
+                if phrase not in found:
+                    found.append(phrase)
+        return found
+
+    def contains_many(self, texts: Iterable[str]) -> List[bool]:
+        """Batch version of contains, e.g. for re-screening stored conversations"""
+        return [self._contains_normalized(self.normalize(text)) for text in texts]
+
+    def stats(self) -> Dict:
+        """Size of the compiled automaton"""
+        return {
+            "phrases": len(self.phrases),
+            "states": len(self._goto),
+            "alphabet": len(self._alphabet)
+        }
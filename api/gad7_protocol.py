@@ -1,55 +1,42 @@
 from typing import Optional, Dict, List
 from datetime import datetime
+import base64
 import json
+import struct
+
+from . import instruments
+from .crisis_detector import CrisisDetector
+from .instruments import GAD7
 
 class GAD7Protocol:
-    """Manages GAD-7 conversation flow and scoring"""
+    """Per-session screening state, with GAD-7 scoring and messages
+
+    The flow itself is driven by protocol_engine for any instrument.
+    """
+
+    __slots__ = (
+        "current_question", "consent_given", "screening_passed", "screening_step",
+        "responses", "awaiting_frequency", "last_question_answered",
+        "confusion_count", "total_score", "completed", "version", "_clean"
+    )
+
+    # Fields stored in protocol_state
+    PERSISTED_FIELDS = (
+        "current_question", "consent_given", "screening_passed", "screening_step",
+        "responses", "awaiting_frequency", "confusion_count", "total_score", "completed"
+    )
+
+    # Stored protocol_state format: "g7:1:" + base64 of the packed fields below.
+    # States without the prefix are the original JSON documents.
+    STATE_PREFIX = "g7:1:"
+    # current_question, screening_step, flags, confusion_count, total_score, response count
+    _STATE_HEADER = struct.Struct("<BBBHHB")
+    # question number, score
+    _STATE_RESPONSE = struct.Struct("<BB")
+    _FLAGS = ("consent_given", "screening_passed", "awaiting_frequency", "completed")
     
     # GAD-7 Questions
-    QUESTIONS = [
-        {
-            "number": 1,
-            "text": "Over the last 2 weeks, have you been bothered by feeling nervous, anxious, or on edge?",
-            "clarification": "'Nervous or on edge' means feeling restless, 'jumpy,' or easily startled. Over the last 2 weeks, have you been bothered by that feeling?",
-            "examples": "Examples might include: feeling like you might spill your drink if someone surprises you, finding it hard to sit still, or feeling a 'pit' in your stomach."
-        },
-        {
-            "number": 2,
-            "text": "Over the last 2 weeks, have you been bothered by not being able to stop or control worrying?",
-            "clarification": "This means having trouble stopping your worried thoughts even when you try. Have you experienced that?",
-            "examples": "For example: lying awake thinking about problems, or your mind racing with worries you can't turn off."
-        },
-        {
-            "number": 3,
-            "text": "Have you been bothered by worrying too much about different things?",
-            "clarification": "This means worrying about multiple different topics or situations. Have you experienced that?",
-            "examples": "For example: worrying about work, family, health, money - many different things at once."
-        },
-        {
-            "number": 4,
-            "text": "Have you had trouble relaxing?",
-            "clarification": "This means finding it difficult to feel calm or at ease. Have you experienced that?",
-            "examples": "For example: feeling tense even when trying to rest, or unable to enjoy leisure time."
-        },
-        {
-            "number": 5,
-            "text": "Have you been bothered by being so restless that it is hard to sit still?",
-            "clarification": "This means feeling the need to move around or fidget. Have you experienced that?",
-            "examples": "For example: pacing, tapping your feet, or feeling uncomfortable staying in one place."
-        },
-        {
-            "number": 6,
-            "text": "Have you been bothered by becoming easily annoyed or irritable?",
-            "clarification": "This means getting upset or frustrated more easily than usual. Have you experienced that?",
-            "examples": "For example: snapping at people, feeling impatient, or being bothered by small things."
-        },
-        {
-            "number": 7,
-            "text": "Have you been bothered by feeling afraid as if something awful might happen?",
-            "clarification": "This means having a sense of dread or fear about the future. Have you experienced that?",
-            "examples": "For example: feeling like something bad is coming, or worrying that disaster is about to strike."
-        }
-    ]
+    QUESTIONS = [question._asdict() for question in GAD7.questions]
     
     FREQUENCY_OPTIONS = {
         "not at all": 0,
@@ -63,9 +50,14 @@ class GAD7Protocol:
         "suicide", "kill myself", "end my life", "want to die",
         "self harm", "hurt myself", "cut myself", "overdose"
     ]
+
+    # Compiled from CRISIS_KEYWORDS on first use and shared by all instances
+    _crisis_detector = None
     
     def __init__(self):
         self.reset()
+        self.version = 0    # chat_sessions.state_version the state was read at
+        self._clean = None  # persisted field values as last stored; None = never stored
     
     def reset(self):
         """Reset protocol state"""
@@ -105,94 +97,153 @@ class GAD7Protocol:
         self.confusion_count = state.get("confusion_count", 0)
         self.total_score = state.get("total_score", 0)
         self.completed = state.get("completed", False)
-    
+
+    def mark_clean(self):
+        """Record the current state as the one stored in chat_sessions"""
+        self._clean = tuple(
+            dict(self.responses) if name == "responses" else getattr(self, name)
+            for name in self.PERSISTED_FIELDS
+        )
+
+    def mark_score_unsaved(self):
+        """Record that chat_sessions.total_score has never been written, so the next turn writes it"""
+        if self._clean is None:
+            return
+        index = self.PERSISTED_FIELDS.index("total_score")
+        self._clean = self._clean[:index] + (None,) + self._clean[index + 1:]
+
+    def dirty_fields(self) -> List[str]:
+        """Persisted fields changed since the state was loaded or last stored"""
+        if self._clean is None:
+            return list(self.PERSISTED_FIELDS)
+        return [
+            name for name, stored in zip(self.PERSISTED_FIELDS, self._clean)
+            if getattr(self, name) != stored
+        ]
+
+    def copy(self) -> "GAD7Protocol":
+        """Get an independent copy of this protocol"""
+        clone = GAD7Protocol.__new__(GAD7Protocol)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.responses = dict(self.responses)
+        return clone
+
+    def dumps(self) -> str:
+        """
+        Encode the state for the protocol_state column
+
+        Uses the compact format when every field fits it, JSON otherwise.
+        """
+        flags = 0
+        for bit, name in enumerate(self._FLAGS):
+            if getattr(self, name):
+                flags |= 1 << bit
+
+        try:
+            packed = [self._STATE_HEADER.pack(
+                self.current_question, self.screening_step, flags,
+                self.confusion_count, self.total_score, len(self.responses)
+            )]
+            for question, score in self.responses.items():
+                packed.append(self._STATE_RESPONSE.pack(int(question), score))
+        except (struct.error, TypeError, ValueError):
+            return json.dumps(self.get_state())
+
+        return self.STATE_PREFIX + base64.b64encode(b"".join(packed)).decode("ascii")
+
+    @classmethod
+    def loads(cls, data: Optional[str]) -> "GAD7Protocol":
+        """Build a protocol from a stored protocol_state (compact or JSON)"""
+        if not data:
+            return cls()
+
+        if not data.startswith(cls.STATE_PREFIX):
+            protocol = cls()
+            protocol.load_state(json.loads(data))
+            protocol.mark_clean()
+            return protocol
+
+        # Set every slot straight from the packed fields instead of going
+        # through __init__/reset() and mark_clean()
+        raw = base64.b64decode(data[len(cls.STATE_PREFIX):])
+        current_question, screening_step, flags, confusion_count, total_score, count = \
+            cls._STATE_HEADER.unpack_from(raw)
+        header = cls._STATE_HEADER.size
+        responses = {str(question): score for question, score
+                     in cls._STATE_RESPONSE.iter_unpack(raw[header:header + 2 * count])}
+        # Bits in _FLAGS order
+        consent_given, screening_passed, awaiting_frequency, completed = (
+            flags & 1 == 1, flags & 2 == 2, flags & 4 == 4, flags & 8 == 8
+        )
+
+        protocol = cls.__new__(cls)
+        protocol.current_question = current_question
+        protocol.consent_given = consent_given
+        protocol.screening_passed = screening_passed
+        protocol.screening_step = screening_step
+        protocol.responses = responses
+        protocol.awaiting_frequency = awaiting_frequency
+        protocol.last_question_answered = False
+        protocol.confusion_count = confusion_count
+        protocol.total_score = total_score
+        protocol.completed = completed
+        protocol.version = 0
+        # Same order as PERSISTED_FIELDS
+        protocol._clean = (current_question, consent_given, screening_passed, screening_step, dict(responses),
+                           awaiting_frequency, confusion_count, total_score, completed)
+        return protocol
+
+    @classmethod
+    def crisis_detector(cls) -> CrisisDetector:
+        """Get the compiled crisis keyword matcher"""
+        if cls._crisis_detector is None:
+            cls.use_crisis_detector(CrisisDetector(cls.CRISIS_KEYWORDS))
+        return cls._crisis_detector
+
+    @classmethod
+    def use_crisis_detector(cls, detector: CrisisDetector):
+        """Replace the crisis matcher, e.g. with one that has extra phrase lists"""
+        GAD7Protocol._crisis_detector = detector
+
     def check_crisis(self, text: str) -> bool:
         """Check if user message contains crisis keywords"""
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in self.CRISIS_KEYWORDS)
+        return self.crisis_detector().contains(text)
     
     def get_age_screening(self) -> str:
         """Get age screening question"""
-        return "Before we begin, I need to confirm: Are you 18 or older?\n\n(Please answer Yes or No)"
-    
+        return instruments.AGE_SCREENING
+
     def get_crisis_screening(self) -> str:
         """Get crisis screening question"""
-        return "Thank you. One more important question: Are you currently in a crisis or feeling actively suicidal?\n\n(Please answer Yes or No)"
-    
+        return instruments.CRISIS_SCREENING
+
     def get_consent_message(self) -> str:
         """Get informed consent message"""
-        return """Thank you for confirming. 
+        return instruments.CONSENT
 
-My purpose is to have a conversation with you. I am not a doctor, and this is not a diagnosis. This is only a screening tool. Your data will be used anonymously for research purposes.
-
-Do you consent to participate? (Please answer Yes or No)"""
-    
     def get_current_question(self) -> Optional[str]:
         """Get the current GAD-7 question"""
-        if 1 <= self.current_question <= 7:
-            return self.QUESTIONS[self.current_question - 1]["text"]
-        return None
-    
+        question = GAD7.question(self.current_question)
+        return question.text if question else None
+
     def get_frequency_question(self) -> str:
         """Get the frequency scoring question"""
-        return """Okay, how often have you been bothered by that over the last 2 weeks?
-
-1. Not at all
-2. Several days
-3. More than half the days
-4. Nearly every day
+        return instruments.FREQUENCY_QUESTION
 
-Please choose 1, 2, 3, or 4."""
-    
     def calculate_severity(self) -> str:
         """Calculate severity level based on total score"""
-        if self.total_score <= 4:
-            return "minimal"
-        elif self.total_score <= 9:
-            return "mild"
-        elif self.total_score <= 14:
-            return "moderate"
-        else:
-            return "severe"
+        return self.severity_for(self.total_score)
+
+    @staticmethod
+    def severity_for(total_score: int) -> str:
+        """Severity level for a total score"""
+        return GAD7.severity(total_score)
     
     def get_completion_message(self) -> str:
         """Get final message with score and recommendations"""
-        severity = self.calculate_severity()
-        
-        base_message = f"""Thank you for completing the GAD-7 screening.
-
-Your total score is: {self.total_score} out of 21
-Severity level: {severity.upper()}
-
-"""
-        
-        if severity == "minimal":
-            return base_message + "Your responses suggest minimal anxiety symptoms. This is a good sign, but remember this is just a screening tool, not a diagnosis."
-        
-        elif severity == "mild":
-            return base_message + "Your responses suggest mild anxiety symptoms. While this screening suggests some anxiety, only a healthcare professional can provide a proper assessment."
-        
-        elif severity == "moderate":
-            return base_message + """Your responses suggest moderate anxiety symptoms. 
-
-**IMPORTANT:** Talking to a qualified professional (like a doctor or counselor) about this could be very important. This screening suggests you may benefit from professional support."""
-        
-        else:  # severe
-            return base_message + """Your responses suggest severe anxiety symptoms.
-
-**IMPORTANT:** Your score is in the 'severe' range. I am not qualified to diagnose, but it is very important that you speak to a healthcare professional soon.
-
-Please consider seeing a doctor or counselor. Here are some resources:
-- 1926 (National Mental Health Helpline, 24/7)
-- Ms Supeshala Rathnayaka (070 2211311)"""
-    
+        return GAD7.completion_message(self.total_score)
+
     def get_crisis_message(self) -> str:
         """Get crisis protocol message"""
-        return """I have detected keywords that indicate you may be in serious distress.
-
-**I am an AI and not a crisis counselor.** Please contact a crisis hotline immediately:
-
-- 1926 (National Mental Health Helpline, 24/7)
-- Ms Supeshala Rathnayaka (070 2211311)
-
-They can help you right now. Your safety is the most important thing."""
\ No newline at end of file
+        return instruments.CRISIS_MESSAGE
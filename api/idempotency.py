@@ -0,0 +1,111 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+
+from .cache import LRUCache
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a request with a different body"""
+
+class IdempotencyStore:
+    """Single-flight table and short-lived result cache for Idempotency-Key requests
+
+    The first request with a key runs; a duplicate that arrives while it is
+    still running waits for the same result, and one that arrives later gets
+    the cached result. Failures are not cached, so a retry after an error
+    runs again. State is per process: duplicates that land on another worker
+    are not deduplicated.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self._results = LRUCache(maxsize=maxsize, ttl=ttl)  # key -> (fingerprint, result)
+        self._inflight: Dict[Hashable, tuple] = {}          # key -> (fingerprint, future)
+        self._tasks = set()
+        self.replays = 0
+        self.joins = 0
+
+    def claim(self, key: Hashable, fingerprint: Hashable) -> Optional[Awaitable]:
+        """
+        Register a request under a key
+
+        Returns:
+            None if the caller owns the key and must resolve() or reject() it,
+            otherwise an awaitable for the original request's result
+
+        Raises:
+            IdempotencyKeyReused: The key belongs to a request with another fingerprint
+        """
+        cached = self._results.get(key)
+        if cached is not None:
+            self._check(fingerprint, cached[0])
+            self.replays += 1
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(cached[1])
+            return future
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._check(fingerprint, inflight[0])
+            self.joins += 1
+            # Shielded so a waiter that goes away does not cancel the original
+            return asyncio.shield(inflight[1])
+
+        self._inflight[key] = (fingerprint, asyncio.get_running_loop().create_future())
+        return None
+
+    def resolve(self, key: Hashable, result: Any):
+        """Publish the owner's result to waiters and cache it"""
+        fingerprint, future = self._inflight.pop(key)
+        self._results.set(key, (fingerprint, result))
+        if not future.done():
+            future.set_result(result)
+
+    def reject(self, key: Hashable, error: BaseException):
+        """Fail waiters with the owner's error and free the key for a retry"""
+        _, future = self._inflight.pop(key)
+        if future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # Waiters may all be gone; the error is still reported to the owner
+            future.exception()
+
+    async def run(self, key: Hashable, fingerprint: Hashable, func: Callable[[], Awaitable]) -> Any:
+        """
+        Run func once per key and return its result to every caller with that key
+
+        func runs as its own task, so if the first caller goes away (e.g. the
+        client timed out) the work still finishes and its retry gets the result.
+        """
+        pending = self.claim(key, fingerprint)
+        if pending is not None:
+            return await pending
+
+        task = asyncio.ensure_future(func())
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Hashable, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.reject(key, asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.reject(key, task.exception())
+        else:
+            self.resolve(key, task.result())
+
+    def stats(self) -> Dict:
+        """Get in-flight count, replay/join counters and result cache counters"""
+        return {
+            "inflight": len(self._inflight),
+            "replays": self.replays,
+            "joins": self.joins,
+            "results": self._results.stats()
+        }
+
+    @staticmethod
+    def _check(fingerprint: Hashable, original: Hashable):
+        if fingerprint != original:
+            raise IdempotencyKeyReused("Idempotency-Key was already used with a different request")
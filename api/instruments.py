@@ -0,0 +1,256 @@
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, NamedTuple, Optional, Tuple
+
+# --- SHARED SCREENING TEXT ---
+AGE_SCREENING = "Before we begin, I need to confirm: Are you 18 or older?\n\n(Please answer Yes or No)"
+AGE_RETRY = "I need a clear Yes or No answer. Are you 18 or older?"
+UNDERAGE = "I'm sorry, but you must be 18 or older to participate in this screening. Thank you for your interest."
+
+CRISIS_SCREENING = "Thank you. One more important question: Are you currently in a crisis or feeling actively suicidal?\n\n(Please answer Yes or No)"
+CRISIS_RETRY = "I need a clear Yes or No answer. Are you currently in a crisis or feeling actively suicidal?"
+
+CONSENT = """Thank you for confirming.
+
+My purpose is to have a conversation with you. I am not a doctor, and this is not a diagnosis. This is only a screening tool. Your data will be used anonymously for research purposes.
+
+Do you consent to participate? (Please answer Yes or No)"""
+CONSENTED = "Thank you for consenting. Let's begin.\n\n"
+DECLINED = "I understand. Thank you for your time. You can close this conversation whenever you're ready."
+
+FREQUENCY_QUESTION = """Okay, how often have you been bothered by that over the last 2 weeks?
+
+1. Not at all
+2. Several days
+3. More than half the days
+4. Nearly every day
+
+Please choose 1, 2, 3, or 4."""
+FREQUENCY_RETRY = "I didn't quite catch that. Please choose a number from 1 to 4:\n\n"
+NEXT_QUESTION = "Thank you. Next question:\n\n"
+
+CRISIS_MESSAGE = """I have detected keywords that indicate you may be in serious distress.
+
+**I am an AI and not a crisis counselor.** Please contact a crisis hotline immediately:
+
+- 1926 (National Mental Health Helpline, 24/7)
+- Ms Supeshala Rathnayaka (070 2211311)
+
+They can help you right now. Your safety is the most important thing."""
+
+# Substrings read as an answer to the frequency question, checked in order
+FREQUENCY_OPTIONS = (
+    (0, ("1", "not at all")),
+    (1, ("2", "several")),
+    (2, ("3", "more than half", "half the days")),
+    (3, ("4", "nearly every", "every day")),
+)
+
+class Question(NamedTuple):
+    number: int
+    text: str
+    clarification: str
+    examples: str
+
+class Instrument(NamedTuple):
+    """Immutable definition of a questionnaire, shared by every session that uses it"""
+
+    code: str                   # chat_sessions.protocol_type
+    name: str                   # "GAD-7"
+    title: str                  # "Generalized Anxiety Disorder"
+    condition: str              # used in result text, e.g. "anxiety"
+    questions: Tuple[Question, ...]
+    severity_bands: Tuple[Tuple[int, str], ...]   # (highest score, level), ascending
+    results: Mapping[str, str]                    # level -> result text
+    crisis_questions: FrozenSet[int] = frozenset()  # a "yes" here ends with the crisis message
+    frequency_options: Tuple[Tuple[int, Tuple[str, ...]], ...] = FREQUENCY_OPTIONS
+
+    @property
+    def max_score(self) -> int:
+        return len(self.questions) * self.frequency_options[-1][0]
+
+    def question(self, number: int) -> Optional[Question]:
+        """Get a question by its 1-based number"""
+        if 1 <= number <= len(self.questions):
+            return self.questions[number - 1]
+        return None
+
+    def severity(self, total_score: int) -> str:
+        """Severity level for a total score"""
+        for highest, level in self.severity_bands:
+            if total_score <= highest:
+                return level
+        return self.severity_bands[-1][1]
+
+    def read_frequency(self, message: str) -> Optional[int]:
+        """Score a reply to the frequency question, or None if it is not one of the options"""
+        message_lower = message.lower()
+        for score, patterns in self.frequency_options:
+            if any(pattern in message_lower for pattern in patterns):
+                return score
+        return None
+
+    def completion_message(self, total_score: int) -> str:
+        """Final message with score and recommendations"""
+        severity = self.severity(total_score)
+        return f"""Thank you for completing the {self.name} screening.
+
+Your total score is: {total_score} out of {self.max_score}
+Severity level: {severity.upper()}
+
+""" + self.results[severity]
+
+GAD7 = Instrument(
+    code="GAD7",
+    name="GAD-7",
+    title="Generalized Anxiety Disorder",
+    condition="anxiety",
+    questions=(
+        Question(
+            1,
+            "Over the last 2 weeks, have you been bothered by feeling nervous, anxious, or on edge?",
+            "'Nervous or on edge' means feeling restless, 'jumpy,' or easily startled. Over the last 2 weeks, have you been bothered by that feeling?",
+            "Examples might include: feeling like you might spill your drink if someone surprises you, finding it hard to sit still, or feeling a 'pit' in your stomach."
+        ),
+        Question(
+            2,
+            "Over the last 2 weeks, have you been bothered by not being able to stop or control worrying?",
+            "This means having trouble stopping your worried thoughts even when you try. Have you experienced that?",
+            "For example: lying awake thinking about problems, or your mind racing with worries you can't turn off."
+        ),
+        Question(
+            3,
+            "Have you been bothered by worrying too much about different things?",
+            "This means worrying about multiple different topics or situations. Have you experienced that?",
+            "For example: worrying about work, family, health, money - many different things at once."
+        ),
+        Question(
+            4,
+            "Have you had trouble relaxing?",
+            "This means finding it difficult to feel calm or at ease. Have you experienced that?",
+            "For example: feeling tense even when trying to rest, or unable to enjoy leisure time."
+        ),
+        Question(
+            5,
+            "Have you been bothered by being so restless that it is hard to sit still?",
+            "This means feeling the need to move around or fidget. Have you experienced that?",
+            "For example: pacing, tapping your feet, or feeling uncomfortable staying in one place."
+        ),
+        Question(
+            6,
+            "Have you been bothered by becoming easily annoyed or irritable?",
+            "This means getting upset or frustrated more easily than usual. Have you experienced that?",
+            "For example: snapping at people, feeling impatient, or being bothered by small things."
+        ),
+        Question(
+            7,
+            "Have you been bothered by feeling afraid as if something awful might happen?",
+            "This means having a sense of dread or fear about the future. Have you experienced that?",
+            "For example: feeling like something bad is coming, or worrying that disaster is about to strike."
+        ),
+    ),
+    severity_bands=((4, "minimal"), (9, "mild"), (14, "moderate"), (21, "severe")),
+    results=MappingProxyType({
+        "minimal": "Your responses suggest minimal anxiety symptoms. This is a good sign, but remember this is just a screening tool, not a diagnosis.",
+        "mild": "Your responses suggest mild anxiety symptoms. While this screening suggests some anxiety, only a healthcare professional can provide a proper assessment.",
+        "moderate": """Your responses suggest moderate anxiety symptoms.
+
+**IMPORTANT:** Talking to a qualified professional (like a doctor or counselor) about this could be very important. This screening suggests you may benefit from professional support.""",
+        "severe": """Your responses suggest severe anxiety symptoms.
+
+**IMPORTANT:** Your score is in the 'severe' range. I am not qualified to diagnose, but it is very important that you speak to a healthcare professional soon.
+
+Please consider seeing a doctor or counselor. Here are some resources:
+- 1926 (National Mental Health Helpline, 24/7)
+- Ms Supeshala Rathnayaka (070 2211311)""",
+    }),
+)
+
+PHQ9 = Instrument(
+    code="PHQ9",
+    name="PHQ-9",
+    title="Patient Health Questionnaire depression",
+    condition="depression",
+    questions=(
+        Question(
+            1,
+            "Over the last 2 weeks, have you been bothered by having little interest or pleasure in doing things?",
+            "This means not enjoying things you usually like, or not wanting to do them at all. Have you experienced that?",
+            "For example: skipping hobbies, not looking forward to seeing friends, or feeling 'flat' about activities."
+        ),
+        Question(
+            2,
+            "Over the last 2 weeks, have you been bothered by feeling down, depressed, or hopeless?",
+            "This means feeling sad, empty, or like things won't get better. Have you experienced that?",
+            "For example: feeling low most of the day, or feeling that nothing will improve."
+        ),
+        Question(
+            3,
+            "Have you had trouble falling or staying asleep, or been sleeping too much?",
+            "This means any change in your usual sleep, either less or more. Have you experienced that?",
+            "For example: lying awake for hours, waking very early, or sleeping much longer than usual."
+        ),
+        Question(
+            4,
+            "Have you been bothered by feeling tired or having little energy?",
+            "This means feeling worn out even without much activity. Have you experienced that?",
+            "For example: needing to rest after small tasks, or struggling to get through the day."
+        ),
+        Question(
+            5,
+            "Have you been bothered by poor appetite or overeating?",
+            "This means eating noticeably less or more than usual. Have you experienced that?",
+            "For example: skipping meals because you are not hungry, or eating a lot more for comfort."
+        ),
+        Question(
+            6,
+            "Have you been bothered by feeling bad about yourself, or that you are a failure or have let yourself or your family down?",
+            "This means being hard on yourself or feeling like you are not good enough. Have you experienced that?",
+            "For example: blaming yourself for things, or feeling you have disappointed others."
+        ),
+        Question(
+            7,
+            "Have you had trouble concentrating on things, such as reading or watching television?",
+            "This means finding it hard to keep your attention on something. Have you experienced that?",
+            "For example: rereading the same page, or losing track of a show or conversation."
+        ),
+        Question(
+            8,
+            "Have you been moving or speaking so slowly that other people could have noticed, or the opposite, being so fidgety or restless that you moved around a lot more than usual?",
+            "This means a change in how fast you move or speak that others might see. Have you experienced that?",
+            "For example: people commenting that you seem slowed down, or being unable to stay seated."
+        ),
+        Question(
+            9,
+            "Have you had thoughts that you would be better off dead, or of hurting yourself in some way?",
+            "This means any thoughts of death or self-harm, even if you would not act on them. Have you experienced that?",
+            "For example: thinking others would be better off without you, or thinking about hurting yourself."
+        ),
+    ),
+    severity_bands=((4, "minimal"), (9, "mild"), (14, "moderate"), (19, "moderately severe"), (27, "severe")),
+    results=MappingProxyType({
+        "minimal": "Your responses suggest minimal depression symptoms. This is a good sign, but remember this is just a screening tool, not a diagnosis.",
+        "mild": "Your responses suggest mild depression symptoms. While this screening suggests some depression, only a healthcare professional can provide a proper assessment.",
+        "moderate": """Your responses suggest moderate depression symptoms.
+
+**IMPORTANT:** Talking to a qualified professional (like a doctor or counselor) about this could be very important. This screening suggests you may benefit from professional support.""",
+        "moderately severe": """Your responses suggest moderately severe depression symptoms.
+
+**IMPORTANT:** I am not qualified to diagnose, but it is very important that you speak to a healthcare professional soon.
+
+Please consider seeing a doctor or counselor. Here are some resources:
+- 1926 (National Mental Health Helpline, 24/7)
+- Ms Supeshala Rathnayaka (070 2211311)""",
+        "severe": """Your responses suggest severe depression symptoms.
+
+**IMPORTANT:** Your score is in the 'severe' range. I am not qualified to diagnose, but it is very important that you speak to a healthcare professional soon.
+
+Please consider seeing a doctor or counselor. Here are some resources:
+- 1926 (National Mental Health Helpline, 24/7)
+- Ms Supeshala Rathnayaka (070 2211311)""",
+    }),
+    crisis_questions=frozenset({9}),
+)
+
+# Keyed by chat_sessions.protocol_type
+INSTRUMENTS = MappingProxyType({instrument.code: instrument for instrument in (GAD7, PHQ9)})
+DEFAULT_INSTRUMENT = GAD7.code
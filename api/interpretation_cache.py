@@ -0,0 +1,113 @@
+from typing import Dict, Optional
+import json
+import os
+
+from .cache import LRUCache
+from .answer_classifier import AnswerClassifier
+
+class InterpretationCache:
+    """Memoizes LLM YES/NO/UNCLEAR verdicts per (instrument, question number, normalized reply)
+
+    The interpretation prompt depends only on the question and the reply, so a
+    verdict can be reused for every participant who answers the same way.
+    With a path set, verdicts are appended to a JSON-lines journal and replayed
+    on startup; the journal is compacted once it grows well past maxsize.
+    """
+
+    VERDICTS = ("YES", "NO", "UNCLEAR")
+
+    # Journal entries without this version were keyed by question number only,
+    # so they may belong to another instrument's question; they are dropped
+    KEY_VERSION = 2
+
+    # Long replies rarely repeat and would only crowd out the short ones
+    MAX_REPLY_LENGTH = 64
+
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None):
+        self._cache = LRUCache(maxsize=maxsize)
+        self.path = path
+        self._journal_lines = 0
+
+        if path:
+            self._load()
+
+    def key(self, instrument: str, question_number: int, user_message: str) -> Optional[str]:
+        """Cache key for a reply, or None if the reply should not be cached"""
+        normalized = AnswerClassifier.normalize(user_message)
+        if not normalized or len(normalized) > self.MAX_REPLY_LENGTH:
+            return None
+        return f"{instrument}:{question_number}:{normalized}"
+
+    def get(self, instrument: str, question_number: int, user_message: str) -> Optional[str]:
+        """Get a cached verdict"""
+        key = self.key(instrument, question_number, user_message)
+        if key is None:
+            return None
+        return self._cache.get(key)
+
+    def put(self, instrument: str, question_number: int, user_message: str, interpretation: str):
+        """
+        Cache a raw LLM interpretation if it is exactly one of the verdicts
+
+        Anything else (error text, extra words) is not cached, so a bad
+        response is never replayed to later participants.
+        """
+        verdict = interpretation.strip().strip(".\"'").upper()
+        key = self.key(instrument, question_number, user_message)
+        if key is None or verdict not in self.VERDICTS:
+            return
+
+        self._cache.set(key, verdict)
+        if self.path:
+            self._append(key, verdict)
+
+    def stats(self) -> Dict:
+        """Get hit/miss/eviction counters"""
+        return self._cache.stats()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        stale = 0
+        try:
+            with open(self.path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                        self._journal_lines += 1
+                        if entry.get("v") != self.KEY_VERSION:
+                            stale += 1
+                            continue
+                        self._cache.set(entry["key"], entry["verdict"])
+                    except (ValueError, KeyError, AttributeError):
+                        continue
+        except OSError as e:
+            print(f"Error loading interpretation cache: {e}")
+
+        if stale or self._journal_lines > 2 * self._cache.maxsize:
+            self._compact()
+
+    def _append(self, key: str, verdict: str):
+        try:
+            with open(self.path, "a", encoding="utf-8") as journal:
+                journal.write(json.dumps({"v": self.KEY_VERSION, "key": key, "verdict": verdict}) + "\n")
+            self._journal_lines += 1
+        except OSError as e:
+            print(f"Error saving interpretation cache: {e}")
+            return
+
+        if self._journal_lines > 2 * self._cache.maxsize:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with only the entries still in memory"""
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as journal:
+                for key, verdict in self._cache.items():
+                    journal.write(json.dumps({"v": self.KEY_VERSION, "key": key, "verdict": verdict}) + "\n")
+            os.replace(tmp_path, self.path)
+            self._journal_lines = len(self._cache)
+        except OSError as e:
+            print(f"Error compacting interpretation cache: {e}")
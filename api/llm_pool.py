@@ -0,0 +1,226 @@
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import os
+import re
+import time
+
+import httpx
+from groq import AsyncGroq
+
+class Backend:
+    """One model on one OpenAI-compatible endpoint, with EWMA latency and error rate"""
+
+    # Weight of the newest sample in the moving averages
+    ALPHA = 0.2
+
+    def __init__(self, name: str, model: str, client: AsyncGroq):
+        self.name = name
+        self.model = model
+        self.client = client
+        # For attempts with another backend left: the pool fails over instead of retrying
+        self.failover_client = client.with_options(max_retries=0)
+        self.latency: Optional[float] = None  # EWMA seconds, None until the first success
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.last_used = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        """Fold one finished call into the moving averages"""
+        self.requests += 1
+        self.error_rate += self.ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency = seconds if self.latency is None else self.latency + self.ALPHA * (seconds - self.latency)
+        else:
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        return {
+            "latency_seconds": self.latency if self.latency is not None else 0.0,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight
+        }
+
+class BackendPool:
+    """
+    Routes calls of one kind (clarify, classify, summarize) across backends
+
+    Each call goes to the fastest healthy backend whose latency average is
+    within the pool's budget, or the fastest healthy one if none is. A
+    backend is unhealthy while its error rate average is above
+    MAX_ERROR_RATE. An attempt that fails, or that takes longer than the
+    budget while another backend is left to try, moves on to the next
+    backend. Healthy backends that have not been picked for PROBE_INTERVAL
+    seconds get one call, so a backend that got faster is noticed; an idle
+    unhealthy one is only tried ahead of other unhealthy ones, since the
+    call is a participant's.
+    """
+
+    MAX_ERROR_RATE = 0.5
+    PROBE_INTERVAL = 30.0
+
+    def __init__(self, name: str, backends: Sequence[Backend], latency_budget: float):
+        """
+        Args:
+            name: Call kind, used in logs
+            backends: In order of preference when nothing is known about them yet
+            latency_budget: Seconds a call (until the first chunk when streamed) should take
+        """
+        if not backends:
+            raise ValueError(f"LLM pool {name!r} has no backends")
+        self.name = name
+        self.backends = list(backends)
+        self.latency_budget = latency_budget
+
+    def ranked(self) -> List[Backend]:
+        """Backends in the order they should be tried"""
+        now = time.monotonic()
+
+        def rank(backend: Backend):
+            idle = backend.in_flight == 0 and now - backend.last_used >= self.PROBE_INTERVAL
+            if backend.error_rate > self.MAX_ERROR_RATE:
+                return (3 if idle else 4, backend.error_rate)
+            if backend.in_flight == 0 and (backend.requests == 0 or idle):
+                # Never tried, or not tried for a while: probe it
+                return (0, 0.0)
+            latency = backend.latency if backend.latency is not None else self.latency_budget
+            return (1 if latency <= self.latency_budget else 2, latency)
+
+        # sorted() is stable, so ties keep the configured order
+        return sorted(self.backends, key=rank)
+
+    async def create(self, **kwargs):
+        """
+        chat.completions.create on the best backend, failing over to the next ones
+
+        Returns:
+            (response, backend); with stream=True the response is the chunk
+            stream, and the caller reports the outcome with backend.record
+        """
+        candidates = self.ranked()
+        for index, backend in enumerate(candidates):
+            last = index == len(candidates) - 1
+            backend.last_used = time.monotonic()
+            backend.in_flight += 1
+            start = time.perf_counter()
+            try:
+                client = backend.client if last else backend.failover_client
+                call = client.chat.completions.create(model=backend.model, **kwargs)
+                response = await (call if last else asyncio.wait_for(call, self.latency_budget))
+            except asyncio.CancelledError:
+                backend.in_flight -= 1
+                raise
+            except Exception as e:
+                backend.in_flight -= 1
+                backend.record(time.perf_counter() - start, ok=False)
+                if last:
+                    raise
+                print(f"LLM backend {backend.name} failed for {self.name} ({type(e).__name__}: {e}); "
+                      f"trying {candidates[index + 1].name}")
+                continue
+
+            if kwargs.get("stream"):
+                # in_flight and the latency sample are settled by stream()
+                return response, backend
+            backend.in_flight -= 1
+            backend.record(time.perf_counter() - start, ok=True)
+            return response, backend
+
+    async def stream(self, **kwargs) -> AsyncIterator[Tuple[Backend, object]]:
+        """
+        Yield (backend, chunk) from a streamed call, recording its full duration
+
+        A stream closed early by the consumer is not recorded: its duration
+        says nothing about the backend.
+        """
+        start = time.perf_counter()
+        stream, backend = await self.create(stream=True, **kwargs)
+        try:
+            async for chunk in stream:
+                yield backend, chunk
+        except Exception:
+            backend.record(time.perf_counter() - start, ok=False)
+            raise
+        else:
+            backend.record(time.perf_counter() - start, ok=True)
+        finally:
+            backend.in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {"latency_budget_seconds": self.latency_budget,
+                **{safe_name(backend.name): backend.stats() for backend in self.backends}}
+
+class OpenAICompatibleTransport(httpx.AsyncHTTPTransport):
+    """Maps the Groq SDK's /openai/v1/ paths onto a plain OpenAI-compatible base URL"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(path=request.url.path.replace("/openai/v1/", "/", 1))
+        return await super().handle_async_request(request)
+
+def create_backend(config: Dict, groq_http_client: httpx.AsyncClient,
+                   http_clients: Dict[str, httpx.AsyncClient]) -> Backend:
+    """
+    Backend from one LLM_BACKENDS entry
+
+    Keys: name, model, and optionally url (an OpenAI-compatible base URL such
+    as http://localhost:8000/v1; Groq when absent), api_key_env (the
+    variable holding its API key; GROQ_API_KEY by default) and keyless (true
+    for a server that takes no key).
+
+    Args:
+        groq_http_client: Shared client for Groq backends
+        http_clients: Clients for other URLs, reused across pools and filled in here
+
+    Raises:
+        ValueError: The backend's API key variable is not set
+    """
+    model = config["model"]
+    name = config.get("name") or model
+    if config.get("keyless"):
+        api_key = "unused"
+    else:
+        key_env = config.get("api_key_env", "GROQ_API_KEY")
+        api_key = os.getenv(key_env)
+        if not api_key:
+            raise ValueError(f"LLM backend {name!r} needs {key_env} to be set "
+                             f"(or \"keyless\": true in LLM_BACKENDS if its server takes no key)")
+    url = config.get("url")
+    if not url:
+        return Backend(name, model, AsyncGroq(api_key=api_key, http_client=groq_http_client))
+
+    if url not in http_clients:
+        http_clients[url] = httpx.AsyncClient(transport=OpenAICompatibleTransport(),
+                                              timeout=groq_http_client.timeout)
+    return Backend(name, model, AsyncGroq(api_key=api_key, base_url=url, http_client=http_clients[url]))
+
+def load_pool_configs(defaults: Dict[str, str]) -> Dict[str, List[Dict]]:
+    """
+    Backend configs per pool from LLM_BACKENDS
+
+    LLM_BACKENDS is a JSON list of backend entries (see create_backend), each
+    with a "pools" list naming the pools it serves. Without it, every pool
+    has a single Groq backend with the model from defaults.
+    """
+    raw = os.getenv("LLM_BACKENDS")
+    if not raw:
+        return {pool: [{"name": f"groq-{model}", "model": model}] for pool, model in defaults.items()}
+
+    entries = json.loads(raw)
+    configs = {pool: [] for pool in defaults}
+    for entry in entries:
+        for pool in entry.get("pools") or list(defaults):
+            if pool not in configs:
+                raise ValueError(f"Unknown LLM pool {pool!r} in LLM_BACKENDS, expected one of: {', '.join(configs)}")
+            configs[pool].append(entry)
+    for pool, model in defaults.items():
+        if not configs[pool]:
+            configs[pool].append({"name": f"groq-{model}", "model": model})
+    return configs
+
+def safe_name(name: str) -> str:
+    """A backend name usable in a metric name"""
+    return re.sub(r"\W", "_", name)
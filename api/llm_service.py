@@ -1,20 +1,124 @@
-from groq import Groq
+import httpx
+import json
+from contextlib import aclosing
 import os
-from typing import List, Dict
+import weakref
+from typing import AsyncIterator, List, Dict, NamedTuple, Optional, Sequence, Tuple
+import time
+
+from .llm_pool import BackendPool, create_backend, load_pool_configs
+from .metrics import registry
+from .tracing import tracer
+
+GROQ_REQUESTS = registry.counter(
+    "groq_requests_total", "Groq chat completion calls by mode and outcome", ("mode", "outcome"))
+GROQ_DURATION = registry.histogram(
+    "groq_request_duration_seconds", "Groq call latency (until the last chunk for streamed calls)", ("mode",))
+GROQ_FALLBACKS = registry.counter(
+    "groq_fallbacks_total", "Replies replaced by the fallback apology after a Groq error", ("mode",))
+
+class Classification(NamedTuple):
+    """Result of LLMService.classify"""
+    label: str
+    # Model-reported confidence in [0, 1]; 0.0 when the call failed or the label was invalid
+    confidence: float
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    model: Optional[str] = None
+    # True when the default label was returned because the call or its output failed
+    fallback: bool = False
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """HTTP transport that counts requests and the connections its pool opens"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self._seen_connections = weakref.WeakSet()
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+            # Every connection we have not seen before cost a TCP + TLS handshake
+            for connection in self._pool.connections:
+                if connection not in self._seen_connections:
+                    self._seen_connections.add(connection)
+                    self.connections_opened += 1
+    
+    def stats(self) -> Dict:
+        """Get request and connection pool counters"""
+        connections = self._pool.connections
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "connections_opened": self.connections_opened,
+            "connections_open": len(connections),
+            "connections_idle": sum(1 for c in connections if c.is_idle()),
+            "connection_reuse_rate": 1 - self.connections_opened / self.requests if self.requests else 0.0
+        }
+
+def create_http_client() -> httpx.AsyncClient:
+    """HTTP client with keep-alive tuned for one long-lived Groq client per process"""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "120"))
+    )
+    timeout = httpx.Timeout(float(os.getenv("GROQ_TIMEOUT", "30")), connect=5.0)
+    return httpx.AsyncClient(transport=PooledTransport(limits=limits), timeout=timeout)
 
 class LLMService:
     """Service for handling LLM interactions"""
     
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.http_client = http_client or create_http_client()
         self.model = "llama-3.3-70b-versatile"
+        self.summary_model = os.getenv("GROQ_SUMMARY_MODEL", self.model)
+        # Short closed-label calls on the hot path: a small, fast model is enough
+        self.classify_model = os.getenv("GROQ_CLASSIFY_MODEL", "llama-3.1-8b-instant")
+        
+        # One pool per call kind, so a slow clarification model does not hold up classification
+        budgets = {
+            "clarify": float(os.getenv("LLM_CLARIFY_BUDGET", "5")),
+            "classify": float(os.getenv("LLM_CLASSIFY_BUDGET", "1.5")),
+            "summarize": float(os.getenv("LLM_SUMMARIZE_BUDGET", "15"))
+        }
+        configs = load_pool_configs({"clarify": self.model, "classify": self.classify_model,
+                                     "summarize": self.summary_model})
+        # Backends on the same OpenAI-compatible server share its connections
+        http_clients: Dict[str, httpx.AsyncClient] = {}
+        self.pools = {
+            pool: BackendPool(pool, [create_backend(config, self.http_client, http_clients) for config in configs[pool]],
+                              budgets[pool])
+            for pool in budgets
+        }
+    
+    def pool_stats(self) -> Dict:
+        """Get connection pool usage for this service's HTTP client"""
+        transport = self.http_client._transport
+        if isinstance(transport, PooledTransport):
+            return transport.stats()
+        return {}
     
-    def generate_response(self, 
+    def backend_stats(self) -> Dict:
+        """Get latency and error rate averages per pool and backend"""
+        return {pool: backend_pool.stats() for pool, backend_pool in self.pools.items()}
+    
+    async def generate_response(self, 
                          system_prompt: str, 
                          conversation_history: List[Dict[str, str]], 
                          user_message: str) -> str:
         """
-        Generate response using Groq
+        Generate response using the clarification backend pool
         
         Args:
             system_prompt: Instructions for the LLM
@@ -29,16 +133,244 @@ class LLMService:
         messages.extend(conversation_history)
         messages.append({"role": "user", "content": user_message})
         
+        start = time.perf_counter()
+        span = tracer.start_span("groq chat", {"gen_ai.system": "groq", "gen_ai.request.model": self.model,
+                                               "llm.mode": "generate", "llm.messages": len(messages)})
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response, backend = await self.pools["clarify"].create(
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
             )
             
+            GROQ_REQUESTS.inc(mode="generate", outcome="ok")
+            record_backend(span, backend)
+            record_usage(span, response.usage)
             return response.choices[0].message.content
             
         except Exception as e:
             print(f"LLM Error: {str(e)}")
-            return "I apologize, but I'm having trouble processing that. Could you please try again?"
\ No newline at end of file
+            GROQ_REQUESTS.inc(mode="generate", outcome="error")
+            GROQ_FALLBACKS.inc(mode="generate")
+            span.record_error(e)
+            span.set_attribute("llm.fallback", True)
+            return "I apologize, but I'm having trouble processing that. Could you please try again?"
+        finally:
+            GROQ_DURATION.observe(time.perf_counter() - start, mode="generate")
+            span.end()
+    
+    async def stream_response(self, 
+                              system_prompt: str, 
+                              conversation_history: List[Dict[str, str]], 
+                              user_message: str) -> AsyncIterator[str]:
+        """
+        Stream a response from the clarification backend pool as it is generated
+        
+        Args are the same as generate_response.
+        
+        Yields:
+            Text fragments in order; on error, the same fallback text
+            generate_response returns (if nothing was sent yet)
+        """
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(conversation_history)
+        messages.append({"role": "user", "content": user_message})
+        
+        sent_any = False
+        start = time.perf_counter()
+        # Not made the active span: this generator runs in its consumer's context
+        span = tracer.start_span("groq chat", {"gen_ai.system": "groq", "gen_ai.request.model": self.model,
+                                               "llm.mode": "stream", "llm.messages": len(messages)})
+        try:
+            backend = None
+            # aclosing: a client that disconnects mid-reply still releases the backend
+            async with aclosing(self.pools["clarify"].stream(
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500
+            )) as chunks:
+                async for chunk_backend, chunk in chunks:
+                    if backend is None:
+                        backend = chunk_backend
+                        record_backend(span, backend)
+                    x_groq = getattr(chunk, "x_groq", None)
+                    if x_groq is not None:
+                        record_usage(span, getattr(x_groq, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        sent_any = True
+                        yield content
+            
+            GROQ_REQUESTS.inc(mode="stream", outcome="ok")
+                    
+        except Exception as e:
+            print(f"LLM Error: {str(e)}")
+            GROQ_REQUESTS.inc(mode="stream", outcome="error")
+            span.record_error(e)
+            if not sent_any:
+                GROQ_FALLBACKS.inc(mode="stream")
+                span.set_attribute("llm.fallback", True)
+                yield "I apologize, but I'm having trouble processing that. Could you please try again?"
+        finally:
+            GROQ_DURATION.observe(time.perf_counter() - start, mode="stream")
+            span.end()
+
+    async def classify(self, system_prompt: str, user_message: str, labels: Sequence[str],
+                       default: str, max_tokens: int = 24) -> Classification:
+        """
+        Pick one label for a piece of text
+        
+        The model answers in JSON mode at temperature 0 with a few output
+        tokens, so the call is fast and repeatable.
+        
+        Args:
+            system_prompt: What is being classified and what each label means
+            user_message: The text to classify
+            labels: Allowed labels, matched case-insensitively
+            default: Label returned if the call fails or answers outside labels
+            max_tokens: Output budget for the JSON answer
+            
+        Returns:
+            Classification with the label, confidence and token usage
+        """
+        instructions = (f'{system_prompt}\n\nReply with JSON only: {{"label": one of '
+                        f'{", ".join(labels)}, "confidence": a number from 0 to 1}}')
+        
+        start = time.perf_counter()
+        span = tracer.start_span("groq chat", {"gen_ai.system": "groq", "gen_ai.request.model": self.classify_model,
+                                               "llm.mode": "classify", "llm.messages": 2})
+        try:
+            response, backend = await self.pools["classify"].create(
+                messages=[
+                    {"role": "system", "content": instructions},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=0,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
+            )
+            
+            GROQ_REQUESTS.inc(mode="classify", outcome="ok")
+            record_backend(span, backend)
+            record_usage(span, response.usage)
+            label, confidence = parse_classification(response.choices[0].message.content, labels)
+            usage = response.usage
+            result = Classification(
+                label=label or default,
+                confidence=confidence if label else 0.0,
+                input_tokens=getattr(usage, "prompt_tokens", None),
+                output_tokens=getattr(usage, "completion_tokens", None),
+                model=backend.model,
+                fallback=label is None
+            )
+            span.set_attributes({"llm.label": result.label, "llm.confidence": result.confidence})
+            
+        except Exception as e:
+            print(f"LLM classify error: {str(e)}")
+            GROQ_REQUESTS.inc(mode="classify", outcome="error")
+            GROQ_FALLBACKS.inc(mode="classify")
+            span.record_error(e)
+            span.set_attribute("llm.fallback", True)
+            result = Classification(label=default, confidence=0.0, model=self.classify_model, fallback=True)
+        finally:
+            GROQ_DURATION.observe(time.perf_counter() - start, mode="classify")
+            span.end()
+        
+        return result
+    
+    async def summarize(self, summary: Optional[str], messages: List[Dict[str, str]],
+                        max_tokens: int = 300) -> Optional[str]:
+        """
+        Fold messages into a conversation summary
+        
+        Args:
+            summary: The summary so far (None for the first one)
+            messages: Messages after the summary, oldest first
+            max_tokens: Length limit for the new summary
+            
+        Returns:
+            The updated summary, or None if the call failed
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = f"""Summary so far:
+{summary or "(none)"}
+
+Conversation to add:
+{transcript}
+
+Write the updated summary in a few sentences. Keep which screening questions were asked, how the user answered them, anything they said about their situation or wellbeing, and any signs of distress. Leave out greetings and small talk."""
+        
+        start = time.perf_counter()
+        span = tracer.start_span("groq chat", {"gen_ai.system": "groq", "gen_ai.request.model": self.summary_model,
+                                               "llm.mode": "summarize", "llm.messages": len(messages)})
+        try:
+            response, backend = await self.pools["summarize"].create(
+                messages=[
+                    {"role": "system", "content": "You summarize mental health screening conversations for the assistant running them."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=max_tokens
+            )
+            
+            GROQ_REQUESTS.inc(mode="summarize", outcome="ok")
+            record_backend(span, backend)
+            record_usage(span, response.usage)
+            return response.choices[0].message.content.strip() or None
+            
+        except Exception as e:
+            print(f"LLM summary error: {str(e)}")
+            GROQ_REQUESTS.inc(mode="summarize", outcome="error")
+            span.record_error(e)
+            return None
+        finally:
+            GROQ_DURATION.observe(time.perf_counter() - start, mode="summarize")
+            span.end()
+
+def parse_classification(content: Optional[str], labels: Sequence[str]) -> Tuple[Optional[str], float]:
+    """
+    Read the label and confidence from a classify() answer
+    
+    Accepts the requested JSON or, from models that ignore JSON mode, a bare
+    label. Returns (None, 0.0) unless the label is exactly one of labels.
+    """
+    text = (content or "").strip()
+    confidence = 1.0
+    try:
+        data = json.loads(text)
+        text = str(data.get("label", ""))
+        confidence = float(data.get("confidence", 1.0))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    
+    label = text.strip().strip(".\"'").upper()
+    allowed = {l.upper(): l for l in labels}
+    if label not in allowed:
+        return None, 0.0
+    return allowed[label], min(max(confidence, 0.0), 1.0)
+
+def record_backend(span, backend):
+    """Note on a span which pooled backend served the call"""
+    span.set_attributes({"gen_ai.request.model": backend.model, "llm.backend": backend.name})
+
+def record_usage(span, usage):
+    """Copy Groq token counts onto a span"""
+    if usage is None:
+        return
+    span.set_attributes({
+        "gen_ai.usage.input_tokens": getattr(usage, "prompt_tokens", None),
+        "gen_ai.usage.output_tokens": getattr(usage, "completion_tokens", None)
+    })
+
+
+_shared_service: Optional[LLMService] = None
+
+def get_llm_service() -> LLMService:
+    """Process-wide LLMService, so every request reuses one warm connection pool"""
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = LLMService()
+    return _shared_service
@@ -1,15 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from supabase import create_client, Client
+from contextlib import asynccontextmanager
+from supabase import acreate_client, AsyncClient
 import os
+import asyncio
 from typing import Optional, List, Dict
-from datetime import datetime
 from .gad7_protocol import GAD7Protocol
-from .llm_service import LLMService
+from .llm_service import get_llm_service
+from .turn_commit import TurnCommit
+from .storage import StaleStateError, create_storage
+from .session_cache import SessionStateCache
+from .answer_classifier import AnswerClassifier
+from .interpretation_cache import InterpretationCache
+from .crisis_detector import CrisisDetector
+from .idempotency import IdempotencyStore, IdempotencyKeyReused
+from .write_behind import WriteBehindQueue, parse_timestamp
+from .context_builder import ContextBuilder, to_chat_message
+from .instruments import GAD7, INSTRUMENTS, Instrument
+from . import protocol_engine
+from .protocol_engine import get_engine
+from .metrics import registry, MetricsRegistry, MetricsMiddleware, CHAT_STAGE_DURATION, instrument_supabase
+from .tracing import tracer, trace_supabase
 import json
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    if write_behind is not None:
+        # Also flushes writes left in the journal by the previous run
+        write_behind.start(storage)
+    yield
+    if write_behind is not None:
+        await write_behind.close()
+    await storage.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS SETUP ---
 FRONTEND_URL = os.getenv("FRONTEND_URL", "*")
@@ -23,20 +49,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- METRICS ---
+app.add_middleware(MetricsMiddleware)
+
 # --- SUPABASE SETUP ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+# Auth always goes through Supabase; with the sqlite backend the chat endpoints work without it
+if STORAGE_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase: Optional[AsyncClient] = None
+_supabase_lock = asyncio.Lock()
+
+async def get_supabase() -> AsyncClient:
+    """Return the process-wide async Supabase client, creating it on first use"""
+    global _supabase
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+    if _supabase is None:
+        async with _supabase_lock:
+            if _supabase is None:
+                _supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+    instrument_supabase(_supabase)
+    trace_supabase(_supabase)
+    return _supabase
+
+# --- STORAGE ---
+# Sessions, messages, GAD-7 responses and protocol state (STORAGE_BACKEND=supabase|sqlite)
+storage = create_storage(get_supabase)
+
+# --- SESSION STATE CACHE ---
+session_cache = SessionStateCache(
+    maxsize=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SESSION_CACHE_TTL", "120"))
+)
+
+# --- ANSWER INTERPRETATION ---
+answer_classifier = AnswerClassifier()
+interpretation_cache = InterpretationCache(
+    maxsize=int(os.getenv("INTERPRETATION_CACHE_SIZE", "4096")),
+    path=os.getenv("INTERPRETATION_CACHE_PATH") or None
+)
+
+# --- IDEMPOTENT RETRIES ---
+idempotency_store = IdempotencyStore(
+    maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("IDEMPOTENCY_TTL", "300"))
+)
+
+# --- CRISIS DETECTION ---
+# Extra phrases (e.g. other languages) can be listed one per line in a file
+if os.getenv("CRISIS_KEYWORDS_PATH"):
+    GAD7Protocol.use_crisis_detector(CrisisDetector.from_file(
+        os.getenv("CRISIS_KEYWORDS_PATH"), extra=GAD7Protocol.CRISIS_KEYWORDS
+    ))
+else:
+    GAD7Protocol.crisis_detector()
+
+# --- WRITE-BEHIND ---
+# With a journal path set, the bot message, GAD-7 response and title refresh
+# are queued locally and flushed in the background. Needs a long-running
+# process with a persistent disk, so it is off by default (e.g. on Vercel).
+write_behind = None
+if os.getenv("WRITE_BEHIND_PATH"):
+    write_behind = WriteBehindQueue(
+        os.getenv("WRITE_BEHIND_PATH"),
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "0.25"))
+    )
+    registry.register_stats("write_behind", write_behind.stats)
+
+# --- CONVERSATION CONTEXT ---
+# Clarification prompts carry the newest messages that fit the budget (estimated
+# tokens, system prompt included); older ones are folded into a per-session summary
+context_builder = ContextBuilder(
+    token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    summary_budget=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+)
+
+registry.register_stats("session_cache", session_cache.stats)
+registry.register_stats("answer_classifier", answer_classifier.stats)
+registry.register_stats("interpretation_cache", interpretation_cache.stats)
+registry.register_stats("idempotency", idempotency_store.stats)
+registry.register_stats("context_tokens", context_builder.estimator.stats)
+registry.register_stats("crisis_detector", lambda: GAD7Protocol.crisis_detector().stats())
+registry.register_stats("groq_pool", lambda: get_llm_service().pool_stats())
+registry.register_stats("llm", lambda: get_llm_service().backend_stats())
 
 # --- DATA MODELS ---
 class UserInput(BaseModel):
     message: str
     user_id: str
     session_id: Optional[str] = None
+    protocol_type: Optional[str] = None  # instrument for a new session (GAD7 by default)
 
 class LoginRequest(BaseModel):
     email: str
@@ -48,15 +157,17 @@ class RegisterRequest(BaseModel):
 
 class CreateSessionRequest(BaseModel):
     user_id: str
+    protocol_type: Optional[str] = None
 
 class UpdateSessionTitleRequest(BaseModel):
     title: str
 
 # --- AUTH ENDPOINTS ---
 @app.post("/api/register")
-def register(user_data: RegisterRequest):
+async def register(user_data: RegisterRequest):
     try:
-        response = supabase.auth.sign_up({
+        supabase = await get_supabase()
+        response = await supabase.auth.sign_up({
             "email": user_data.email,
             "password": user_data.password,
             "options": {
@@ -82,9 +193,10 @@ def register(user_data: RegisterRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/login")
-def login(user_data: LoginRequest):
+async def login(user_data: LoginRequest):
     try:
-        response = supabase.auth.sign_in_with_password({
+        supabase = await get_supabase()
+        response = await supabase.auth.sign_in_with_password({
             "email": user_data.email,
             "password": user_data.password
         })
@@ -101,333 +213,589 @@ def login(user_data: LoginRequest):
 
 # --- CHAT SESSION ENDPOINTS ---
 @app.post("/api/sessions")
-def create_session(request: CreateSessionRequest):
+async def create_session(request: CreateSessionRequest):
+    check_protocol_type(request.protocol_type)
     try:
-        response = supabase.table("chat_sessions").insert({
-            "user_id": request.user_id,
-            "title": "New Chat",
-        }).execute()
-        
-        if response.data and len(response.data) > 0:
-            return {"session": response.data[0]}
-        else:
-            raise HTTPException(status_code=500, detail=f"Failed to create session")
+        session = {"user_id": request.user_id, "title": "New Chat"}
+        if request.protocol_type:
+            session["protocol_type"] = request.protocol_type
+        return {"session": await storage.create_session(session)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/api/sessions/{user_id}")
-def get_sessions(user_id: str):
+async def get_sessions(user_id: str, limit: Optional[int] = Query(None, ge=1, le=200),
+                       before: Optional[str] = None, before_id: Optional[str] = None):
+    # message_count is maintained by commit_chat_turn, so this is a single query.
+    # Pass limit to page; next_cursor gives the before/before_id of the next page.
     try:
-        response = supabase.table("chat_sessions")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("updated_at", desc=True)\
-            .execute()
+        rows = await storage.list_sessions(
+            user_id,
+            limit=limit + 1 if limit else None,
+            before=(before, before_id) if before else None
+        )
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = {"before": rows[-1]["updated_at"], "before_id": rows[-1]["id"]}
         
         sessions = []
-        for session in response.data:
-            msg_response = supabase.table("chat_messages")\
-                .select("id", count="exact")\
-                .eq("session_id", session["id"])\
-                .execute()
-            
+        for session in rows:
             sessions.append({
                 "id": session["id"],
                 "title": session["title"],
                 "created_at": session["created_at"],
                 "updated_at": session["updated_at"],
-                "message_count": msg_response.count or 0
+                "message_count": session.get("message_count") or 0
             })
         
-        return {"sessions": sessions}
+        return {"sessions": sessions, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/api/sessions/{session_id}/messages")
-def get_session_messages(session_id: str):
+async def get_session_messages(session_id: str, limit: Optional[int] = Query(None, ge=1, le=500),
+                               before: Optional[str] = None, before_id: Optional[str] = None,
+                               after: Optional[str] = None, after_id: Optional[str] = None,
+                               fields: Optional[str] = None):
+    # Messages are always returned oldest first. With limit, `after` pages forward;
+    # limit alone gives the newest page and `before` pages back from there.
+    # next_cursor continues in the same direction.
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    if before_id and not before:
+        raise HTTPException(status_code=400, detail="before_id needs before")
+    if after_id and not after:
+        raise HTTPException(status_code=400, detail="after_id needs after")
+    columns = parse_message_fields(fields)
+    
     try:
-        response = supabase.table("chat_messages")\
-            .select("*")\
-            .eq("session_id", session_id)\
-            .order("created_at", desc=False)\
-            .execute()
+        backwards = bool(before) or bool(limit and not after)
+        rows = await storage.list_messages(
+            session_id,
+            columns=columns,
+            limit=limit + 1 if limit else None,
+            before=(before, before_id) if before else None,
+            after=(after, after_id) if after else None,
+            descending=backwards
+        )
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            direction = "before" if backwards else "after"
+            next_cursor = {direction: rows[-1]["created_at"], f"{direction}_id": rows[-1]["id"]}
+        if backwards:
+            rows.reverse()
         
-        return {"messages": response.data}
+        return {"messages": [project_fields(row, fields) for row in rows], "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sessions/{session_id}/messages/export")
+async def export_session_messages(session_id: str, fields: Optional[str] = None):
+    # Streams NDJSON one page at a time, so memory stays bounded for any session size
+    columns = parse_message_fields(fields)
+    
+    async def rows():
+        cursor = None
+        while True:
+            page = await storage.list_messages(session_id, columns=columns, limit=EXPORT_PAGE_SIZE,
+                                               after=cursor)
+            
+            for row in page:
+                yield json.dumps(project_fields(row, fields)) + "\n"
+            
+            if len(page) < EXPORT_PAGE_SIZE:
+                break
+            cursor = (page[-1]["created_at"], page[-1]["id"])
+    
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="session-{session_id}.ndjson"'}
+    )
+
 @app.delete("/api/sessions/{session_id}")
-def delete_session(session_id: str):
+async def delete_session(session_id: str):
     try:
-        response = supabase.table("chat_sessions")\
-            .delete()\
-            .eq("id", session_id)\
-            .execute()
+        await storage.delete_session(session_id)
+        session_cache.invalidate(session_id)
         
         return {"message": "Session deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/sessions/{session_id}/title")
-def update_session_title(session_id: str, request: UpdateSessionTitleRequest):
+async def update_session_title(session_id: str, request: UpdateSessionTitleRequest):
     try:
-        response = supabase.table("chat_sessions")\
-            .update({"title": request.title, "updated_at": datetime.utcnow().isoformat()})\
-            .eq("id", session_id)\
-            .execute()
+        await storage.update_session_title(session_id, request.title)
         
         return {"message": "Title updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# --- CHAT ENDPOINT ---
-@app.post("/api/chat")
-def chat(user_input: UserInput):
-    try:
-        user_message = user_input.message
-        user_id = user_input.user_id
-        session_id = user_input.session_id
-        
-        protocol = GAD7Protocol()
-        llm = LLMService()
-        
-        if not session_id:
-            session_response = supabase.table("chat_sessions").insert({
-                "user_id": user_id,
-                "title": "GAD-7 Screening",
-                "protocol_type": "GAD7",
-                "protocol_state": json.dumps(protocol.get_state())
-            }).execute()
-            session_id = session_response.data[0]["id"]
-        else:
-            session_data = supabase.table("chat_sessions")\
-                .select("protocol_state, protocol_completed")\
-                .eq("id", session_id)\
-                .execute()
-            
-            if session_data.data:
-                state = session_data.data[0].get("protocol_state")
-                if state:
-                    protocol.load_state(json.loads(state))
-                
-                if session_data.data[0].get("protocol_completed"):
-                    bot_reply = "This screening has already been completed. Would you like to start a new screening session?"
-                    
-                    supabase.table("chat_messages").insert({
-                        "session_id": session_id,
-                        "user_id": user_id,
-                        "message": user_message,
-                        "sender": "user"
-                    }).execute()
-                    
-                    supabase.table("chat_messages").insert({
-                        "session_id": session_id,
-                        "user_id": user_id,
-                        "message": bot_reply,
-                        "sender": "bot"
-                    }).execute()
-                    
-                    return {"response": bot_reply, "session_id": session_id}
-        
-        if protocol.check_crisis(user_message):
-            crisis_message = protocol.get_crisis_message()
-            
-            supabase.table("chat_messages").insert({
-                "session_id": session_id,
-                "user_id": user_id,
-                "message": user_message,
-                "sender": "user"
-            }).execute()
-            
-            supabase.table("chat_messages").insert({
-                "session_id": session_id,
-                "user_id": user_id,
-                "message": crisis_message,
-                "sender": "bot"
-            }).execute()
-            
-            update_protocol_state(session_id, protocol.get_state(), completed=True)
-            
-            return {"response": crisis_message, "session_id": session_id, "crisis": True}
-        
-        bot_reply = ""
-        
-        if protocol.current_question == 0 and not protocol.screening_passed:
-            if not hasattr(protocol, 'screening_step'):
-                protocol.screening_step = 0
-            
-            if protocol.screening_step == 0:
-                msg_count = supabase.table("chat_messages")\
-                    .select("id", count="exact")\
-                    .eq("session_id", session_id)\
-                    .execute()
-                
-                if msg_count.count == 0:
-                    bot_reply = protocol.get_age_screening()
-                else:
-                    user_lower = user_message.lower().strip()
-                    
-                    if "yes" in user_lower or "yeah" in user_lower or "yep" in user_lower:
-                        protocol.screening_step = 1
-                        bot_reply = protocol.get_crisis_screening()
-                    elif "no" in user_lower or "nope" in user_lower:
-                        bot_reply = "I'm sorry, but you must be 18 or older to participate in this screening. Thank you for your interest."
-                        update_protocol_state(session_id, protocol.get_state(), completed=True)
-                    else:
-                        bot_reply = "I need a clear Yes or No answer. Are you 18 or older?"
-            
-            elif protocol.screening_step == 1:
-                user_lower = user_message.lower().strip()
-                
-                if "no" in user_lower or "nope" in user_lower:
-                    protocol.screening_passed = True
-                    protocol.screening_step = 2
-                    bot_reply = protocol.get_consent_message()
-                elif "yes" in user_lower or "yeah" in user_lower or "yep" in user_lower:
-                    bot_reply = protocol.get_crisis_message()
-                    update_protocol_state(session_id, protocol.get_state(), completed=True)
-                else:
-                    bot_reply = "I need a clear Yes or No answer. Are you currently in a crisis or feeling actively suicidal?"
-        
-        elif protocol.screening_passed and not protocol.consent_given:
-            if "yes" in user_message.lower():
-                protocol.consent_given = True
-                protocol.current_question = 1
-                bot_reply = f"Thank you for consenting. Let's begin.\n\n{protocol.get_current_question()}"
-            else:
-                bot_reply = "I understand. Thank you for your time. You can close this conversation whenever you're ready."
-                update_protocol_state(session_id, protocol.get_state(), completed=True)
-        
-        elif 1 <= protocol.current_question <= 7:
-            if not protocol.awaiting_frequency:
-                conversation_history = load_conversation_context(session_id)
-                system_prompt = get_system_prompt(protocol.get_state())
-                
-                interpretation_prompt = f"""The user was asked: "{protocol.get_current_question()}"
+# --- CHAT ENDPOINTS ---
+# Tries per turn when another request for the same session commits first
+TURN_ATTEMPTS = 3
+STALE_STATE_DETAIL = "This session was updated by another request. Please resend your message."
 
-They responded: "{user_message}"
+# Keeps fire-and-forget tasks referenced until they finish
+_background_tasks = set()
+# Sessions whose conversation summary is being updated
+_summarizing = set()
 
-Respond with ONLY one word:
-- "YES" if they indicated they experienced this symptom
-- "NO" if they indicated they did not experience this symptom  
-- "UNCLEAR" if you cannot determine their answer
+@app.post("/api/chat")
+async def chat(user_input: UserInput,
+               idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    check_protocol_type(user_input.protocol_type)
+    if not idempotency_key:
+        return await run_chat_turn(user_input)
+    
+    # A retried request waits for or replays the original turn instead of repeating it
+    key, fingerprint = idempotency_scope(user_input, idempotency_key)
+    try:
+        return await idempotency_store.run(key, fingerprint, lambda: run_chat_turn(user_input))
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-ONE WORD ONLY:"""
-                
-                interpretation = llm.generate_response(
-                    system_prompt="You are a response classifier. Respond with only YES, NO, or UNCLEAR.",
-                    conversation_history=[],
-                    user_message=interpretation_prompt
-                ).strip().upper()
-                
-                if "YES" in interpretation:
-                    protocol.awaiting_frequency = True
-                    bot_reply = protocol.get_frequency_question()
+async def run_chat_turn(user_input: UserInput) -> Dict:
+    """Plan, reply to and persist one /chat turn"""
+    try:
+        with tracer.span("chat turn", turn_attributes(user_input, "/api/chat")) as span:
+            plan = await plan_chat_turn(user_input)
+            for attempt in range(TURN_ATTEMPTS):
+                span.set_attribute("chat.attempts", attempt + 1)
+                if attempt:
+                    plan = await replan_chat_turn(user_input, plan)
+                span.set_attribute("session.id", plan["session_id"])
                 
-                elif "NO" in interpretation:
-                    save_gad7_response(
-                        session_id, user_id, 
-                        protocol.current_question,
-                        protocol.get_current_question(),
-                        user_message, 0
-                    )
-                    
-                    protocol.current_question += 1
-                    if protocol.current_question <= 7:
-                        bot_reply = protocol.get_current_question()
-                    else:
-                        protocol.completed = True
-                        bot_reply = protocol.get_completion_message()
-                        update_protocol_state(session_id, protocol.get_state(), 
-                                            protocol.total_score, completed=True)
+                bot_reply = plan["bot_reply"]
+                if bot_reply is None:
+                    llm = get_llm_service()
+                    request = await get_clarification_request(plan)
+                    with CHAT_STAGE_DURATION.time(stage="llm_clarify"):
+                        bot_reply = await llm.generate_response(**request)
                 
-                else:
-                    bot_reply = llm.generate_response(
-                        system_prompt=system_prompt,
-                        conversation_history=conversation_history[-4:],
-                        user_message=user_message
-                    )
+                try:
+                    return await finish_chat_turn(plan, bot_reply)
+                except StaleStateError as e:
+                    # Another request for this session committed first: replay on its state
+                    print(f"Conflict in chat (attempt {attempt + 1}): {str(e)}")
             
-            else:
-                score = None
-                user_msg_lower = user_message.lower()
-                
-                if "1" in user_message or "not at all" in user_msg_lower:
-                    score = 0
-                elif "2" in user_message or "several" in user_msg_lower:
-                    score = 1
-                elif "3" in user_message or "more than half" in user_msg_lower or "half the days" in user_msg_lower:
-                    score = 2
-                elif "4" in user_message or "nearly every" in user_msg_lower or "every day" in user_msg_lower:
-                    score = 3
-                
-                if score is not None:
-                    save_gad7_response(
-                        session_id, user_id,
-                        protocol.current_question,
-                        protocol.get_current_question(),
-                        user_message, score
-                    )
-                    
-                    protocol.total_score += score
-                    protocol.awaiting_frequency = False
-                    protocol.current_question += 1
-                    
-                    if protocol.current_question <= 7:
-                        bot_reply = f"Thank you. Next question:\n\n{protocol.get_current_question()}"
-                    else:
-                        protocol.completed = True
-                        bot_reply = protocol.get_completion_message()
-                        update_protocol_state(session_id, protocol.get_state(),
-                                            protocol.total_score, completed=True)
-                else:
-                    bot_reply = "I didn't quite catch that. Please choose a number from 1 to 4:\n\n" + protocol.get_frequency_question()
-        
-        supabase.table("chat_messages").insert({
-            "session_id": session_id,
-            "user_id": user_id,
-            "message": user_message,
-            "sender": "user"
-        }).execute()
-        
-        supabase.table("chat_messages").insert({
-            "session_id": session_id,
-            "user_id": user_id,
-            "message": bot_reply,
-            "sender": "bot"
-        }).execute()
-        
-        update_protocol_state(session_id, protocol.get_state(), protocol.total_score)
-        
-        session_data = supabase.table("chat_sessions").select("title").eq("id", session_id).execute()
-        if session_data.data and session_data.data[0]["title"] in ["New Chat", "GAD-7 Screening"]:
-            new_title = f"GAD-7 Screening - {datetime.utcnow().strftime('%b %d, %Y')}"
-            supabase.table("chat_sessions")\
-                .update({"title": new_title})\
-                .eq("id", session_id)\
-                .execute()
-        
-        return {"response": bot_reply, "session_id": session_id}
+            raise HTTPException(status_code=409, detail=STALE_STATE_DETAIL)
         
+    except HTTPException:
+        raise
+    except StaleStateError as e:
+        print(f"Conflict in chat: {str(e)}")
+        raise HTTPException(status_code=409, detail=STALE_STATE_DETAIL)
     except Exception as e:
         print(f"Error in chat: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(user_input: UserInput,
+                      idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Same turn as /api/chat, sent as Server-Sent Events.
+
+    Emits "token" events while an LLM clarification is generated (a reply that
+    needs no LLM arrives as a single token), then one "done" event with the
+    same body /api/chat returns once the turn has been persisted.
+    """
+    check_protocol_type(user_input.protocol_type)
+    
+    key = None
+    if idempotency_key:
+        key, fingerprint = idempotency_scope(user_input, idempotency_key)
+        try:
+            pending = idempotency_store.claim(key, fingerprint)
+        except IdempotencyKeyReused as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        if pending is not None:
+            # Duplicate: replay the original turn's reply as one token
+            try:
+                result = await pending
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            return sse_response([("token", {"text": result["response"]}), ("done", result)])
+    
+    def settle(result: Optional[Dict] = None, error: Optional[BaseException] = None):
+        if key is None:
+            return
+        if error is None:
+            idempotency_store.resolve(key, result)
+        else:
+            idempotency_store.reject(key, error)
+    
+    # The turn span stays open until produce() has persisted the turn
+    turn_span = tracer.start_span("chat turn", turn_attributes(user_input, "/api/chat/stream"))
+    try:
+        with tracer.use_span(turn_span, end_on_exit=False):
+            plan = await plan_chat_turn(user_input)
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        turn_span.end()
+        error = HTTPException(status_code=500, detail=str(e))
+        settle(error=error)
+        raise error
+    turn_span.set_attribute("session.id", plan["session_id"])
+    
+    events = asyncio.Queue()
+    
+    async def produce():
+        # Runs as its own task so the turn is still persisted if the client disconnects
+        nonlocal plan
+        try:
+            for attempt in range(TURN_ATTEMPTS):
+                turn_span.set_attribute("chat.attempts", attempt + 1)
+                bot_reply = plan["bot_reply"]
+                if bot_reply is None:
+                    llm = get_llm_service()
+                    parts = []
+                    request = await get_clarification_request(plan)
+                    with CHAT_STAGE_DURATION.time(stage="llm_clarify"):
+                        async for token in llm.stream_response(**request):
+                            parts.append(token)
+                            events.put_nowait(("token", {"text": token}))
+                    # Already streamed, so a conflict here cannot be replayed
+                    result = await finish_chat_turn(plan, "".join(parts))
+                    settle(result)
+                    events.put_nowait(("done", result))
+                    return
+                
+                # A fixed reply is only sent once it is committed, so it can be replayed
+                try:
+                    result = await finish_chat_turn(plan, bot_reply)
+                except StaleStateError as e:
+                    print(f"Conflict in chat stream (attempt {attempt + 1}): {str(e)}")
+                    plan = await replan_chat_turn(user_input, plan)
+                    continue
+                settle(result)
+                events.put_nowait(("token", {"text": bot_reply}))
+                events.put_nowait(("done", result))
+                return
+            
+            turn_span.record_error(StaleStateError(STALE_STATE_DETAIL))
+            settle(error=HTTPException(status_code=409, detail=STALE_STATE_DETAIL))
+            events.put_nowait(("error", {"detail": STALE_STATE_DETAIL, "status": 409}))
+        except StaleStateError as e:
+            print(f"Conflict in chat stream: {str(e)}")
+            turn_span.record_error(e)
+            settle(error=HTTPException(status_code=409, detail=STALE_STATE_DETAIL))
+            events.put_nowait(("error", {"detail": STALE_STATE_DETAIL, "status": 409}))
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            turn_span.record_error(e)
+            settle(error=HTTPException(status_code=500, detail=str(e)))
+            events.put_nowait(("error", {"detail": str(e)}))
+        finally:
+            turn_span.end()
+    
+    # Created inside the turn span so the task's Supabase and Groq spans nest under it
+    with tracer.use_span(turn_span, end_on_exit=False):
+        task = asyncio.create_task(produce())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
+    async def next_events():
+        while True:
+            event, data = await events.get()
+            yield event, data
+            if event != "token":
+                break
+    
+    return sse_response(next_events())
+
+def sse_response(events) -> StreamingResponse:
+    """Stream (event, data) pairs, given as a list or an async iterator, as Server-Sent Events"""
+    async def event_stream():
+        if isinstance(events, list):
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        else:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def plan_chat_turn(user_input: UserInput) -> Dict:
+    """Run the protocol for one message and stage its writes.
+
+    Returns a plan with the reply, or bot_reply=None when the reply still has to
+    be generated by the LLM from the plan's clarification request.
+    """
+    user_message = user_input.message
+    user_id = user_input.user_id
+    session_id = user_input.session_id
+    
+    with CHAT_STAGE_DURATION.time(stage="state_load"):
+        if not session_id:
+            engine = get_engine(user_input.protocol_type)
+            protocol = GAD7Protocol()
+            session = await storage.create_session({
+                "user_id": user_id,
+                "title": f"{engine.instrument.name} Screening",
+                "protocol_type": engine.instrument.code,
+                "protocol_state": protocol.dumps()
+            })
+            session_id = session["id"]
+            protocol.version = session.get("state_version") or 0
+            protocol.mark_clean()
+            protocol.mark_score_unsaved()
+            protocol_completed = False
+            first_message = True
+            from_cache = False
+        else:
+            first_message = None
+            cached = session_cache.get(session_id)
+            from_cache = cached is not None
+            if cached:
+                protocol, protocol_completed, protocol_type = cached
+            else:
+                protocol = GAD7Protocol()
+                protocol_completed = False
+                protocol_type = None
+                session_data = await storage.get_session_state(session_id)
+            
+                if session_data:
+                    protocol = GAD7Protocol.loads(session_data.get("protocol_state"))
+                    protocol.version = session_data.get("state_version") or 0
+                    if session_data.get("total_score") is None:
+                        protocol.mark_score_unsaved()
+                    protocol_completed = bool(session_data.get("protocol_completed"))
+                    protocol_type = session_data.get("protocol_type")
+                    session_cache.put(session_id, protocol, protocol_completed, protocol_type)
+            engine = get_engine(protocol_type)
+    
+    turn = TurnCommit(session_id, user_id, protocol_type=engine.instrument.code)
+    plan = {
+        "session_id": session_id,
+        "user_message": user_message,
+        "turn": turn,
+        "bot_reply": None,
+        "clarification": None,
+        "extra": {},
+        # Where in the flow the message was read; a retry must find the same point
+        "position": (protocol_completed, engine.state(protocol), protocol.current_question,
+                     protocol.awaiting_frequency),
+        # state_version the plan was made at, and whether it came from this worker's cache
+        "version": protocol.version,
+        "cached": from_cache
+    }
+    
+    if protocol_completed:
+        plan["bot_reply"] = "This screening has already been completed. Would you like to start a new screening session?"
+        return plan
+    
+    with CHAT_STAGE_DURATION.time(stage="crisis_check"):
+        in_crisis = protocol.check_crisis(user_message)
+    if in_crisis:
+        turn.update_protocol_state(protocol, completed=True)
+        plan["bot_reply"] = protocol.get_crisis_message()
+        plan["extra"] = {"crisis": True}
+        return plan
+    
+    state = engine.state(protocol)
+    score = None
+    
+    if state == protocol_engine.AGE_SCREENING and first_message is None:
+        first_message = await storage.count_messages(session_id) == 0
+    
+    if state == protocol_engine.AGE_SCREENING and first_message:
+        event = protocol_engine.FIRST_MESSAGE
+    elif state == protocol_engine.SYMPTOM:
+        event = await interpret_answer(engine, protocol, user_message)
+    else:
+        event, score = engine.read(state, user_message)
+    
+    result = engine.advance(protocol, state, event, score)
+    
+    if result.response is not None:
+        question_number, question_text, response_score = result.response
+        turn.save_gad7_response(question_number, question_text, user_message, response_score)
+    if result.reply is None:
+        # The reply is generated by the caller, streamed or not
+        plan["clarification"] = {"system_prompt": get_system_prompt(protocol, engine.instrument)}
+    if result.crisis:
+        plan["extra"] = {"crisis": True}
+    
+    turn.update_protocol_state(protocol, protocol.total_score, completed=result.completed)
+    turn.refresh_title(engine.instrument.name)
+    
+    plan["bot_reply"] = result.reply
+    return plan
+
+async def replan_chat_turn(user_input: UserInput, plan: Dict) -> Dict:
+    """Plan a turn again after another request for its session committed first
+
+    The message is only replayed if the session is still at the point in the
+    flow the participant answered; otherwise it would be recorded as the
+    answer to a question they never saw. A plan made from this worker's cache
+    while another worker had moved the session on is just out of date (the
+    participant answered what that worker sent), so it is replanned from
+    storage as is.
+
+    Raises:
+        StaleStateError: The other request moved the session on
+    """
+    session_id = plan["session_id"]
+    cached = session_cache.get(session_id)
+    moved_here = cached is not None and cached[0].version > plan["version"]
+    if plan["cached"] and not moved_here:
+        session_cache.invalidate(session_id)
+        return await plan_chat_turn(retry_input(user_input, plan))
+    
+    retry = await plan_chat_turn(retry_input(user_input, plan))
+    if retry["position"] != plan["position"]:
+        raise StaleStateError(f"Session {plan['session_id']} moved on from {plan['position']} to {retry['position']}")
+    return retry
+
+async def interpret_answer(engine, protocol: GAD7Protocol, user_message: str) -> str:
+    """Decide whether a symptom answer means YES, NO or UNCLEAR"""
+    # Clear answers are settled locally and repeated phrasings come from
+    # the cache; only new ambiguous ones go to the LLM
+    interpretation = answer_classifier.classify(user_message)
+    if interpretation is None:
+        interpretation = interpretation_cache.get(engine.instrument.code, protocol.current_question,
+                                                  user_message)
+    
+    if interpretation is None:
+        llm = get_llm_service()
+        with CHAT_STAGE_DURATION.time(stage="llm_classify"):
+            result = await llm.classify(
+                system_prompt=INTERPRETATION_PROMPT,
+                user_message=f'Question: "{engine.question(protocol)}"\nAnswer: "{user_message}"',
+                labels=protocol_engine.INTERPRETATIONS,
+                default=protocol_engine.UNCLEAR
+            )
+        # A verdict the model is unsure of gets a clarification, and is not cached
+        if result.fallback or result.confidence < CLASSIFY_MIN_CONFIDENCE:
+            return protocol_engine.UNCLEAR
+        interpretation = result.label
+        interpretation_cache.put(engine.instrument.code, protocol.current_question, user_message,
+                                 interpretation)
+    
+    return engine.read_interpretation(interpretation)
+
+async def get_clarification_request(plan: Dict) -> Dict:
+    """Arguments for the LLM call that generates a clarification reply"""
+    # History is loaded here, so only turns that need a clarification pay for it
+    conversation_history = await load_conversation_context(
+        plan["session_id"], plan["clarification"]["system_prompt"], plan["user_message"]
+    )
+    return {
+        "system_prompt": plan["clarification"]["system_prompt"],
+        "conversation_history": conversation_history,
+        "user_message": plan["user_message"]
+    }
+
+async def finish_chat_turn(plan: Dict, bot_reply: str) -> Dict:
+    """Persist a planned turn with its final reply and build the /chat response"""
+    # Messages, protocol state, title and any GAD-7 response are written in one transaction,
+    # unless the write-behind queue takes the bot message, response and title
+    turn = plan["turn"]
+    turn.save_messages(plan["user_message"], bot_reply)
+    if write_behind is not None:
+        write_behind.start(storage)
+    with CHAT_STAGE_DURATION.time(stage="persist"):
+        await turn.commit(storage, cache=session_cache, write_behind=write_behind)
+    
+    return {"response": bot_reply, "session_id": plan["session_id"], **plan["extra"]}
+
 @app.get("/api")
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "Backend is running on Vercel!"}
 
+@app.get("/api/metrics")
+@app.get("/metrics")
+async def metrics():
+    """Request, stage, Supabase and Groq metrics in the Prometheus text format"""
+    return Response(registry.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
 # Helper functions
-def get_system_prompt(protocol_state: Dict) -> str:
-    base_prompt = """You are a compassionate mental health screening assistant conducting a GAD-7 (Generalized Anxiety Disorder) assessment.
+INTERPRETATION_PROMPT = """You classify a participant's answer to a yes/no mental health screening question.
+YES: they experienced the symptom in the last 2 weeks.
+NO: they did not.
+UNCLEAR: the answer does not say either way."""
+# Below this model confidence a symptom answer is treated as UNCLEAR
+CLASSIFY_MIN_CONFIDENCE = float(os.getenv("CLASSIFY_MIN_CONFIDENCE", "0.6"))
+
+# Most recent messages read for a clarification request; what does not fit
+# the token budget is summarized
+CONTEXT_MAX_MESSAGES = 40
+# Most messages folded into a conversation summary per LLM call
+SUMMARY_FOLD_BATCH = 100
+CONTEXT_COLUMNS = "id, message, sender, created_at"
+
+MESSAGE_FIELDS = ["id", "session_id", "user_id", "message", "sender", "created_at"]
+EXPORT_PAGE_SIZE = 500
+
+def idempotency_scope(user_input: UserInput, idempotency_key: str):
+    """Key (per user) and request fingerprint for an Idempotency-Key"""
+    key = (user_input.user_id, idempotency_key)
+    fingerprint = (user_input.session_id, user_input.message, user_input.protocol_type)
+    return key, fingerprint
+
+def turn_attributes(user_input: UserInput, route: str) -> Dict:
+    """Attributes of a turn's root span"""
+    return {
+        "http.route": route,
+        "session.id": user_input.session_id,
+        "chat.protocol_type": user_input.protocol_type,
+        "chat.message_length": len(user_input.message)
+    }
+
+def retry_input(user_input: UserInput, plan: Dict) -> UserInput:
+    """Same message, bound to the session the first attempt used or created"""
+    return user_input.model_copy(update={"session_id": plan["session_id"]})
+
+def check_protocol_type(protocol_type: Optional[str]):
+    """Reject instruments the protocol engine does not know"""
+    if protocol_type and protocol_type not in INSTRUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown protocol_type: {protocol_type} (expected one of {', '.join(INSTRUMENTS)})"
+        )
+
+def parse_message_fields(fields: Optional[str]) -> str:
+    """Validate a ?fields= projection; the cursor columns are always selected"""
+    if not fields:
+        return "*"
+    
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in MESSAGE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    columns = [c for c in MESSAGE_FIELDS if c in requested or c in ("id", "created_at")]
+    return ", ".join(columns)
+
+def project_fields(row: Dict, fields: Optional[str]) -> Dict:
+    """Drop cursor columns the caller did not ask for"""
+    if not fields:
+        return row
+    requested = {f.strip() for f in fields.split(",")}
+    return {k: v for k, v in row.items() if k in requested}
+
+def get_system_prompt(protocol: GAD7Protocol, instrument: Instrument = GAD7) -> str:
+    base_prompt = f"""You are a compassionate mental health screening assistant conducting a {instrument.name} ({instrument.title}) assessment.
 
 CRITICAL RULES:
 1. You are NOT a therapist or doctor. You are a screening tool.
 2. NEVER diagnose or give medical advice
-3. Follow the exact GAD-7 protocol provided
+3. Follow the exact {instrument.name} protocol provided
 4. Be conversational but professional
 5. If user is confused, provide clarification gently
 6. If user goes off-topic, gently guide them back
@@ -435,75 +803,84 @@ CRITICAL RULES:
 
 YOUR TONE: Warm, supportive, non-judgmental, like a caring healthcare worker."""
 
-    if not protocol_state.get("consent_given"):
+    if not protocol.consent_given:
         return base_prompt + "\n\nCurrent task: Obtain informed consent for the screening."
     
-    elif protocol_state.get("awaiting_frequency"):
+    elif protocol.awaiting_frequency:
         return base_prompt + "\n\nCurrent task: Get the frequency score (0-3) for the last question asked."
     
     else:
-        current_q = protocol_state.get("current_question", 0)
-        if 1 <= current_q <= 7:
-            return base_prompt + f"\n\nCurrent task: Ask GAD-7 question {current_q} and determine if they experienced this symptom (yes/no/unsure)."
+        current_q = protocol.current_question
+        if 1 <= current_q <= len(instrument.questions):
+            return base_prompt + f"\n\nCurrent task: Ask {instrument.name} question {current_q} and determine if they experienced this symptom (yes/no/unsure)."
     
     return base_prompt
 
-def load_conversation_context(session_id: str) -> List[Dict]:
+async def load_conversation_context(session_id: str, system_prompt: str, user_message: str) -> List[Dict]:
+    """The session summary and the newest messages that fit the context token budget"""
     try:
-        response = supabase.table("chat_messages")\
-            .select("message, sender")\
-            .eq("session_id", session_id)\
-            .order("created_at", desc=False)\
-            .execute()
+        # Newest messages first so the database stops after CONTEXT_MAX_MESSAGES rows
+        summary, rows = await asyncio.gather(
+            storage.get_summary(session_id),
+            storage.list_messages(session_id, columns=CONTEXT_COLUMNS, limit=CONTEXT_MAX_MESSAGES,
+                                  descending=True)
+        )
+        summary = summary or {}
+        rows.reverse()
+        unsummarized = [row for row in rows if not is_summarized(row, summary)]
+        
+        context, kept = context_builder.build(system_prompt, user_message, unsummarized,
+                                              summary.get("conversation_summary"))
         
-        context = []
-        for msg in response.data:
-            role = "user" if msg["sender"] == "user" else "assistant"
-            context.append({"role": role, "content": msg["message"]})
+        # Messages left out (or not even read) go into the summary for later turns
+        if kept < len(unsummarized) or len(unsummarized) == CONTEXT_MAX_MESSAGES:
+            boundary = unsummarized[len(unsummarized) - kept] if kept else None
+            schedule_summary_fold(session_id, summary, boundary)
         
         return context
     except Exception as e:
         print(f"Error loading context: {e}")
         return []
 
-def save_gad7_response(session_id: str, user_id: str, question_num: int, 
-                       question_text: str, user_response: str, score: Optional[int]):
-    try:
-        supabase.table("gad7_responses").insert({
-            "session_id": session_id,
-            "user_id": user_id,
-            "question_number": question_num,
-            "question_text": question_text,
-            "user_response": user_response,
-            "score": score
-        }).execute()
-    except Exception as e:
-        print(f"Error saving GAD-7 response: {e}")
+def is_summarized(row: Dict, summary: Dict) -> bool:
+    """Whether a message is already covered by the session summary"""
+    through = parse_timestamp(summary.get("summary_through"))
+    if through is None:
+        return False
+    return (parse_timestamp(row["created_at"]), row["id"]) <= (through, summary["summary_through_id"])
 
-def update_protocol_state(session_id: str, protocol_state: Dict, 
-                          total_score: int = None, completed: bool = False):
+def schedule_summary_fold(session_id: str, summary: Dict, boundary: Optional[Dict]):
+    """Update the session summary in the background, once at a time per session"""
+    if session_id in _summarizing:
+        return
+    _summarizing.add(session_id)
+    task = asyncio.create_task(fold_conversation_summary(session_id, summary, boundary))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def fold_conversation_summary(session_id: str, summary: Dict, boundary: Optional[Dict]):
+    """Fold the messages after the summary and before boundary (all if None) into it"""
     try:
-        update_data = {
-            "protocol_state": json.dumps(protocol_state),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        if total_score is not None:
-            update_data["total_score"] = total_score
-            # The original code here used GAD7Protocol().calculate_severity() but it needs 'self.total_score'
-            # so it cannot be called on a new instance without state.
-            # Assuming 'total_score' is the final score for severity calculation.
-            temp_protocol = GAD7Protocol()
-            temp_protocol.total_score = total_score
-            update_data["severity_level"] = temp_protocol.calculate_severity()
+        previous_id = summary.get("summary_through_id")
+        after = (summary["summary_through"], previous_id) if previous_id else None
+        rows = await storage.list_messages(session_id, columns=CONTEXT_COLUMNS, limit=SUMMARY_FOLD_BATCH,
+                                           after=after)
+        if boundary is not None:
+            end = (parse_timestamp(boundary["created_at"]), boundary["id"])
+            rows = [row for row in rows if (parse_timestamp(row["created_at"]), row["id"]) < end]
+        if not rows:
+            return
         
-        if completed:
-            update_data["protocol_completed"] = True
-        
-        supabase.table("chat_sessions")\
-            .update(update_data)\
-            .eq("id", session_id)\
-            .execute()
+        # Leave headroom: the token estimate can run above the model's own count
+        new_summary = await get_llm_service().summarize(
+            summary.get("conversation_summary"),
+            [to_chat_message(row) for row in rows],
+            max_tokens=context_builder.summary_budget * 3 // 4
+        )
+        if new_summary:
+            through = (rows[-1]["created_at"], rows[-1]["id"])
+            await storage.save_summary(session_id, new_summary, through, previous_id)
     except Exception as e:
-        print(f"Error updating protocol state: {e}")
-
+        print(f"Error updating conversation summary: {e}")
+    finally:
+        _summarizing.discard(session_id)
@@ -0,0 +1,229 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import math
+import threading
+import time
+
+# Supabase requests made while handling the current HTTP request
+_supabase_calls: ContextVar[Optional[List[int]]] = ContextVar("supabase_calls", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in a with-block (also across awaits)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter"""
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help, labelnames)
+        return self._metrics[name]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help, labelnames, buckets)
+        return self._metrics[name]
+
+    def register_stats(self, prefix: str, stats: Callable[[], Dict]):
+        """
+        Expose a component's stats() dict as gauges
+
+        Numeric values become <prefix>_<key>; nested dicts are flattened with
+        their keys joined by underscores. Non-numeric values are skipped.
+        """
+        self._collectors = [(p, s) for p, s in self._collectors if p != prefix]
+        self._collectors.append((prefix, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        for prefix, stats in self._collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Error collecting {prefix} stats: {e}")
+                continue
+            for name, value in self._flatten(prefix, values):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _flatten(self, prefix: str, values: Dict):
+        for key, value in values.items():
+            name = f"{prefix}_{key}".replace(" ", "_").replace("-", "_")
+            if isinstance(value, dict):
+                yield from self._flatten(name, value)
+            elif isinstance(value, bool):
+                yield name, int(value)
+            elif isinstance(value, (int, float)):
+                yield name, value
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route (until the body is sent)", ("method", "route"))
+SUPABASE_REQUESTS = registry.counter(
+    "supabase_requests_total", "PostgREST requests by table (or rpc) and HTTP method", ("table", "method"))
+SUPABASE_PER_REQUEST = registry.histogram(
+    "supabase_requests_per_http_request", "PostgREST round trips made while handling one HTTP request",
+    ("route",), buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21))
+CHAT_STAGE_DURATION = registry.histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a /chat turn", ("stage",))
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and Supabase round trips per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+        calls = [0]
+        token = _supabase_calls.set(calls)
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template, not the raw path, keeps label values bounded
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            HTTP_DURATION.observe(time.perf_counter() - start, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status[0])
+            SUPABASE_PER_REQUEST.observe(calls[0], route=route)
+            _supabase_calls.reset(token)
+
+async def count_supabase_request(request):
+    """httpx request hook for the PostgREST session"""
+    parts = request.url.path.split("/rest/v1/", 1)
+    table = parts[1].strip("/") if len(parts) == 2 else "other"
+    SUPABASE_REQUESTS.inc(table=table, method=request.method)
+
+    calls = _supabase_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+def instrument_supabase(client):
+    """
+    Count requests made through the client's PostgREST session
+
+    Safe to call on every use: supabase-py replaces the PostgREST client
+    after auth events, so the hook is re-added when the session changes.
+    """
+    hooks = client.postgrest.session.event_hooks["request"]
+    if count_supabase_request not in hooks:
+        hooks.append(count_supabase_request)
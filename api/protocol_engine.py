@@ -0,0 +1,208 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from . import instruments
+from .instruments import Instrument, INSTRUMENTS, DEFAULT_INSTRUMENT
+
+# Protocol states
+AGE_SCREENING = "age_screening"
+CRISIS_SCREENING = "crisis_screening"
+CONSENT = "consent"
+SYMPTOM = "symptom"
+FREQUENCY = "frequency"
+FINISHED = "finished"
+
+# Inputs
+FIRST_MESSAGE = "FIRST_MESSAGE"  # nothing has been asked yet in this session
+YES = "YES"
+NO = "NO"
+UNCLEAR = "UNCLEAR"
+# Verdicts on a symptom answer
+INTERPRETATIONS = (YES, NO, UNCLEAR)
+SCORE = "SCORE"
+
+AFFIRMATIVE = ("yes", "yeah", "yep")
+NEGATIVE = ("no", "nope")
+
+class TurnResult(NamedTuple):
+    reply: Optional[str]                        # None: the caller generates a clarification
+    completed: bool = False
+    response: Optional[Tuple[int, str, int]] = None  # (question number, question text, score) to store
+    crisis: bool = False
+
+class ProtocolEngine:
+    """Table-driven screening flow for one instrument
+
+    The state is derived from the protocol fields, the reply is reduced to an
+    input (YES/NO/UNCLEAR/SCORE), and the (state, input) pair is looked up in a
+    transition table built once per instrument. Nothing here does I/O, so
+    symptom answers are interpreted by the caller and passed in.
+    """
+
+    def __init__(self, instrument: Instrument):
+        self.instrument = instrument
+        self._transitions = {
+            (AGE_SCREENING, FIRST_MESSAGE): self._ask_age,
+            (AGE_SCREENING, YES): self._adult,
+            (AGE_SCREENING, NO): self._underage,
+            (AGE_SCREENING, UNCLEAR): self._repeat_age,
+            (CRISIS_SCREENING, NO): self._not_in_crisis,
+            (CRISIS_SCREENING, YES): self._in_crisis,
+            (CRISIS_SCREENING, UNCLEAR): self._repeat_crisis,
+            (CONSENT, YES): self._consented,
+            (CONSENT, NO): self._declined,
+            (SYMPTOM, YES): self._symptom_present,
+            (SYMPTOM, NO): self._symptom_absent,
+            (SYMPTOM, UNCLEAR): self._clarify,
+            (FREQUENCY, SCORE): self._scored,
+            (FREQUENCY, UNCLEAR): self._repeat_frequency,
+        }
+        self._readers = {
+            AGE_SCREENING: self._read_yes_first,
+            CRISIS_SCREENING: self._read_no_first,
+            CONSENT: self._read_consent,
+            FREQUENCY: self._read_frequency,
+        }
+
+    def state(self, protocol) -> str:
+        """Where the session is in the flow"""
+        if protocol.current_question == 0 and not protocol.screening_passed:
+            if protocol.screening_step == 0:
+                return AGE_SCREENING
+            if protocol.screening_step == 1:
+                return CRISIS_SCREENING
+            return FINISHED
+        if protocol.screening_passed and not protocol.consent_given:
+            return CONSENT
+        if 1 <= protocol.current_question <= len(self.instrument.questions):
+            return FREQUENCY if protocol.awaiting_frequency else SYMPTOM
+        return FINISHED
+
+    def question(self, protocol) -> Optional[str]:
+        """Text of the current question"""
+        question = self.instrument.question(protocol.current_question)
+        return question.text if question else None
+
+    def read(self, state: str, user_message: str) -> Tuple[str, Optional[int]]:
+        """
+        Reduce a reply to an input for the transition table
+
+        Symptom answers need the LLM, so for SYMPTOM use read_interpretation.
+
+        Returns:
+            (input, score); score is only set for SCORE
+        """
+        reader = self._readers.get(state)
+        if reader is None:
+            return UNCLEAR, None
+        return reader(user_message)
+
+    @staticmethod
+    def read_interpretation(interpretation: str) -> str:
+        """Map a YES/NO/UNCLEAR verdict on a symptom answer to an input"""
+        verdict = interpretation.strip().upper()
+        return verdict if verdict in INTERPRETATIONS else UNCLEAR
+
+    def advance(self, protocol, state: str, event: str, score: Optional[int] = None) -> TurnResult:
+        """Apply one transition to the protocol and return the reply"""
+        handler = self._transitions.get((state, event))
+        if handler is None:
+            return TurnResult("")
+        return handler(protocol, score)
+
+    # --- readers ---
+    def _read_yes_first(self, user_message: str):
+        user_lower = user_message.lower().strip()
+        if any(word in user_lower for word in AFFIRMATIVE):
+            return YES, None
+        if any(word in user_lower for word in NEGATIVE):
+            return NO, None
+        return UNCLEAR, None
+
+    def _read_no_first(self, user_message: str):
+        user_lower = user_message.lower().strip()
+        if any(word in user_lower for word in NEGATIVE):
+            return NO, None
+        if any(word in user_lower for word in AFFIRMATIVE):
+            return YES, None
+        return UNCLEAR, None
+
+    def _read_consent(self, user_message: str):
+        return (YES if "yes" in user_message.lower() else NO), None
+
+    def _read_frequency(self, user_message: str):
+        score = self.instrument.read_frequency(user_message)
+        return (UNCLEAR, None) if score is None else (SCORE, score)
+
+    # --- transitions ---
+    def _ask_age(self, protocol, score):
+        return TurnResult(instruments.AGE_SCREENING)
+
+    def _adult(self, protocol, score):
+        protocol.screening_step = 1
+        return TurnResult(instruments.CRISIS_SCREENING)
+
+    def _underage(self, protocol, score):
+        return TurnResult(instruments.UNDERAGE, completed=True)
+
+    def _repeat_age(self, protocol, score):
+        return TurnResult(instruments.AGE_RETRY)
+
+    def _not_in_crisis(self, protocol, score):
+        protocol.screening_passed = True
+        protocol.screening_step = 2
+        return TurnResult(instruments.CONSENT)
+
+    def _in_crisis(self, protocol, score):
+        return TurnResult(instruments.CRISIS_MESSAGE, completed=True)
+
+    def _repeat_crisis(self, protocol, score):
+        return TurnResult(instruments.CRISIS_RETRY)
+
+    def _consented(self, protocol, score):
+        protocol.consent_given = True
+        protocol.current_question = 1
+        return TurnResult(instruments.CONSENTED + self.question(protocol))
+
+    def _declined(self, protocol, score):
+        return TurnResult(instruments.DECLINED, completed=True)
+
+    def _symptom_present(self, protocol, score):
+        if protocol.current_question in self.instrument.crisis_questions:
+            return TurnResult(instruments.CRISIS_MESSAGE, completed=True, crisis=True)
+        protocol.awaiting_frequency = True
+        return TurnResult(instruments.FREQUENCY_QUESTION)
+
+    def _symptom_absent(self, protocol, score):
+        response = (protocol.current_question, self.question(protocol), 0)
+        return self._next_question(protocol, "", response)
+
+    def _clarify(self, protocol, score):
+        return TurnResult(None)
+
+    def _scored(self, protocol, score):
+        response = (protocol.current_question, self.question(protocol), score)
+        protocol.total_score += score
+        protocol.awaiting_frequency = False
+        return self._next_question(protocol, instruments.NEXT_QUESTION, response)
+
+    def _repeat_frequency(self, protocol, score):
+        return TurnResult(instruments.FREQUENCY_RETRY + instruments.FREQUENCY_QUESTION)
+
+    def _next_question(self, protocol, prefix: str, response) -> TurnResult:
+        protocol.current_question += 1
+        if protocol.current_question <= len(self.instrument.questions):
+            return TurnResult(prefix + self.question(protocol), response=response)
+
+        protocol.completed = True
+        return TurnResult(
+            self.instrument.completion_message(protocol.total_score),
+            completed=True,
+            response=response
+        )
+
+# One compiled engine per instrument, shared by all sessions
+ENGINES: Dict[str, ProtocolEngine] = {code: ProtocolEngine(instrument) for code, instrument in INSTRUMENTS.items()}
+
+def get_engine(protocol_type: Optional[str] = None) -> ProtocolEngine:
+    """Engine for a chat_sessions.protocol_type (GAD-7 if unknown or unset)"""
+    return ENGINES.get(protocol_type) or ENGINES[DEFAULT_INSTRUMENT]
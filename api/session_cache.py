@@ -0,0 +1,47 @@
+from typing import Dict, Optional, Tuple
+
+from .cache import LRUCache
+from .gad7_protocol import GAD7Protocol
+
+class SessionStateCache:
+    """Write-through cache of hydrated protocol objects keyed by session_id"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 120):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, session_id: str) -> Optional[Tuple[GAD7Protocol, bool, Optional[str]]]:
+        """
+        Get a private copy of the cached protocol with its completed flag and instrument
+
+        Returns:
+            (protocol, protocol_completed, protocol_type), or None on a miss
+        """
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+
+        protocol, completed, protocol_type = entry
+        return protocol.copy(), completed, protocol_type
+
+    def put(self, session_id: str, protocol: GAD7Protocol, completed: bool = False,
+            protocol_type: Optional[str] = None):
+        """Cache the state most recently read from or written to chat_sessions"""
+        self._cache.set(session_id, (protocol.copy(), completed, protocol_type))
+
+    def invalidate(self, session_id: str, version: Optional[int] = None):
+        """
+        Drop a session whose stored state is no longer known
+
+        Args:
+            version: Only drop the entry if it is not newer than this
+                state_version (a newer one was written by a request that succeeded)
+        """
+        if version is not None:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry[0].version > version:
+                return
+        self._cache.pop(session_id)
+
+    def stats(self) -> Dict:
+        """Get hit/miss/eviction counters"""
+        return self._cache.stats()
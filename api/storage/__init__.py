@@ -0,0 +1,25 @@
+import os
+
+from .base import Cursor, DEFAULT_TITLES, StaleStateError, Storage
+from .sqlite_storage import SQLiteStorage
+from .supabase_storage import SupabaseStorage
+
+BACKENDS = ("supabase", "sqlite")
+
+def create_storage(get_supabase=None) -> Storage:
+    """
+    Create the storage backend selected by STORAGE_BACKEND
+
+    Args:
+        get_supabase: Coroutine function returning the async Supabase client,
+            required for the supabase backend
+    """
+    backend = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    if backend == "sqlite":
+        return SQLiteStorage(os.getenv("STORAGE_SQLITE_PATH", "chat.sqlite3"))
+    if backend == "supabase":
+        if get_supabase is None:
+            raise ValueError("The supabase storage backend needs a Supabase client")
+        return SupabaseStorage(get_supabase)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected one of: {', '.join(BACKENDS)}")
+
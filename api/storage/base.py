@@ -0,0 +1,108 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# (created_at or updated_at, id) of the last row of a page; id may be None
+Cursor = Tuple[str, Optional[str]]
+
+# Titles a session has until its first turn gives it a dated one
+DEFAULT_TITLES = ("New Chat", "GAD-7 Screening", "PHQ-9 Screening")
+
+SESSION_LIST_COLUMNS = "id, title, created_at, updated_at, message_count"
+SESSION_STATE_COLUMNS = "protocol_state, protocol_completed, protocol_type, state_version, total_score"
+SESSION_SUMMARY_COLUMNS = "conversation_summary, summary_through, summary_through_id"
+
+class StaleStateError(Exception):
+    """The session's protocol state was changed by another turn after it was read"""
+
+class Storage(ABC):
+    """Data access for chat sessions, messages, GAD-7 responses and protocol state
+
+    Rows are plain dicts with the chat_sessions / chat_messages /
+    gad7_responses column names. Timestamps are ISO 8601 strings, and
+    pages are keyset pages ordered by (timestamp, id).
+    """
+
+    name = "storage"
+
+    @abstractmethod
+    async def create_session(self, session: Dict) -> Dict:
+        """Insert a chat_sessions row (user_id and any other columns) and return it"""
+
+    @abstractmethod
+    async def get_session_state(self, session_id: str) -> Optional[Dict]:
+        """Get protocol_state, protocol_completed, protocol_type, state_version and total_score, or None"""
+
+    @abstractmethod
+    async def get_summary(self, session_id: str) -> Optional[Dict]:
+        """
+        Get a session's rolling conversation summary, or None if the session is gone
+
+        Returns:
+            conversation_summary and the (summary_through, summary_through_id)
+            cursor of the last message it covers; all None before the first one
+        """
+
+    @abstractmethod
+    async def save_summary(self, session_id: str, summary: str, through: Cursor,
+                           previous_id: Optional[str]) -> bool:
+        """
+        Replace a session's summary if it still ends at previous_id
+
+        Returns:
+            False if another update replaced the summary first (nothing was written)
+        """
+
+    @abstractmethod
+    async def list_sessions(self, user_id: str, limit: Optional[int] = None,
+                            before: Optional[Cursor] = None) -> List[Dict]:
+        """A user's sessions, most recently updated first, optionally before a cursor"""
+
+    @abstractmethod
+    async def update_session_title(self, session_id: str, title: str):
+        """Set a session's title and bump updated_at"""
+
+    @abstractmethod
+    async def delete_session(self, session_id: str):
+        """Delete a session with its messages and responses"""
+
+    @abstractmethod
+    async def list_messages(self, session_id: str, columns: str = "*", limit: Optional[int] = None,
+                            before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+                            descending: bool = False) -> List[Dict]:
+        """
+        A page of a session's messages in (created_at, id) order
+
+        Args:
+            columns: "*" or a comma-separated list of chat_messages columns
+            before/after: Only rows strictly before/after this cursor
+            descending: Newest first
+        """
+
+    @abstractmethod
+    async def count_messages(self, session_id: str) -> int:
+        """Number of messages stored for a session"""
+
+    @abstractmethod
+    async def commit_turn(self, params: Dict) -> Dict:
+        """
+        Persist one /chat turn atomically (see TurnCommit.to_params for the arguments)
+
+        Returns:
+            session_id, message_count, state_version and user_message_at
+
+        Raises:
+            StaleStateError: p_expected_version no longer matches; nothing was written
+        """
+
+    @abstractmethod
+    async def flush_turn_writes(self, messages: List[Dict], responses: List[Dict],
+                                titles: List[Dict]) -> Dict:
+        """
+        Store writes deferred by the write-behind queue
+
+        Rows that are already stored (same id) or whose session is gone are
+        skipped, so a batch can be retried safely.
+        """
+
+    async def close(self):
+        """Release connections"""
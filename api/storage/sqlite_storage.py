@@ -0,0 +1,346 @@
+import asyncio
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from .base import (Cursor, DEFAULT_TITLES, SESSION_LIST_COLUMNS, SESSION_STATE_COLUMNS, SESSION_SUMMARY_COLUMNS,
+                   StaleStateError, Storage)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT 'New Chat',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    protocol_type TEXT,
+    protocol_state TEXT,
+    protocol_completed INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER,
+    severity_level TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    state_version INTEGER NOT NULL DEFAULT 0,
+    conversation_summary TEXT,
+    summary_through TEXT,
+    summary_through_id TEXT
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_user_updated ON chat_sessions (user_id, updated_at, id);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_messages_session_created ON chat_messages (session_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS gad7_responses (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    question_number INTEGER NOT NULL,
+    question_text TEXT,
+    user_response TEXT,
+    score INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS gad7_responses_session ON gad7_responses (session_id);
+CREATE INDEX IF NOT EXISTS gad7_responses_user ON gad7_responses (user_id);
+"""
+
+SESSION_COLUMNS = (
+    "id", "user_id", "title", "created_at", "updated_at", "protocol_type", "protocol_state",
+    "protocol_completed", "total_score", "severity_level", "message_count", "state_version",
+    "conversation_summary", "summary_through", "summary_through_id"
+)
+# Columns added after the first release, for databases created before them
+ADDED_SESSION_COLUMNS = ("conversation_summary", "summary_through", "summary_through_id")
+MESSAGE_COLUMNS = ("id", "session_id", "user_id", "message", "sender", "created_at")
+
+SELECT_SESSION_STATE = f"SELECT {SESSION_STATE_COLUMNS} FROM chat_sessions WHERE id = ?"
+SELECT_SUMMARY = f"SELECT {SESSION_SUMMARY_COLUMNS} FROM chat_sessions WHERE id = ?"
+UPDATE_SUMMARY = """
+UPDATE chat_sessions SET conversation_summary = ?, summary_through = ?, summary_through_id = ?
+WHERE id = ? AND summary_through_id IS ?
+"""
+INSERT_MESSAGE = """
+INSERT OR IGNORE INTO chat_messages (id, session_id, user_id, message, sender, created_at)
+SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM chat_sessions WHERE id = ?)
+"""
+INSERT_RESPONSE = """
+INSERT OR IGNORE INTO gad7_responses (
+    id, session_id, user_id, question_number, question_text, user_response, score, created_at
+)
+SELECT ?, ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM chat_sessions WHERE id = ?)
+"""
+BUMP_MESSAGE_COUNT = "UPDATE chat_sessions SET message_count = message_count + ? WHERE id = ?"
+TITLE_IF_DEFAULT = (
+    "UPDATE chat_sessions SET title = ? WHERE id = ? "
+    f"AND title IN ({', '.join('?' * len(DEFAULT_TITLES))})"
+)
+# Same effect as the commit_chat_turn SQL function
+COMMIT_SESSION = """
+UPDATE chat_sessions
+SET message_count = message_count + :message_delta,
+    protocol_state = COALESCE(:p_protocol_state, protocol_state),
+    state_version = state_version
+                    + CASE WHEN :p_protocol_state IS NOT NULL OR :p_completed THEN 1 ELSE 0 END,
+    updated_at = CASE WHEN :p_touch_session OR :p_protocol_state IS NOT NULL THEN :now
+                      ELSE updated_at END,
+    total_score = COALESCE(:p_total_score, total_score),
+    severity_level = CASE WHEN :p_total_score IS NULL THEN severity_level
+                          ELSE :p_severity_level END,
+    protocol_completed = protocol_completed OR :p_completed
+WHERE id = :p_session_id
+  AND (:p_expected_version IS NULL OR state_version = :p_expected_version)
+RETURNING message_count, state_version
+"""
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def format_timestamp(value: datetime) -> str:
+    """ISO 8601 in UTC with microseconds, so timestamps sort as text"""
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+class SQLiteStorage(Storage):
+    """
+    Storage in an embedded SQLite database, for single-node deployments and local runs
+
+    One connection in WAL mode is shared behind a lock; queries run in a
+    worker thread so they don't block the event loop. Statements are
+    parameterized with fixed SQL text, so sqlite3's statement cache reuses
+    the prepared statements.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Database file, created with the schema if missing (":memory:" for tests)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                     cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(chat_sessions)")}
+        for column in ADDED_SESSION_COLUMNS:
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE chat_sessions ADD COLUMN {column} TEXT")
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _transaction(self, fn, *args):
+        """Run fn(*args) inside BEGIN IMMEDIATE ... COMMIT"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    def _query(self, sql: str, params=()) -> List[Dict]:
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    async def create_session(self, session: Dict) -> Dict:
+        now = format_timestamp(utc_now())
+        row = dict({"id": str(uuid.uuid4()), "title": "New Chat", "created_at": now, "updated_at": now},
+                   **session)
+        columns = select_columns(",".join(row), SESSION_COLUMNS).split(", ")
+        sql = (f"INSERT INTO chat_sessions ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))}) RETURNING *")
+        rows = await self._run(self._query, sql, [row[column] for column in columns])
+        return to_session(rows[0])
+
+    async def get_session_state(self, session_id: str) -> Optional[Dict]:
+        rows = await self._run(self._query, SELECT_SESSION_STATE, (session_id,))
+        return to_session(rows[0]) if rows else None
+
+    async def get_summary(self, session_id: str) -> Optional[Dict]:
+        rows = await self._run(self._query, SELECT_SUMMARY, (session_id,))
+        return rows[0] if rows else None
+
+    async def save_summary(self, session_id: str, summary: str, through: Cursor,
+                           previous_id: Optional[str]) -> bool:
+        cursor = await self._run(self._conn.execute, UPDATE_SUMMARY,
+                                 (summary, through[0], through[1], session_id, previous_id))
+        return cursor.rowcount > 0
+
+    async def list_sessions(self, user_id: str, limit: Optional[int] = None,
+                            before: Optional[Cursor] = None) -> List[Dict]:
+        sql = f"SELECT {SESSION_LIST_COLUMNS} FROM chat_sessions WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            sql, params = keyset(sql, params, "updated_at", "<", before)
+        sql += " ORDER BY updated_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return await self._run(self._query, sql, params)
+
+    async def update_session_title(self, session_id: str, title: str):
+        await self._run(self._query, "UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?",
+                        (title, format_timestamp(utc_now()), session_id))
+
+    async def delete_session(self, session_id: str):
+        await self._run(self._query, "DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+
+    async def list_messages(self, session_id: str, columns: str = "*", limit: Optional[int] = None,
+                            before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+                            descending: bool = False) -> List[Dict]:
+        sql = f"SELECT {select_columns(columns, MESSAGE_COLUMNS)} FROM chat_messages WHERE session_id = ?"
+        params = [session_id]
+        if before:
+            sql, params = keyset(sql, params, "created_at", "<", before)
+        elif after:
+            sql, params = keyset(sql, params, "created_at", ">", after)
+        order = "DESC" if descending else "ASC"
+        sql += f" ORDER BY created_at {order}, id {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return await self._run(self._query, sql, params)
+
+    async def count_messages(self, session_id: str) -> int:
+        rows = await self._run(self._query, "SELECT COUNT(*) AS n FROM chat_messages WHERE session_id = ?",
+                               (session_id,))
+        return rows[0]["n"]
+
+    async def commit_turn(self, params: Dict) -> Dict:
+        return await self._run(self._transaction, self._commit_turn, params)
+
+    def _commit_turn(self, params: Dict) -> Dict:
+        sent_at = utc_now()
+        session_id = params["p_session_id"]
+        values = dict(params,
+                      p_touch_session=bool(params.get("p_touch_session")),
+                      p_completed=bool(params.get("p_completed")),
+                      message_delta=1 if params.get("p_bot_reply") is None else 2,
+                      now=format_timestamp(sent_at))
+        rows = self._query(COMMIT_SESSION, values)
+        if not rows:
+            if self._query("SELECT 1 FROM chat_sessions WHERE id = ?", (session_id,)):
+                raise StaleStateError(f"protocol state of session {session_id} changed since it was read")
+            # Like the SQL function, a missing session only fails on the insert below
+            rows = [{"message_count": None, "state_version": None}]
+
+        messages = [(params["p_user_message"], "user", sent_at)]
+        if params.get("p_bot_reply") is not None:
+            messages.append((params["p_bot_reply"], "bot", sent_at + timedelta(milliseconds=1)))
+        for message, sender, created_at in messages:
+            self._conn.execute(
+                "INSERT INTO chat_messages (id, session_id, user_id, message, sender, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(uuid.uuid4()), session_id, params["p_user_id"], message, sender,
+                 format_timestamp(created_at))
+            )
+
+        response = params.get("p_gad7_response")
+        if response:
+            self._conn.execute(
+                "INSERT INTO gad7_responses (id, session_id, user_id, question_number, question_text, "
+                "user_response, score, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(uuid.uuid4()), session_id, params["p_user_id"], response["question_number"],
+                 response.get("question_text"), response.get("user_response"), response.get("score"),
+                 format_timestamp(sent_at))
+            )
+
+        if params.get("p_title"):
+            self._conn.execute(TITLE_IF_DEFAULT, (params["p_title"], session_id, *DEFAULT_TITLES))
+
+        return {
+            "session_id": session_id,
+            "message_count": rows[0]["message_count"],
+            "state_version": rows[0]["state_version"],
+            "user_message_at": format_timestamp(sent_at)
+        }
+
+    async def flush_turn_writes(self, messages: List[Dict], responses: List[Dict],
+                                titles: List[Dict]) -> Dict:
+        return await self._run(self._transaction, self._flush_turn_writes, messages, responses, titles)
+
+    def _flush_turn_writes(self, messages: List[Dict], responses: List[Dict], titles: List[Dict]) -> Dict:
+        counts = {"messages": 0, "responses": 0, "titles": 0}
+        inserted: Dict[str, int] = {}
+        for message in messages:
+            cursor = self._conn.execute(INSERT_MESSAGE, (
+                message["id"], message["session_id"], message["user_id"], message["message"],
+                message["sender"], message["created_at"], message["session_id"]
+            ))
+            if cursor.rowcount > 0:
+                inserted[message["session_id"]] = inserted.get(message["session_id"], 0) + 1
+        for session_id, count in inserted.items():
+            self._conn.execute(BUMP_MESSAGE_COUNT, (count, session_id))
+            counts["messages"] += count
+
+        created_at = format_timestamp(utc_now())
+        for response in responses:
+            cursor = self._conn.execute(INSERT_RESPONSE, (
+                response["id"], response["session_id"], response["user_id"], response["question_number"],
+                response.get("question_text"), response.get("user_response"), response.get("score"),
+                created_at, response["session_id"]
+            ))
+            counts["responses"] += max(cursor.rowcount, 0)
+
+        for title in titles:
+            cursor = self._conn.execute(TITLE_IF_DEFAULT, (title["title"], title["id"], *DEFAULT_TITLES))
+            counts["titles"] += max(cursor.rowcount, 0)
+        return counts
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+def select_columns(columns: str, allowed) -> str:
+    """Validate a "*" or comma-separated column list against a table's columns"""
+    if columns.strip() == "*":
+        return "*"
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown or not names:
+        raise ValueError(f"Unknown columns: {', '.join(unknown) or columns!r}")
+    return ", ".join(names)
+
+def keyset(sql: str, params: List, column: str, op: str, cursor: Cursor):
+    """Add a strictly before/after (column, id) condition to a query"""
+    value, row_id = cursor
+    if row_id:
+        sql += f" AND ({column} {op} ? OR ({column} = ? AND id {op} ?))"
+        params += [format_cursor(value), format_cursor(value), row_id]
+    else:
+        sql += f" AND {column} {op} ?"
+        params.append(format_cursor(value))
+    return sql, params
+
+def format_cursor(value: str) -> str:
+    """Normalize a client-supplied timestamp to the stored format"""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return format_timestamp(parsed)
+
+def to_session(row: Dict) -> Dict:
+    """Return protocol_completed as a bool, as PostgREST does"""
+    if "protocol_completed" in row:
+        row["protocol_completed"] = bool(row["protocol_completed"])
+    return row
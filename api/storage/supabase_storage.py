@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from postgrest.exceptions import APIError
+
+from .base import (Cursor, SESSION_LIST_COLUMNS, SESSION_STATE_COLUMNS, SESSION_SUMMARY_COLUMNS,
+                   StaleStateError, Storage)
+
+class SupabaseStorage(Storage):
+    """Storage in Supabase tables, with turns committed through the SQL functions"""
+
+    name = "supabase"
+
+    COMMIT_RPC = "commit_chat_turn"
+    FLUSH_RPC = "flush_turn_writes"
+    # SQLSTATE raised by commit_chat_turn on a version mismatch (HTTP 409 from PostgREST)
+    CONFLICT_CODE = "PT409"
+
+    def __init__(self, get_client: Callable[[], Awaitable]):
+        """
+        Args:
+            get_client: Coroutine function returning the shared async Supabase client
+        """
+        self._get_client = get_client
+
+    async def create_session(self, session: Dict) -> Dict:
+        supabase = await self._get_client()
+        response = await supabase.table("chat_sessions").insert(session).execute()
+        if not response.data:
+            raise RuntimeError("Failed to create session")
+        return response.data[0]
+
+    async def get_session_state(self, session_id: str) -> Optional[Dict]:
+        supabase = await self._get_client()
+        response = await supabase.table("chat_sessions")\
+            .select(SESSION_STATE_COLUMNS)\
+            .eq("id", session_id)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    async def get_summary(self, session_id: str) -> Optional[Dict]:
+        supabase = await self._get_client()
+        response = await supabase.table("chat_sessions")\
+            .select(SESSION_SUMMARY_COLUMNS)\
+            .eq("id", session_id)\
+            .execute()
+        return response.data[0] if response.data else None
+
+    async def save_summary(self, session_id: str, summary: str, through: Cursor,
+                           previous_id: Optional[str]) -> bool:
+        supabase = await self._get_client()
+        query = supabase.table("chat_sessions")\
+            .update({
+                "conversation_summary": summary,
+                "summary_through": through[0],
+                "summary_through_id": through[1]
+            })\
+            .eq("id", session_id)
+        if previous_id:
+            query = query.eq("summary_through_id", previous_id)
+        else:
+            query = query.is_("summary_through_id", "null")
+        response = await query.execute()
+        return bool(response.data)
+
+    async def list_sessions(self, user_id: str, limit: Optional[int] = None,
+                            before: Optional[Cursor] = None) -> List[Dict]:
+        supabase = await self._get_client()
+        query = supabase.table("chat_sessions")\
+            .select(SESSION_LIST_COLUMNS)\
+            .eq("user_id", user_id)
+        if before:
+            query = apply_keyset(query, "updated_at", "before", *before)
+        query = query.order("updated_at", desc=True).order("id", desc=True)
+        if limit:
+            query = query.limit(limit)
+        return (await query.execute()).data
+
+    async def update_session_title(self, session_id: str, title: str):
+        supabase = await self._get_client()
+        await supabase.table("chat_sessions")\
+            .update({"title": title, "updated_at": datetime.utcnow().isoformat()})\
+            .eq("id", session_id)\
+            .execute()
+
+    async def delete_session(self, session_id: str):
+        supabase = await self._get_client()
+        await supabase.table("chat_sessions")\
+            .delete()\
+            .eq("id", session_id)\
+            .execute()
+
+    async def list_messages(self, session_id: str, columns: str = "*", limit: Optional[int] = None,
+                            before: Optional[Cursor] = None, after: Optional[Cursor] = None,
+                            descending: bool = False) -> List[Dict]:
+        supabase = await self._get_client()
+        query = supabase.table("chat_messages")\
+            .select(columns)\
+            .eq("session_id", session_id)
+        if before:
+            query = apply_keyset(query, "created_at", "before", *before)
+        elif after:
+            query = apply_keyset(query, "created_at", "after", *after)
+        query = query.order("created_at", desc=descending).order("id", desc=descending)
+        if limit:
+            query = query.limit(limit)
+        return (await query.execute()).data
+
+    async def count_messages(self, session_id: str) -> int:
+        supabase = await self._get_client()
+        response = await supabase.table("chat_messages")\
+            .select("id", count="exact")\
+            .eq("session_id", session_id)\
+            .limit(1)\
+            .execute()
+        return response.count or 0
+
+    async def commit_turn(self, params: Dict) -> Dict:
+        supabase = await self._get_client()
+        try:
+            response = await supabase.rpc(self.COMMIT_RPC, params).execute()
+        except APIError as e:
+            if e.code == self.CONFLICT_CODE:
+                raise StaleStateError(e.message) from e
+            raise
+        return response.data if isinstance(response.data, dict) else {}
+
+    async def flush_turn_writes(self, messages: List[Dict], responses: List[Dict],
+                                titles: List[Dict]) -> Dict:
+        supabase = await self._get_client()
+        response = await supabase.rpc(self.FLUSH_RPC, {
+            "p_messages": messages,
+            "p_responses": responses,
+            "p_titles": titles
+        }).execute()
+        return response.data if isinstance(response.data, dict) else {}
+
+def apply_keyset(query, column: str, direction: str, value: str, row_id: Optional[str] = None):
+    """Filter to rows strictly before/after (value, id) in (column, id) order"""
+    op = "lt" if direction == "before" else "gt"
+    if row_id:
+        return query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}.{row_id})')
+    return query.lt(column, value) if op == "lt" else query.gt(column, value)
@@ -0,0 +1,327 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+
+import httpx
+
+class Span:
+    """One timed operation in a trace, exported with OpenTelemetry's field names"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "status", "description", "_tracer")
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict] = None):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "UNSET"
+        self.description = None
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: BaseException):
+        self.status = "ERROR"
+        self.description = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        """Close the span and hand it to the exporter (only the first call counts)"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.status == "UNSET":
+            self.status = "OK"
+        self._tracer.export(self)
+
+    def to_dict(self) -> Dict:
+        status = {"status_code": self.status}
+        if self.description:
+            status["description"] = self.description
+        return {
+            "name": self.name,
+            "context": {"trace_id": "0x" + self.trace_id, "span_id": "0x" + self.span_id},
+            "parent_id": "0x" + self.parent_id if self.parent_id else None,
+            "start_time": _isoformat(self.start_ns),
+            "end_time": _isoformat(self.end_ns),
+            "status": status,
+            "attributes": self.attributes
+        }
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off"""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def _isoformat(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9, timezone.utc).isoformat().replace("+00:00", "Z")
+
+class JsonLinesExporter:
+    """Write finished spans as one JSON object per line, to a file or stdout"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8") if path else None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            print(line, file=self._file or sys.stdout, flush=self._file is None)
+
+class Tracer:
+    """Creates spans and tracks the active one per request (via a ContextVar)
+
+    With no exporter every span is NOOP_SPAN, so instrumented code costs
+    next to nothing when tracing is off.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(self, name: str, attributes: Optional[Dict] = None):
+        """Start a child of the active span (or a new trace); the caller must end() it"""
+        if self.exporter is None:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is None:
+            return Span(self, name, secrets.token_hex(16), attributes=attributes)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @contextmanager
+    def use_span(self, span, end_on_exit: bool = True) -> Iterator:
+        """Make span the parent of spans started in the with-block"""
+        token = _current_span.set(span) if isinstance(span, Span) else None
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+            if end_on_exit:
+                span.end()
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict] = None, activate: bool = True) -> Iterator:
+        """
+        Time a with-block as a span
+
+        activate=False keeps it from becoming the parent of nested spans,
+        which is needed inside async generators: they run in their consumer's
+        context, so a span activated there would leak into it.
+        """
+        span = self.start_span(name, attributes)
+        if activate:
+            with self.use_span(span):
+                yield span
+            return
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    def export(self, span: Span):
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            print(f"Error exporting span {span.name}: {e}")
+
+def create_exporter(target: Optional[str]):
+    """Exporter for a TRACE_EXPORT setting: "console", a .jsonl file path, or unset (off)"""
+    if not target:
+        return None
+    if target == "console":
+        return JsonLinesExporter()
+    return JsonLinesExporter(target)
+
+tracer = Tracer(create_exporter(os.getenv("TRACE_EXPORT")))
+
+def current_span():
+    """The active span, or NOOP_SPAN"""
+    return _current_span.get() or NOOP_SPAN
+
+# --- SUPABASE ---
+POSTGREST_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+def postgrest_rows(content_range: Optional[str]) -> Optional[int]:
+    """Row count from a PostgREST Content-Range header ("0-24/*", "*/0", ...)"""
+    if not content_range:
+        return None
+    returned = content_range.split("/", 1)[0]
+    if "-" not in returned:
+        return 0
+    first, last = returned.split("-", 1)
+    try:
+        return int(last) - int(first) + 1
+    except ValueError:
+        return None
+
+class _TracedStream(httpx.AsyncByteStream):
+    """Response body that ends its request span once it has been read"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, span: Span):
+        self._stream = stream
+        self._span = span
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._span.end()
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Wraps a PostgREST session's transport so every query gets a span"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not tracer.enabled:
+            return await self.transport.handle_async_request(request)
+
+        parts = request.url.path.split("/rest/v1/", 1)
+        table = parts[1].strip("/") if len(parts) == 2 else request.url.path
+        if table.startswith("rpc/"):
+            operation, table = "rpc", table[len("rpc/"):]
+        elif request.method == "POST" and "resolution=merge-duplicates" in request.headers.get("prefer", ""):
+            operation = "upsert"
+        else:
+            operation = POSTGREST_OPERATIONS.get(request.method, request.method.lower())
+
+        span = tracer.start_span(f"supabase {operation} {table}", {
+            "db.system": "postgresql",
+            "db.table": table,
+            "db.operation": operation,
+            "http.method": request.method
+        })
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException as e:
+            span.record_error(e)
+            span.end()
+            raise
+
+        span.set_attribute("http.status_code", response.status_code)
+        span.set_attribute("db.rows", postgrest_rows(response.headers.get("content-range")))
+        if response.status_code >= 400:
+            span.status = "ERROR"
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TracedStream(response.stream, span),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+def trace_supabase(client):
+    """
+    Give every PostgREST request made through the client a span
+
+    Safe to call on every use, like metrics.instrument_supabase: the
+    transport is wrapped again when supabase-py replaces the session.
+    """
+    if not tracer.enabled:
+        return
+    session = client.postgrest.session
+    if not isinstance(session._transport, TracingTransport):
+        session._transport = TracingTransport(session._transport)
+
+# --- READING TRACES ---
+def load_spans(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def format_trace(spans: List[Dict], trace_id: Optional[str] = None) -> str:
+    """
+    Render one trace as an indented tree with start offsets and durations
+
+    Picks the trace with the slowest root span when trace_id is not given.
+    """
+    roots = [s for s in spans if not s["parent_id"]]
+    if trace_id is None:
+        if not roots:
+            return "No traces"
+        slowest = max(roots, key=lambda s: _timestamp(s["end_time"]) - _timestamp(s["start_time"]))
+        trace_id = slowest["context"]["trace_id"]
+    elif not trace_id.startswith("0x"):
+        trace_id = "0x" + trace_id
+
+    trace = [s for s in spans if s["context"]["trace_id"] == trace_id]
+    if not trace:
+        return f"No spans for trace {trace_id}"
+    children: Dict[Optional[str], List[Dict]] = {}
+    for span in sorted(trace, key=lambda s: s["start_time"]):
+        children.setdefault(span["parent_id"], []).append(span)
+    origin = min(_timestamp(s["start_time"]) for s in trace)
+
+    lines = [f"trace {trace_id}"]
+    def render(span, depth):
+        start = (_timestamp(span["start_time"]) - origin) * 1000
+        duration = (_timestamp(span["end_time"]) - _timestamp(span["start_time"])) * 1000
+        attributes = ", ".join(f"{k}={v}" for k, v in span["attributes"].items())
+        status = "" if span["status"]["status_code"] == "OK" else f" [{span['status']['status_code']}]"
+        lines.append(f"{start:9.1f}ms {duration:9.1f}ms  {'  ' * depth}{span['name']}{status}  {attributes}")
+        for child in children.get(span["context"]["span_id"], []):
+            render(child, depth + 1)
+
+    span_ids = {s["context"]["span_id"] for s in trace}
+    for span in trace:
+        if span["parent_id"] not in span_ids:
+            render(span, 0)
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # python -m api.tracing traces.jsonl [trace_id]
+    if len(sys.argv) < 2:
+        print("usage: python -m api.tracing TRACE_FILE [TRACE_ID]")
+        sys.exit(1)
+    print(format_trace(load_spans(sys.argv[1]), sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,126 @@
+from typing import Optional, Dict
+from datetime import datetime
+
+from .gad7_protocol import GAD7Protocol
+from .instruments import DEFAULT_INSTRUMENT, INSTRUMENTS
+from .storage import Storage
+
+class TurnCommit:
+    """Collects the writes for one /chat turn and persists them in a single storage call"""
+
+    def __init__(self, session_id: str, user_id: str, protocol_type: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.protocol_type = protocol_type
+        self.user_message = None
+        self.bot_reply = None
+        self.protocol = None
+        self.protocol_state = None
+        self.total_score = None
+        self.severity_level = None
+        self.completed = False
+        self.gad7_response = None
+        self.title = None
+
+    def save_messages(self, user_message: str, bot_reply: str):
+        """Record the user message and bot reply for this turn"""
+        self.user_message = user_message
+        self.bot_reply = bot_reply
+
+    def save_gad7_response(self, question_num: int, question_text: str,
+                           user_response: str, score: Optional[int]):
+        """Record an individual GAD-7 response"""
+        self.gad7_response = {
+            "question_number": question_num,
+            "question_text": question_text,
+            "user_response": user_response,
+            "score": score
+        }
+
+    def update_protocol_state(self, protocol: GAD7Protocol,
+                              total_score: int = None, completed: bool = False):
+        """
+        Record the protocol state as of now; completion is sticky within a turn
+
+        Only what changed since the state was loaded is sent: an unchanged
+        state is left as stored, and the score and severity are only written
+        when the score moved, was never written, or the screening completes.
+        """
+        self.protocol = protocol.copy()
+        dirty = protocol.dirty_fields()
+        self.protocol_state = protocol.dumps() if dirty else None
+
+        if total_score is not None and ("total_score" in dirty or completed):
+            self.total_score = total_score
+            self.severity_level = INSTRUMENTS[self.protocol_type or DEFAULT_INSTRUMENT].severity(total_score)
+
+        self.completed = self.completed or completed
+
+    def refresh_title(self, instrument_name: str = "GAD-7"):
+        """Give the session a dated title if it still has a default one"""
+        self.title = f"{instrument_name} Screening - {datetime.utcnow().strftime('%b %d, %Y')}"
+
+    def to_params(self, deferred: bool = False) -> Dict:
+        """
+        Build the Storage.commit_turn arguments (those of the commit_chat_turn RPC)
+
+        Args:
+            deferred: Leave out the bot reply, GAD-7 response and title,
+                which are then written later through the write-behind queue
+        """
+        if self.user_message is None or self.bot_reply is None:
+            raise ValueError("A turn must include both the user message and the bot reply")
+
+        if deferred:
+            return dict(self.to_params(), p_bot_reply=None, p_gad7_response=None, p_title=None)
+
+        return {
+            "p_session_id": self.session_id,
+            "p_user_id": self.user_id,
+            "p_user_message": self.user_message,
+            "p_bot_reply": self.bot_reply,
+            "p_protocol_state": self.protocol_state,
+            "p_touch_session": self.protocol is not None,
+            "p_total_score": self.total_score,
+            "p_severity_level": self.severity_level,
+            "p_completed": self.completed,
+            "p_gad7_response": self.gad7_response,
+            "p_title": self.title,
+            "p_expected_version": self.protocol.version if self.protocol is not None else None
+        }
+
+    async def commit(self, storage: Storage, cache=None, write_behind=None):
+        """
+        Persist the whole turn atomically
+
+        The write only succeeds if the session's state_version is still the
+        one the protocol was read at.
+
+        Args:
+            storage: Storage backend
+            cache: Optional SessionStateCache to write the new protocol state through to
+            write_behind: Optional WriteBehindQueue; if given, only the user message
+                and protocol state are written now and the rest is queued
+
+        Raises:
+            StaleStateError: Another turn changed the state first; nothing was written
+        """
+        try:
+            params = self.to_params(deferred=write_behind is not None)
+            data = await storage.commit_turn(params)
+        except Exception:
+            if cache is not None:
+                cache.invalidate(self.session_id, self.protocol.version if self.protocol is not None else None)
+            raise
+
+        if write_behind is not None:
+            write_behind.enqueue_turn(self, data.get("user_message_at"))
+
+        if self.protocol is not None:
+            if data.get("state_version") is not None:
+                self.protocol.version = data["state_version"]
+            self.protocol.mark_clean()
+            if cache is not None:
+                cache.put(self.session_id, self.protocol, self.completed, self.protocol_type)
+
+        return data
@@ -0,0 +1,296 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+
+class WriteBehindQueue:
+    """Durable queue for turn writes the reply does not depend on
+
+    The bot message, the gad7_responses row and the title refresh of a
+    committed turn are journaled to a local SQLite file and flushed to
+    storage by a background task, many turns per flush_turn_writes call.
+    Each session's rows are flushed in the order they were queued and only
+    deleted once storage has accepted them; rows it already has are ignored,
+    so a retry after a lost response does not duplicate anything. A row that
+    keeps failing on its own while storage takes other rows is kept as dead
+    (see stats() and requeue_dead()) instead of being dropped; dead rows get
+    another round when the queue is started again.
+    """
+
+    # After this many failed attempts a row is retried on its own, with its
+    # own backoff; only later rows of its session wait for it, so a single
+    # bad row cannot hold back other sessions. Once it is stored, the rest of
+    # its session goes back into the batches.
+    SPLIT_AFTER = 3
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 0.25,
+                 max_attempts: int = 10):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Survives a crash of the process; only an OS crash can lose the last commits
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS writes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                dead INTEGER NOT NULL DEFAULT 0,
+                retry_at REAL NOT NULL DEFAULT 0,
+                failed_at REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(writes)")}
+        if "retry_at" not in columns:
+            # Journal written before rows were retried on their own
+            self._db.execute("ALTER TABLE writes ADD COLUMN retry_at REAL NOT NULL DEFAULT 0")
+        if "failed_at" not in columns:
+            self._db.execute("ALTER TABLE writes ADD COLUMN failed_at REAL NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS writes_pending ON writes (dead, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS writes_session ON writes (session_id, seq)")
+
+        self._storage = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._retry_at = 0.0
+        self._stored_at = 0.0  # time.time() storage last took a call
+        self._closing = False
+
+        self.queued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+
+    # --- producer side ---
+    def enqueue_turn(self, turn, user_message_at: Optional[str] = None):
+        """
+        Queue the deferred writes of a committed TurnCommit
+
+        The bot message is stamped 1 ms after the stored user message
+        (user_message_at from the commit RPC) so the pair keeps its order.
+        """
+        sent_at = parse_timestamp(user_message_at) or datetime.now(timezone.utc)
+        rows = [("message", {
+            "id": str(uuid.uuid4()),
+            "session_id": turn.session_id,
+            "user_id": turn.user_id,
+            "message": turn.bot_reply,
+            "sender": "bot",
+            "created_at": (sent_at + timedelta(milliseconds=1)).isoformat()
+        })]
+        if turn.gad7_response is not None:
+            rows.append(("response", dict(
+                turn.gad7_response, id=str(uuid.uuid4()), session_id=turn.session_id, user_id=turn.user_id
+            )))
+        if turn.title is not None:
+            rows.append(("title", {"id": turn.session_id, "title": turn.title}))
+
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT INTO writes (session_id, kind, payload) VALUES (?, ?, ?)",
+                [(turn.session_id, kind, json.dumps(payload)) for kind, payload in rows]
+            )
+        self.queued += len(rows)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # --- worker ---
+    def start(self, storage):
+        """Start the flush task (if not running), flushing to the given Storage"""
+        self._storage = storage
+        if self._task is None or self._task.done():
+            requeued = self.requeue_dead()
+            if requeued:
+                print(f"Write-behind queue: retrying {requeued} dead rows")
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10.0):
+        """Stop the flush task after one last flush; anything left stays on disk"""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                print("Write-behind queue: shutdown flush timed out, pending writes kept on disk")
+        self._db.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Give concurrent turns a moment to join the batch
+            if not self._closing:
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+
+            delay = self._retry_at - time.monotonic()
+            if delay > 0 and not self._closing:
+                await asyncio.sleep(delay)
+
+            try:
+                while await self.flush() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Write-behind queue error: {e}")
+
+            if self._closing:
+                return
+
+    async def flush(self) -> int:
+        """
+        Retry failing rows that are due, then send the oldest pending rows in one call
+
+        Rows of a session with an older failing row are left for later, so
+        each session's writes stay in order.
+
+        Returns:
+            Number of rows stored by the batch call (0 if nothing was pending or it failed)
+        """
+        await self._retry_failing()
+
+        rows = self._db.execute(
+            """
+            SELECT seq, kind, payload, attempts FROM writes w
+            WHERE dead = 0 AND attempts < ? AND NOT EXISTS (
+                SELECT 1 FROM writes f
+                WHERE f.session_id = w.session_id AND f.dead = 0 AND f.attempts >= ? AND f.seq < w.seq
+            )
+            ORDER BY seq LIMIT ?
+            """,
+            (self.SPLIT_AFTER, self.SPLIT_AFTER, self.batch_size)
+        ).fetchall()
+        if not rows:
+            return 0
+        if not await self._send(rows):
+            self._retry_at = time.monotonic() + self._backoff(rows[0][3] + 1)
+            return 0
+        self._retry_at = 0.0
+        return len(rows)
+
+    async def _retry_failing(self):
+        """
+        Send each failing row that is the oldest of its session and due, on its own
+
+        A failure only counts towards dead if storage took some other call
+        since the row last failed; while every call fails, storage is down
+        rather than the row bad.
+        """
+        rows = self._db.execute(
+            """
+            SELECT seq, kind, payload, attempts, session_id, failed_at FROM writes w
+            WHERE dead = 0 AND attempts >= ? AND retry_at <= ? AND NOT EXISTS (
+                SELECT 1 FROM writes o WHERE o.session_id = w.session_id AND o.dead = 0 AND o.seq < w.seq
+            )
+            ORDER BY seq LIMIT ?
+            """,
+            (self.SPLIT_AFTER, time.time(), self.batch_size)
+        ).fetchall()
+        for row in rows:
+            if not await self._send([row], counted=self._stored_at > row[5]):
+                continue
+            # Storage is taking this session's rows again: batch the rest
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.execute("UPDATE writes SET attempts = 0, retry_at = 0 WHERE session_id = ? AND dead = 0",
+                                 (row[4],))
+
+    async def _send(self, rows, counted: bool = True) -> bool:
+        """Write rows to storage in one call and drop them from the journal; False if it failed"""
+        messages, responses, titles = [], [], {}
+        for _, kind, payload, *_ in rows:
+            record = json.loads(payload)
+            if kind == "title":
+                titles[record["id"]] = record  # only the newest title per session matters
+            else:
+                (messages if kind == "message" else responses).append(record)
+
+        try:
+            await self._storage.flush_turn_writes(messages, responses, list(titles.values()))
+        except Exception as e:
+            self._failed(rows, e, counted)
+            return False
+
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM writes WHERE seq = ?", [(row[0],) for row in rows])
+        self._stored_at = time.time()
+        self.flushed += len(rows)
+        self.batches += 1
+        return True
+
+    def _failed(self, rows, error: Exception, counted: bool):
+        """
+        Record a failed send and schedule the next attempt
+
+        Args:
+            counted: Whether the attempt counts; a row is only marked dead
+                after max_attempts counted failures on its own
+        """
+        self.failures += 1
+        step = 1 if counted else 0
+        attempts = rows[0][3] + step
+        print(f"Write-behind flush of {len(rows)} rows failed (attempt {attempts}): {error}")
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE writes SET attempts = attempts + ?, last_error = ?, failed_at = ?, retry_at = ? WHERE seq = ?",
+                [(step, str(error), time.time(), time.time() + self._backoff(row[3] + 1), row[0]) for row in rows]
+            )
+            if counted and len(rows) == 1 and attempts >= self.max_attempts:
+                self._db.execute("UPDATE writes SET dead = 1 WHERE seq = ?", (rows[0][0],))
+                print(f"Write-behind row {rows[0][0]} ({rows[0][1]}) marked dead after {attempts} attempts")
+
+    def _backoff(self, attempts: int) -> float:
+        """Seconds to wait before the next attempt"""
+        return min(self.MAX_BACKOFF, 0.5 * 2 ** attempts)
+
+    def requeue_dead(self) -> int:
+        """Give dead rows another round of attempts"""
+        with self._db:
+            self._db.execute("BEGIN")
+            count = self._db.execute(
+                "UPDATE writes SET dead = 0, attempts = 0, retry_at = 0 WHERE dead = 1"
+            ).rowcount
+        if count and self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    def stats(self) -> Dict:
+        """Get pending/dead row counts and flush counters"""
+        pending, dead = self._db.execute(
+            "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM writes"
+        ).fetchone()
+        return {
+            "pending": pending,
+            "dead": dead,
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures
+        }
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a PostgREST timestamptz, or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
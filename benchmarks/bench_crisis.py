@@ -0,0 +1,76 @@
+"""Crisis keyword matching: original substring scan vs the compiled detector
+
+Run from the repository root:
+
+    python -m benchmarks.bench_crisis
+
+Detector timings include normalization (shown separately), which the old scan
+did not do; with only the built-in phrases that is most of the cost. Up to
+CrisisDetector.SCAN_THRESHOLD phrases the detector scans phrase by phrase
+too; the automaton is used above it.
+"""
+import random
+import string
+import timeit
+
+from api.crisis_detector import CrisisDetector
+from api.gad7_protocol import GAD7Protocol
+
+MESSAGES = [
+    "yes",
+    "Not really, I've been fine most days",
+    "Nearly every day, it's been awful and I can't sleep at all",
+    "Honestly some days I feel like I want to die, but mostly it's work stress "
+    "and my family keeps asking about it, which makes everything worse.",
+    "I don't know what to say. " * 20,
+]
+
+def substring_scan(keywords, text):
+    """The check GAD7Protocol used before the detector"""
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in keywords)
+
+def synthetic_phrases(count, seed=7):
+    """Random two/three word phrases that do not occur in MESSAGES"""
+    rng = random.Random(seed)
+    phrases = list(GAD7Protocol.CRISIS_KEYWORDS)
+    while len(phrases) < count:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+                 for _ in range(rng.randint(2, 3))]
+        phrases.append(" ".join(words))
+    return phrases
+
+def per_call_us(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+def main():
+    print(f"{'phrases':>8} {'msg chars':>10} {'substring us':>13} {'normalize us':>13} "
+          f"{'detector us':>12} {'speedup':>8}")
+    # SCAN_THRESHOLD + 1 is the smallest list that goes through the automaton
+    for count in (len(GAD7Protocol.CRISIS_KEYWORDS), 100, CrisisDetector.SCAN_THRESHOLD + 1, 1000, 5000):
+        phrases = synthetic_phrases(count)
+        detector = CrisisDetector(phrases)
+
+        for message in MESSAGES:
+            # Both must agree on the built-in list
+            assert substring_scan(phrases, message) == detector.contains(message)
+            number = 2000 if count <= 100 else 200
+            naive = per_call_us(lambda: substring_scan(phrases, message), number)
+            normalize = per_call_us(lambda: CrisisDetector.normalize(message), number)
+            compiled = per_call_us(lambda: detector.contains(message), number)
+            print(f"{count:>8} {len(message):>10} {naive:>13.2f} {normalize:>13.2f} "
+                  f"{compiled:>12.2f} {naive / compiled:>7.1f}x")
+
+    detector = GAD7Protocol.crisis_detector()
+    batch = MESSAGES * 200
+    one_by_one = per_call_us(lambda: [detector.contains(m) for m in batch], 20)
+    batched = per_call_us(lambda: detector.contains_many(batch), 20)
+    print(f"\nbatch of {len(batch)} messages: contains() loop {one_by_one / 1000:.2f} ms, "
+          f"contains_many() {batched / 1000:.2f} ms")
+
+    build = per_call_us(lambda: CrisisDetector(synthetic_phrases(5000)), 1)
+    print(f"compiling 5000 phrases: {build / 1000:.1f} ms (once per process)")
+
+if __name__ == "__main__":
+    main()
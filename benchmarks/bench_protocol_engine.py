@@ -0,0 +1,44 @@
+"""Per-turn cost of the protocol state machine (no I/O)
+
+Run from the repository root:
+
+    python -m benchmarks.bench_protocol_engine
+"""
+import timeit
+
+from api.gad7_protocol import GAD7Protocol
+from api.protocol_engine import FIRST_MESSAGE, SYMPTOM, get_engine
+
+# (message, interpretation of symptom answers) for a full session
+SCRIPTS = {
+    "GAD7": [("hi", None), ("yes", None), ("no", None), ("yes", None)]
+            + [("yes", "YES"), ("2", None), ("no", "NO")] * 3 + [("no", "NO")],
+    "PHQ9": [("hi", None), ("yes", None), ("no", None), ("yes", None)]
+            + [("yes", "YES"), ("3", None)] * 4 + [("no", "NO")] * 5,
+}
+
+def run_session(engine, script):
+    protocol = GAD7Protocol()
+    for index, (message, interpretation) in enumerate(script):
+        state = engine.state(protocol)
+        if index == 0:
+            event, score = FIRST_MESSAGE, None
+        elif state == SYMPTOM:
+            event, score = engine.read_interpretation(interpretation), None
+        else:
+            event, score = engine.read(state, message)
+        result = engine.advance(protocol, state, event, score)
+    assert result.completed, result
+    return protocol
+
+def main():
+    print(f"{'instrument':>10} {'turns':>6} {'per session us':>15} {'per turn us':>12}")
+    for code, script in SCRIPTS.items():
+        engine = get_engine(code)
+        number = 5000
+        best = min(timeit.repeat(lambda: run_session(engine, script), number=number, repeat=5))
+        per_session = best / number * 1e6
+        print(f"{code:>10} {len(script):>6} {per_session:>15.1f} {per_session / len(script):>12.2f}")
+
+if __name__ == "__main__":
+    main()
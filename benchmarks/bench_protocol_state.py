@@ -0,0 +1,70 @@
+"""protocol_state encode/decode cost and per-session memory
+
+Run from the repository root:
+
+    python -m benchmarks.bench_protocol_state
+"""
+import json
+import timeit
+import tracemalloc
+
+from api.gad7_protocol import GAD7Protocol
+
+SESSIONS = 10000
+
+class PlainState:
+    """Stand-in for the pre-__slots__ object: same attributes in a __dict__"""
+
+    def __init__(self, state):
+        self.__dict__.update(state)
+        self.last_question_answered = False
+
+def sample_protocol():
+    protocol = GAD7Protocol()
+    protocol.current_question = 5
+    protocol.consent_given = True
+    protocol.screening_passed = True
+    protocol.screening_step = 2
+    protocol.total_score = 7
+    return protocol
+
+def json_load(data):
+    protocol = GAD7Protocol()
+    protocol.load_state(json.loads(data))
+    return protocol
+
+def per_call_us(func, number=20000):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+def allocated_bytes(factory):
+    tracemalloc.start()
+    objects = [factory() for _ in range(SESSIONS)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size / SESSIONS
+
+def main():
+    protocol = sample_protocol()
+    as_json = json.dumps(protocol.get_state())
+    compact = protocol.dumps()
+    assert GAD7Protocol.loads(compact).get_state() == protocol.get_state()
+    assert GAD7Protocol.loads(as_json).get_state() == protocol.get_state()
+
+    print(f"{'format':>8} {'bytes':>6} {'dump us':>8} {'load us':>8}")
+    print(f"{'json':>8} {len(as_json):>6} "
+          f"{per_call_us(lambda: json.dumps(protocol.get_state())):>8.2f} "
+          f"{per_call_us(lambda: json_load(as_json)):>8.2f}")
+    print(f"{'compact':>8} {len(compact):>6} "
+          f"{per_call_us(protocol.dumps):>8.2f} "
+          f"{per_call_us(lambda: GAD7Protocol.loads(compact)):>8.2f}")
+
+    state = protocol.get_state()
+    print(f"\nper hot session ({SESSIONS} held): "
+          f"__dict__ object {allocated_bytes(lambda: PlainState(state)):.0f} B, "
+          f"slotted {allocated_bytes(protocol.copy):.0f} B")
+    print(f"copy(): {per_call_us(protocol.copy):.2f} us")
+
+if __name__ == "__main__":
+    main()
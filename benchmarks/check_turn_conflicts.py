@@ -0,0 +1,148 @@
+"""Regression check: concurrent replies to one question record a single answer
+
+Sends the same symptom answer to a session twice at once, many times over,
+on the SQLite storage backend. The first commit of each pair is held until
+the second request has planned its turn too, so both read the same state.
+Only the question the participant saw may get an answer: the request that
+commits second must get a 409 rather than be replayed as the answer to the
+next question.
+
+It also runs whole screenings one turn at a time with the turns
+alternating between two workers (two session caches), as behind a load
+balancer. Each worker's cache is then out of date every other turn, which
+must not turn a plain sequential conversation into a 409. Run from the
+repository root:
+
+    python -m benchmarks.check_turn_conflicts --sessions 50
+
+Exits with status 1 if any session recorded answers it should not have, or
+a sequential conversation was refused.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from typing import Dict, List
+
+import httpx
+
+OPENING = ["hi", "yes", "no", "yes"]  # greeting, 18 or older, not in crisis, consent
+# No to each of the 7 GAD-7 questions, all settled without the LLM
+SCREENING = OPENING + ["no"] * 7
+
+def hold_first_commits(storage, pairs: Dict[str, List[asyncio.Event]]):
+    """Make the first commit of each registered session wait for the second one"""
+    commit_turn = storage.commit_turn
+
+    async def held_commit_turn(params):
+        waiting = pairs.get(params["p_session_id"])
+        if waiting is not None:
+            if waiting:
+                del pairs[params["p_session_id"]]
+                waiting[0].set()
+            else:
+                arrived = asyncio.Event()
+                waiting.append(arrived)
+                await asyncio.wait_for(arrived.wait(), 5)
+        return await commit_turn(params)
+
+    storage.commit_turn = held_commit_turn
+
+async def check_session(client: httpx.AsyncClient, pairs: Dict, user_id: str, answer: str) -> Dict:
+    """Open a session up to question 1, then answer it twice at once"""
+    session_id = None
+    for message in OPENING:
+        response = await client.post("/api/chat", json={"message": message, "user_id": user_id,
+                                                        "session_id": session_id})
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+
+    pairs[session_id] = []
+    body = {"message": answer, "user_id": user_id, "session_id": session_id}
+    responses = await asyncio.gather(client.post("/api/chat", json=body), client.post("/api/chat", json=body))
+    return {"session_id": session_id, "statuses": sorted(r.status_code for r in responses)}
+
+async def check_two_workers(client: httpx.AsyncClient, main, caches: List, user_id: str) -> Dict:
+    """Run a whole screening with each turn handled by the other worker's cache"""
+    session_id, statuses = None, []
+    for turn, message in enumerate(SCREENING):
+        main.session_cache = caches[turn % 2]
+        response = await client.post("/api/chat", json={"message": message, "user_id": user_id,
+                                                        "session_id": session_id})
+        statuses.append(response.status_code)
+        if response.status_code != 200:
+            break
+        session_id = response.json()["session_id"]
+    return {"session_id": session_id, "statuses": statuses}
+
+async def run(args) -> List[str]:
+    import api.main as main
+    from api.main import app, storage
+    from api.session_cache import SessionStateCache
+
+    problems = []
+    statuses: Dict[int, int] = {}
+    pairs: Dict[str, List[asyncio.Event]] = {}
+    hold_first_commits(storage, pairs)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+            results = await asyncio.gather(*(check_session(client, pairs, f"conflict-{i}", args.answer)
+                                             for i in range(args.sessions)))
+            # One at a time: the worker is picked by swapping the module's cache
+            shared_cache = main.session_cache
+            caches = [SessionStateCache(), SessionStateCache()]
+            sequential = [await check_two_workers(client, main, caches, f"workers-{i}")
+                          for i in range(args.sessions)]
+            main.session_cache = shared_cache
+    finally:
+        await storage.close()
+
+    with sqlite3.connect(args.database) as db:
+        for result in results:
+            for status in result["statuses"]:
+                statuses[status] = statuses.get(status, 0) + 1
+            rows = db.execute("SELECT question_number FROM gad7_responses WHERE session_id = ? "
+                              "ORDER BY question_number", (result["session_id"],)).fetchall()
+            answered = [row[0] for row in rows]
+            if result["statuses"] != [200, 409] or answered != [1]:
+                problems.append(f"session {result['session_id']}: statuses {result['statuses']}, "
+                                f"answers recorded for questions {answered}")
+
+        for result in sequential:
+            rows = db.execute("SELECT question_number FROM gad7_responses WHERE session_id = ? "
+                              "ORDER BY question_number", (result["session_id"],)).fetchall()
+            answered = [row[0] for row in rows]
+            if set(result["statuses"]) != {200} or answered != list(range(1, 8)):
+                problems.append(f"two-worker session {result['session_id']}: statuses {result['statuses']}, "
+                                f"answers recorded for questions {answered}")
+
+    print(f"sessions {args.sessions}, concurrent replies {dict(sorted(statuses.items()))}, "
+          f"two-worker turns {sum(len(r['statuses']) for r in sequential)}, problems {len(problems)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--answer", default="no", help="symptom answer sent twice (settled without the LLM)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="turn-conflicts-")
+    args.database = os.path.join(directory, "chat.sqlite3")
+    os.environ.update({
+        "STORAGE_BACKEND": "sqlite",
+        "STORAGE_SQLITE_PATH": args.database,
+        "WRITE_BEHIND_PATH": "",
+        "GROQ_API_KEY": "unused",
+        # Replies that fall back to the LLM (the closing summary) fail at once
+        "GROQ_BASE_URL": "http://127.0.0.1:9"
+    })
+
+    problems = asyncio.run(run(args))
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""Local stand-ins for Supabase (PostgREST) and Groq, for load tests
+
+Serves the PostgREST subset the API uses (chat_sessions, chat_messages,
+gad7_responses and the commit_chat_turn and flush_turn_writes RPCs) under
+/rest/v1 and a Groq-compatible chat completions endpoint under /openai/v1
+(also under /v1, for LLM_BACKENDS entries with "url": "http://127.0.0.1:8765/v1"),
+from memory.
+Run from the repository root:
+
+    python -m benchmarks.fake_backends --port 8765 --supabase-latency 15 --groq-latency 400
+
+and point the API at it:
+
+    SUPABASE_URL=http://127.0.0.1:8765
+    SUPABASE_KEY=eyJhbGciOiJIUzI1NiJ9.e30.fake   (any JWT-shaped string)
+    GROQ_BASE_URL=http://127.0.0.1:8765
+    GROQ_API_KEY=fake
+
+GET /_stats returns request counters, POST /_reset clears data and counters.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SESSION_DEFAULTS = {
+    "title": "New Chat",
+    "protocol_completed": False,
+    "protocol_type": "GAD7",
+    "protocol_state": None,
+    "total_score": None,
+    "severity_level": None,
+    "message_count": 0,
+    "state_version": 0,
+    "conversation_summary": None,
+    "summary_through": None,
+    "summary_through_id": None,
+}
+DEFAULT_TITLES = ("New Chat", "GAD-7 Screening", "PHQ-9 Screening")
+
+class Faults:
+    """Latency and error injection for one fake service"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    async def delay(self):
+        latency = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+class Store:
+    """In-memory tables and request counters"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.tables: Dict[str, List[Dict]] = {"chat_sessions": [], "chat_messages": [], "gad7_responses": []}
+        self.stats = {
+            "supabase": {"requests": 0, "errors": 0, "injected_errors": 0, "by_table": {}},
+            "groq": {"requests": 0, "injected_errors": 0, "streamed": 0, "classify": 0, "tokens": 0},
+        }
+
+    def count_supabase(self, table: str, method: str):
+        stats = self.stats["supabase"]
+        stats["requests"] += 1
+        key = f"{method} {table}"
+        stats["by_table"][key] = stats["by_table"].get(key, 0) + 1
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        for row in self.tables["chat_sessions"]:
+            if row["id"] == session_id:
+                return row
+        return None
+
+store = Store()
+supabase_faults = Faults()
+groq_faults = Faults()
+_clock = itertools.count()
+
+app = FastAPI(title="Fake Supabase + Groq")
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class StaleState(Exception):
+    pass
+
+# --- POSTGREST FILTERS ---
+def split_top_level(expr: str) -> List[str]:
+    """Split a PostgREST logic expression on commas outside parentheses and quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+def parse_logic(expr: str):
+    """Predicate for or=(...)/and(...) filters"""
+    for kind, combine in (("and(", all), ("or(", any)):
+        if expr.startswith(kind):
+            predicates = [parse_logic(part) for part in split_top_level(expr[len(kind):-1])]
+            return lambda row: combine(p(row) for p in predicates)
+    column, op, value = expr.split(".", 2)
+    return lambda row: matches(row, [(column, op, value.strip('"'))])
+
+def parse_filters(params) -> List:
+    filters = []
+    for key, value in params.multi_items():
+        if key in ("or", "and"):
+            filters.append((None, "logic", parse_logic(f"{key}{value}")))
+        elif key not in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+            op, _, operand = value.partition(".")
+            filters.append((key, op, operand))
+    return filters
+
+def matches(row: Dict, filters: List) -> bool:
+    for column, op, operand in filters:
+        if op == "logic":
+            if not operand(row):
+                return False
+            continue
+        value = row.get(column)
+        text = "" if value is None else str(value)
+        if op == "is":
+            if (operand == "null") != (value is None):
+                return False
+        elif op == "in":
+            if text not in [item.strip('"') for item in operand.strip("()").split(",")]:
+                return False
+        elif op == "eq" and text != operand:
+            return False
+        elif op == "neq" and text == operand:
+            return False
+        elif op == "lt" and not text < operand:
+            return False
+        elif op == "gt" and not text > operand:
+            return False
+        elif op == "lte" and not text <= operand:
+            return False
+        elif op == "gte" and not text >= operand:
+            return False
+    return True
+
+def project(rows: List[Dict], select: Optional[str]) -> List[Dict]:
+    if not select or select.strip() == "*":
+        return [dict(row) for row in rows]
+    columns = [column.strip() for column in select.split(",")]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+def postgrest_error(status: int, message: str, code: str) -> JSONResponse:
+    return JSONResponse({"message": message, "code": code, "hint": None, "details": None}, status_code=status)
+
+# --- SUPABASE ---
+@app.api_route("/rest/v1/{table}", methods=["GET", "HEAD", "POST", "PATCH", "DELETE"])
+async def table_endpoint(table: str, request: Request):
+    store.count_supabase(table, request.method)
+    await supabase_faults.delay()
+    if supabase_faults.should_fail():
+        store.stats["supabase"]["injected_errors"] += 1
+        return postgrest_error(503, "injected failure", "FAKE503")
+    if table not in store.tables:
+        store.stats["supabase"]["errors"] += 1
+        return postgrest_error(404, f'relation "public.{table}" does not exist', "42P01")
+
+    rows = store.tables[table]
+    params = request.query_params
+    filters = parse_filters(params)
+
+    if request.method in ("GET", "HEAD"):
+        found = [row for row in rows if matches(row, filters)]
+        total = len(found)
+        for part in reversed((params.get("order") or "").split(",")):
+            if part:
+                column, _, direction = part.partition(".")
+                found.sort(key=lambda row: (row.get(column) is None, row.get(column) or ""),
+                           reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        found = found[offset:offset + int(params["limit"])] if "limit" in params else found[offset:]
+        count = total if "count=exact" in request.headers.get("prefer", "") else "*"
+        content_range = f"{offset}-{offset + len(found) - 1}/{count}" if found else f"*/{count}"
+        return JSONResponse(project(found, params.get("select")), headers={"Content-Range": content_range})
+
+    if request.method == "DELETE":
+        deleted = [row for row in rows if matches(row, filters)]
+        store.tables[table] = [row for row in rows if row not in deleted]
+        if table == "chat_sessions":
+            # ON DELETE CASCADE
+            ids = {row["id"] for row in deleted}
+            for child in ("chat_messages", "gad7_responses"):
+                store.tables[child] = [row for row in store.tables[child] if row.get("session_id") not in ids]
+        return JSONResponse(deleted)
+
+    body = await request.json()
+    if request.method == "PATCH":
+        updated = [row for row in rows if matches(row, filters)]
+        for row in updated:
+            row.update(body)
+        return JSONResponse(updated)
+
+    created = []
+    for item in body if isinstance(body, list) else [body]:
+        row = {"id": str(uuid.uuid4()), "created_at": now()}
+        if table == "chat_sessions":
+            row.update(SESSION_DEFAULTS, updated_at=row["created_at"])
+        row.update(item)
+        rows.append(row)
+        created.append(row)
+    return JSONResponse(created, status_code=201)
+
+@app.post("/rest/v1/rpc/{function}")
+async def rpc_endpoint(function: str, request: Request):
+    store.count_supabase(f"rpc/{function}", "POST")
+    await supabase_faults.delay()
+    if supabase_faults.should_fail():
+        store.stats["supabase"]["injected_errors"] += 1
+        return postgrest_error(503, "injected failure", "FAKE503")
+    if function not in RPC_FUNCTIONS:
+        store.stats["supabase"]["errors"] += 1
+        return postgrest_error(404, f"Could not find the function public.{function}", "PGRST202")
+
+    try:
+        return JSONResponse(RPC_FUNCTIONS[function](await request.json()))
+    except StaleState as e:
+        return postgrest_error(409, str(e), "PT409")
+
+def commit_chat_turn(params: Dict) -> Dict:
+    """Same effect as supabase/migrations/*_write_behind.sql"""
+    session_id = params["p_session_id"]
+    session = store.session(session_id)
+    expected = params.get("p_expected_version")
+    if session is not None and expected is not None and session["state_version"] != expected:
+        raise StaleState(f"protocol state of session {session_id} changed since it was read")
+
+    state = params.get("p_protocol_state")
+    completed = bool(params.get("p_completed"))
+    reply = params.get("p_bot_reply")
+    if session is not None:
+        session["message_count"] += 1 if reply is None else 2
+        if state is not None:
+            session["protocol_state"] = state
+        if state is not None or completed:
+            session["state_version"] += 1
+        if params.get("p_touch_session") or state is not None:
+            session["updated_at"] = now()
+        if params.get("p_total_score") is not None:
+            session["total_score"] = params["p_total_score"]
+            session["severity_level"] = params.get("p_severity_level")
+        session["protocol_completed"] = bool(session["protocol_completed"]) or completed
+        if params.get("p_title") and session["title"] in DEFAULT_TITLES:
+            session["title"] = params["p_title"]
+
+    sent = datetime.now(timezone.utc)
+    for offset, (message, sender) in enumerate(((params["p_user_message"], "user"), (reply, "bot"))):
+        if message is None:
+            continue
+        store.tables["chat_messages"].append({
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "user_id": params["p_user_id"],
+            "message": message,
+            "sender": sender,
+            "created_at": (sent + timedelta(milliseconds=offset)).isoformat()
+        })
+
+    response = params.get("p_gad7_response")
+    if response:
+        store.tables["gad7_responses"].append(dict(
+            response, id=str(uuid.uuid4()), session_id=session_id, user_id=params["p_user_id"], created_at=now()
+        ))
+
+    return {
+        "session_id": session_id,
+        "message_count": session["message_count"] if session else None,
+        "state_version": session["state_version"] if session else None,
+        "user_message_at": sent.isoformat()
+    }
+
+def flush_turn_writes(params: Dict) -> Dict:
+    """Queued bot messages, GAD-7 responses and titles; rows already stored are skipped"""
+    counts = {"messages": 0, "responses": 0, "titles": 0}
+    for key, table, count in (("p_messages", "chat_messages", "messages"),
+                              ("p_responses", "gad7_responses", "responses")):
+        known = {row["id"] for row in store.tables[table]}
+        for row in params.get(key) or []:
+            session = store.session(row["session_id"])
+            if session is None or row["id"] in known:
+                continue
+            store.tables[table].append(dict({"created_at": now()}, **row))
+            counts[count] += 1
+            if table == "chat_messages":
+                session["message_count"] += 1
+    for row in params.get("p_titles") or []:
+        session = store.session(row["id"])
+        if session is not None and session["title"] in DEFAULT_TITLES:
+            session["title"] = row["title"]
+            counts["titles"] += 1
+    return counts
+
+RPC_FUNCTIONS = {"commit_chat_turn": commit_chat_turn, "flush_turn_writes": flush_turn_writes}
+
+# --- GROQ ---
+CLASSIFY_PATTERN = re.compile(r'\nAnswer: "(.*)"\Z', re.S)
+CLARIFICATION = "Could you tell me a little more about how often that has happened lately?"
+SUMMARY_PATTERN = re.compile(r"^Conversation to add:\n(.*?)\n\n", re.S | re.M)
+
+def fake_completion(messages: List[Dict]) -> str:
+    """YES/NO/UNCLEAR for classify calls, a line count for summaries, a fixed clarification otherwise"""
+    summary = SUMMARY_PATTERN.search(messages[-1]["content"])
+    if summary:
+        return f"The participant and assistant exchanged {len(summary.group(1).splitlines())} more messages."
+    match = CLASSIFY_PATTERN.search(messages[-1]["content"])
+    if not match:
+        return CLARIFICATION
+    words = re.findall(r"[a-z']+", match.group(1).lower())
+    if "no" in words or "not" in words or "never" in words:
+        return "NO"
+    if "yes" in words or "yeah" in words:
+        return "YES"
+    return "UNCLEAR"
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats = store.stats["groq"]
+    stats["requests"] += 1
+    await groq_faults.delay()
+    if groq_faults.should_fail():
+        stats["injected_errors"] += 1
+        return JSONResponse({"error": {"message": "injected failure", "type": "internal_server_error"}},
+                            status_code=503)
+
+    messages = body["messages"]
+    content = fake_completion(messages)
+    if CLASSIFY_PATTERN.search(messages[-1]["content"]):
+        stats["classify"] += 1
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        content = json.dumps({"label": content, "confidence": 0.9})
+    usage = {
+        "prompt_tokens": sum(count_tokens(m["content"]) for m in messages),
+        "completion_tokens": count_tokens(content)
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    stats["tokens"] += usage["total_tokens"]
+    completion_id = f"chatcmpl-{next(_clock)}"
+
+    if not body.get("stream"):
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    stats["streamed"] += 1
+
+    async def chunks():
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word},
+                             "finish_reason": "stop" if index == len(words) - 1 else None}]
+            }
+            if index == len(words) - 1:
+                chunk["x_groq"] = {"id": completion_id, "usage": usage}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(groq_faults.latency_ms / 1000 / max(len(words), 1) / 4)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+# --- CONTROL ---
+@app.get("/_stats")
+async def get_stats():
+    return {**store.stats, "rows": {name: len(rows) for name, rows in store.tables.items()}}
+
+@app.post("/_reset")
+async def reset():
+    store.reset()
+    return {"status": "reset"}
+
+def configure(args):
+    """Apply the fault settings from parsed command line arguments"""
+    global supabase_faults, groq_faults
+    supabase_faults = Faults(args.supabase_latency, args.supabase_jitter, args.supabase_error_rate, args.seed)
+    groq_faults = Faults(args.groq_latency, args.groq_jitter, args.groq_error_rate, args.seed)
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--supabase-latency", type=float, default=0, help="ms added to every PostgREST request")
+    parser.add_argument("--supabase-jitter", type=float, default=0, help="+/- ms of uniform jitter")
+    parser.add_argument("--supabase-error-rate", type=float, default=0, help="fraction of requests answered with 503")
+    parser.add_argument("--groq-latency", type=float, default=0, help="ms added to every completion")
+    parser.add_argument("--groq-jitter", type=float, default=0, help="+/- ms of uniform jitter")
+    parser.add_argument("--groq-error-rate", type=float, default=0, help="fraction of completions answered with 503")
+    parser.add_argument("--seed", type=int, default=None)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""End-to-end load test: synthetic participants complete a GAD-7 screening via /api/chat
+
+By default everything runs in this process: the fake backends are served on
+--backends-port and the API app is called through an in-memory transport.
+Client, API and fakes then share one event loop, so compare numbers from
+the same mode only. Run from the repository root:
+
+    python -m benchmarks.load_chat --participants 50 --concurrency 10 --groq-latency 300
+
+To load a separately started API (e.g. uvicorn with several workers) that
+points at `python -m benchmarks.fake_backends`:
+
+    python -m benchmarks.load_chat --url http://127.0.0.1:8000 --backends http://127.0.0.1:8765
+
+Round trips per turn come from the fake backends' counters; without
+--backends (e.g. against real services) they are read from the API's /metrics.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks import fake_backends
+
+# Replies a participant picks from, by what the bot asked
+SYMPTOM_YES = ["yes", "Yes", "yeah", "yes, quite a lot actually", "Yes I have been feeling like that"]
+SYMPTOM_NO = ["no", "No", "nope", "not really", "No, not that I noticed"]
+FREQUENCY = ["1", "2", "3", "4", "several days", "more than half the days", "nearly every day"]
+# No yes/no words, so they go to the LLM classifier and come back UNCLEAR
+AMBIGUOUS = ["hmm, hard to say", "what do you mean by that?", "I guess it depends on the week"]
+
+OPENING = ["hi", "yes", "no", "yes"]  # greeting, 18 or older, not in crisis, consent
+
+class Participant:
+    """Answers whatever the bot asked until the screening is complete"""
+
+    def __init__(self, rng: random.Random, ambiguous_rate: float):
+        self.rng = rng
+        self.ambiguous_rate = ambiguous_rate
+        self.user_id = f"load-{uuid.uuid4()}"
+        self.session_id = None
+        self.opening = list(OPENING)
+        self.clarified = False
+
+    def next_message(self, last_reply: Optional[str]) -> Optional[str]:
+        if self.opening:
+            return self.opening.pop(0)
+        if "Your total score is" in last_reply or "already been completed" in last_reply:
+            return None
+        if "choose" in last_reply and "1" in last_reply:
+            return self.rng.choice(FREQUENCY)
+        if not self.clarified and self.rng.random() < self.ambiguous_rate:
+            self.clarified = True
+            return self.rng.choice(AMBIGUOUS)
+        self.clarified = False
+        return self.rng.choice(SYMPTOM_YES if self.rng.random() < 0.5 else SYMPTOM_NO)
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+async def run_participant(client: httpx.AsyncClient, participant: Participant, latencies: List[float],
+                          errors: Dict[str, int], max_turns: int = 60) -> bool:
+    reply = None
+    for _ in range(max_turns):
+        message = participant.next_message(reply)
+        if message is None:
+            return True
+        body = {"message": message, "user_id": participant.user_id, "session_id": participant.session_id}
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/chat", json=body, headers={"Idempotency-Key": str(uuid.uuid4())})
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            return False
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            return False
+        data = response.json()
+        participant.session_id = data["session_id"]
+        reply = data["response"]
+    errors["unfinished"] = errors.get("unfinished", 0) + 1
+    return False
+
+async def backend_counts(client: httpx.AsyncClient, backends: Optional[httpx.AsyncClient]) -> Dict[str, float]:
+    """Supabase and Groq requests made so far"""
+    if backends is not None:
+        stats = (await backends.get("/_stats")).json()
+        return {"supabase": stats["supabase"]["requests"], "groq": stats["groq"]["requests"]}
+
+    counts = {"supabase": 0.0, "groq": 0.0}
+    for line in (await client.get("/api/metrics")).text.splitlines():
+        for name, prefix in (("supabase", "supabase_requests_total{"), ("groq", "groq_requests_total{")):
+            if line.startswith(prefix):
+                counts[name] += float(line.rsplit(" ", 1)[1])
+    return counts
+
+async def run_load(client: httpx.AsyncClient, backends: Optional[httpx.AsyncClient], args) -> Dict:
+    rng = random.Random(args.seed)
+    participants = [Participant(random.Random(rng.random()), args.ambiguous_rate) for _ in range(args.participants)]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(participant):
+        async with semaphore:
+            return await run_participant(client, participant, latencies, errors)
+
+    before = await backend_counts(client, backends)
+    start = time.perf_counter()
+    finished = await asyncio.gather(*(limited(p) for p in participants))
+    elapsed = time.perf_counter() - start
+    after = await backend_counts(client, backends)
+
+    latencies.sort()
+    turns = len(latencies)
+    return {
+        "participants": args.participants,
+        "concurrency": args.concurrency,
+        "completed": sum(finished),
+        "turns": turns,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(turns / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0
+        },
+        "round_trips_per_turn": {
+            name: round((after[name] - before[name]) / turns, 2) if turns else 0.0 for name in after
+        }
+    }
+
+async def run_in_process(args) -> Dict:
+    """Serve the fakes and call the API app in this process"""
+    import uvicorn
+
+    fake_backends.configure(args)
+    server = uvicorn.Server(uvicorn.Config(
+        fake_backends.app, host="127.0.0.1", port=args.backends_port, log_level="warning"
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{args.backends_port}"
+    os.environ.update({
+        "SUPABASE_URL": base_url,
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.fake",
+        "GROQ_BASE_URL": base_url,
+        "GROQ_API_KEY": "fake"
+    })
+    from api.main import app
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api",
+                                     timeout=args.timeout) as client, \
+                httpx.AsyncClient(base_url=base_url) as backends:
+            return await run_load(client, backends, args)
+    finally:
+        server.should_exit = True
+        await serving
+
+async def run_remote(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if args.backends:
+            async with httpx.AsyncClient(base_url=args.backends) as backends:
+                return await run_load(client, backends, args)
+        return await run_load(client, None, args)
+
+def print_report(result: Dict):
+    latency = result["latency_ms"]
+    trips = result["round_trips_per_turn"]
+    print(f"participants {result['participants']} (concurrency {result['concurrency']}), "
+          f"completed {result['completed']}, turns {result['turns']}, errors {result['errors'] or 0}")
+    print(f"throughput   {result['turns_per_second']} turns/s over {result['seconds']} s")
+    print(f"latency      p50 {latency['p50']} ms  p95 {latency['p95']} ms  "
+          f"p99 {latency['p99']} ms  max {latency['max']} ms")
+    print(f"per turn     {trips['supabase']} Supabase requests, {trips['groq']} Groq calls")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ambiguous-rate", type=float, default=0.1,
+                        help="chance a symptom answer is unclear (LLM classify + clarify)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--url", help="load a running API instead of an in-process one")
+    parser.add_argument("--backends", help="fake backends URL for round trip counts (with --url)")
+    parser.add_argument("--backends-port", type=int, default=8765, help="port for the in-process fakes")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    fake_backends.add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Per-message hot paths, timed against a stored baseline
+
+Covers the work every /chat turn does without I/O: protocol state
+encode/decode, the crisis check, severity and completion text, the system
+prompt, reading yes/no, consent, frequency and symptom answers, and fitting
+history into the context token budget. Text
+inputs are drawn from a fixed mix of message sizes (mostly short answers,
+some sentences, a few long paragraphs). Run from the repository root:
+
+    python -m benchmarks.microbench               # compare with the baseline
+    python -m benchmarks.microbench --save        # record a new baseline
+    python -m benchmarks.microbench -k crisis     # only cases matching "crisis"
+
+Exits with status 1 if a case is slower than the baseline by more than
+--threshold. Each timing sample of a case is paired with a sample of a
+fixed pure-Python calibration loop taken right after it, and cases are
+compared by the median of those ratios. That absorbs most of the
+difference between machines and CPU frequency drift during a run; a case
+over the threshold is measured once more before it counts as a regression.
+Still, record the baseline on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+# api.main reads these at import time; nothing here connects to them
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:8765")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+
+from api.answer_classifier import AnswerClassifier
+from api.context_builder import ContextBuilder, TokenEstimator
+from api.gad7_protocol import GAD7Protocol
+from api.main import get_system_prompt
+from api.protocol_engine import AGE_SCREENING, CONSENT, CRISIS_SCREENING, FREQUENCY, get_engine
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "microbench.json")
+
+SHORT = [
+    "yes", "no", "Yes", "No.", "yeah", "nope", "1", "2", "3", "4", "several days",
+    "nearly every day", "not at all", "more than half the days", "yes definitely",
+    "not really", "I have", "hmm maybe", "idk", "sometimes",
+]
+SENTENCE_PARTS = [
+    "I've been feeling pretty on edge lately", "work has been really stressful",
+    "I can't seem to switch off at night", "my family keeps asking if I'm okay",
+    "some days are fine but others are hard", "I guess it happens several days a week",
+    "honestly I'm not sure how to answer that", "it's mostly when I'm alone",
+    "I worry about money and my health", "I don't think so, not in the last two weeks",
+]
+CRISIS_SENTENCES = ["sometimes I feel like I want to die", "I keep thinking about how to hurt myself"]
+# Share of short answers, one-or-two sentence replies and long paragraphs
+SIZE_MIX = ((0.6, "short"), (0.3, "sentence"), (0.1, "paragraph"))
+
+def message_corpus(count: int = 200, seed: int = 17) -> List[str]:
+    """Deterministic messages following SIZE_MIX (about 2% mention a crisis phrase)"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        roll, kind = rng.random(), SIZE_MIX[-1][1]
+        for share, name in SIZE_MIX:
+            if roll < share:
+                kind = name
+                break
+            roll -= share
+        if kind == "short":
+            messages.append(rng.choice(SHORT))
+            continue
+        parts = rng.sample(SENTENCE_PARTS, rng.randint(1, 2) if kind == "sentence" else 8)
+        if kind == "paragraph":
+            parts = parts * 3
+        if rng.random() < 0.02:
+            parts.insert(rng.randrange(len(parts) + 1), rng.choice(CRISIS_SENTENCES))
+        messages.append(". ".join(parts) + ".")
+    return messages
+
+def sample_protocol() -> GAD7Protocol:
+    protocol = GAD7Protocol()
+    protocol.consent_given = True
+    protocol.screening_passed = True
+    protocol.screening_step = 2
+    protocol.current_question = 5
+    protocol.responses = {"1": 2, "2": 1, "3": 0, "4": 3}
+    protocol.total_score = 6
+    return protocol
+
+def calibration():
+    """Fixed pure-Python work used to normalize timings across machines"""
+    total = 0
+    for i in range(1000):
+        total += i * i % 7
+    return total
+
+def build_cases() -> Dict[str, Tuple[Callable, int]]:
+    """name -> (function running the case once per input, inputs per call)"""
+    messages = message_corpus()
+    protocol = sample_protocol()
+    state = protocol.get_state()
+    compact = protocol.dumps()
+    as_json = json.dumps(state)
+    engine = get_engine("GAD7")
+    classifier = AnswerClassifier()
+    scores = list(range(22))
+    scored = []
+    for score in scores:
+        scored.append(sample_protocol())
+        scored[-1].total_score = score
+    prompt_protocols = [GAD7Protocol(), protocol, sample_protocol()]
+    prompt_protocols[2].awaiting_frequency = True
+    history = [{"message": m, "sender": "user" if i % 2 else "bot"} for i, m in enumerate(messages[:40])]
+    builder = ContextBuilder()
+    system_prompt = get_system_prompt(protocol)
+
+    def load_state():
+        GAD7Protocol().load_state(state)
+
+    def read(reader_state):
+        return lambda: [engine.read(reader_state, message) for message in messages]
+
+    return {
+        "protocol.get_state": (protocol.get_state, 1),
+        "protocol.load_state": (load_state, 1),
+        "protocol.dumps": (protocol.dumps, 1),
+        "protocol.loads[compact]": (lambda: GAD7Protocol.loads(compact), 1),
+        "protocol.loads[json]": (lambda: GAD7Protocol.loads(as_json), 1),
+        "protocol.copy": (protocol.copy, 1),
+        "check_crisis": (lambda: [protocol.check_crisis(m) for m in messages], len(messages)),
+        "calculate_severity": (lambda: [p.calculate_severity() for p in scored], len(scored)),
+        "get_completion_message": (lambda: [p.get_completion_message() for p in scored], len(scored)),
+        "get_system_prompt": (lambda: [get_system_prompt(p) for p in prompt_protocols], len(prompt_protocols)),
+        "read.age_yes_no": (read(AGE_SCREENING), len(messages)),
+        "read.crisis_yes_no": (read(CRISIS_SCREENING), len(messages)),
+        "read.consent": (read(CONSENT), len(messages)),
+        "read.frequency": (read(FREQUENCY), len(messages)),
+        "answer_classifier.classify": (lambda: [classifier.classify(m) for m in messages], len(messages)),
+        "token_estimate[uncached]": (lambda: [TokenEstimator().count(m) for m in messages], len(messages)),
+        "context.build": (lambda: builder.build(system_prompt, messages[0], history, "Earlier summary."), 1),
+    }
+
+def loop_count(timer: timeit.Timer) -> int:
+    """Calls per sample, so one sample takes about 50 ms"""
+    number, _ = timer.autorange()
+    return max(1, number // 4)
+
+def time_case(func: Callable, inputs: int, repeat: int) -> Tuple[float, float]:
+    """
+    Median nanoseconds per input, and the median ratio to the calibration loop
+
+    Every sample of the case is followed by a sample of the calibration loop,
+    so both see the same machine state.
+    """
+    timer, calibration_timer = timeit.Timer(func), timeit.Timer(calibration)
+    number, calibration_number = loop_count(timer), loop_count(calibration_timer)
+    samples, ratios = [], []
+    for _ in range(repeat):
+        ns = timer.timeit(number) / number / inputs * 1e9
+        calibration_ns = calibration_timer.timeit(calibration_number) / calibration_number * 1e9
+        samples.append(ns)
+        ratios.append(ns / calibration_ns)
+    return statistics.median(samples), statistics.median(ratios)
+
+def run(pattern: str = "", repeat: int = 9) -> Dict:
+    results, relative = {}, {}
+    for name, (func, inputs) in build_cases().items():
+        if pattern in name:
+            ns, ratio = time_case(func, inputs, repeat)
+            results[name], relative[name] = round(ns, 1), round(ratio, 5)
+    return {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "ns_per_op": results,
+        # Median time per input in units of one calibration loop; what compare() uses
+        "relative": relative
+    }
+
+def compare(current: Dict, baseline: Dict, threshold: float, repeat: int) -> List[str]:
+    """Print a comparison table and return the names of regressed cases"""
+    if "relative" not in baseline:
+        sys.exit("the baseline predates per-case calibration; record a new one with --save")
+
+    cases = build_cases()
+    now, then = current["relative"], baseline["relative"]
+    print(f"baseline: Python {baseline.get('python')} on {baseline.get('machine')}")
+    print(f"{'case':<28} {'baseline ns':>12} {'current ns':>11} {'normalized':>11}")
+
+    regressions = []
+    for name, ratio in now.items():
+        value = current["ns_per_op"][name]
+        if name not in then:
+            print(f"{name:<28} {'-':>12} {value:>11.1f} {'new':>11}")
+            continue
+        change = ratio / then[name] - 1
+        flag = ""
+        if change > threshold:
+            # Confirm with a fresh measurement before calling it a regression
+            value, ratio = time_case(*cases[name], repeat)
+            change = min(change, ratio / then[name] - 1)
+            flag = "  REGRESSION" if change > threshold else "  (noise, passed on re-run)"
+            if change > threshold:
+                regressions.append(name)
+        print(f"{name:<28} {baseline['ns_per_op'][name]:>12.1f} {value:>11.1f} {change:>+10.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown after normalization (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=9, help="timing samples per case")
+    args = parser.parse_args()
+
+    current = run(args.pattern, args.repeat)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+        for name, value in current["ns_per_op"].items():
+            print(f"{name:<28} {value:>11.1f} ns")
+        print(f"saved {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        for name, value in current["ns_per_op"].items():
+            print(f"{name:<28} {value:>11.1f} ns")
+        print(f"no baseline at {args.baseline}; run with --save to record one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold, args.repeat)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+    print("\nno regressions")
+
+if __name__ == "__main__":
+    main()
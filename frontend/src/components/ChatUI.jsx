@@ -54,7 +54,7 @@ export default function ChatUI({ userId, onLogout }) {
 
   const loadSessionMessages = useCallback(async (sessionId) => {
     try {
-      const response = await fetch(`${API_URL}/sessions/${sessionId}/messages`);
+      const response = await fetch(`${API_URL}/sessions/${sessionId}/messages?fields=id,message,sender,created_at`);
       if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
       
       const data = await response.json();
@@ -119,16 +119,31 @@ export default function ChatUI({ userId, onLogout }) {
     }
   };
 
+  // Retries send the same Idempotency-Key, so the backend returns the first
+  // attempt's reply instead of running the turn again
+  const postChat = async (body, attempts = 2) => {
+    const idempotencyKey = crypto.randomUUID();
+    for (let attempt = 1; ; attempt++) {
+      try {
+        const response = await fetch(`${API_URL}/chat`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
+          body: JSON.stringify(body),
+        });
+        if (response.status >= 500 && attempt < attempts) continue;
+        return response;
+      } catch (error) {
+        if (attempt >= attempts) throw error;
+      }
+    }
+  };
+
   const sendInitialMessage = async (sessionId) => {
     try {
-      const response = await fetch(`${API_URL}/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          message: "Hello", 
-          user_id: userId,
-          session_id: sessionId 
-        }),
+      const response = await postChat({ 
+        message: "Hello", 
+        user_id: userId,
+        session_id: sessionId 
       });
       
       if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
@@ -193,14 +208,10 @@ export default function ChatUI({ userId, onLogout }) {
     setIsLoading(true);
 
     try {
-      const response = await fetch(`${API_URL}/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ 
-          message: currentInput, 
-          user_id: userId,
-          session_id: currentSessionId 
-        }),
+      const response = await postChat({ 
+        message: currentInput, 
+        user_id: userId,
+        session_id: currentSessionId 
       });
       
       if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
@@ -0,0 +1,66 @@
+-- Persist one /chat turn atomically.
+--
+-- Writes the user message, the bot reply, an optional gad7_responses row,
+-- the protocol state and the default-title refresh in a single transaction,
+-- so the API needs one round trip per turn and a failure leaves nothing
+-- half-written.
+
+create or replace function public.commit_chat_turn(
+    p_session_id chat_sessions.id%type,
+    p_user_id chat_sessions.user_id%type,
+    p_user_message text,
+    p_bot_reply text,
+    p_protocol_state text default null,
+    p_total_score integer default null,
+    p_severity_level text default null,
+    p_completed boolean default false,
+    p_gad7_response jsonb default null,
+    p_title text default null
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+begin
+    -- Explicit timestamps keep the user message ordered before the reply
+    insert into chat_messages (session_id, user_id, message, sender, created_at)
+    values
+        (p_session_id, p_user_id, p_user_message, 'user', now()),
+        (p_session_id, p_user_id, p_bot_reply, 'bot', now() + interval '1 millisecond');
+
+    if p_gad7_response is not null then
+        insert into gad7_responses (
+            session_id, user_id, question_number, question_text, user_response, score
+        )
+        values (
+            p_session_id,
+            p_user_id,
+            (p_gad7_response ->> 'question_number')::integer,
+            p_gad7_response ->> 'question_text',
+            p_gad7_response ->> 'user_response',
+            (p_gad7_response ->> 'score')::integer
+        );
+    end if;
+
+    if p_protocol_state is not null then
+        update chat_sessions
+        set protocol_state = p_protocol_state,
+            updated_at = now(),
+            total_score = coalesce(p_total_score, total_score),
+            severity_level = case when p_total_score is null then severity_level else p_severity_level end,
+            protocol_completed = coalesce(protocol_completed, false) or p_completed
+        where id = p_session_id;
+    end if;
+
+    if p_title is not null then
+        update chat_sessions
+        set title = p_title
+        where id = p_session_id
+          and title in ('New Chat', 'GAD-7 Screening');
+    end if;
+
+    return jsonb_build_object('session_id', p_session_id);
+end;
+$$;
+
+grant execute on function public.commit_chat_turn to anon, authenticated, service_role;
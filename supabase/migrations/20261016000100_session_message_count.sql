@@ -0,0 +1,74 @@
+-- Keep a per-session message count on chat_sessions so listing a user's
+-- sessions is one query instead of one count per session.
+
+alter table chat_sessions
+    add column if not exists message_count integer not null default 0;
+
+update chat_sessions s
+set message_count = (
+    select count(*) from chat_messages m where m.session_id = s.id
+);
+
+-- Keyset pagination of a user's sessions by (updated_at, id)
+create index if not exists chat_sessions_user_updated_idx
+    on chat_sessions (user_id, updated_at desc, id desc);
+
+-- Same turn commit as before; the session row is now updated in a single
+-- statement that also bumps message_count by the two messages inserted.
+create or replace function public.commit_chat_turn(
+    p_session_id chat_sessions.id%type,
+    p_user_id chat_sessions.user_id%type,
+    p_user_message text,
+    p_bot_reply text,
+    p_protocol_state text default null,
+    p_total_score integer default null,
+    p_severity_level text default null,
+    p_completed boolean default false,
+    p_gad7_response jsonb default null,
+    p_title text default null
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    v_message_count integer;
+begin
+    -- Explicit timestamps keep the user message ordered before the reply
+    insert into chat_messages (session_id, user_id, message, sender, created_at)
+    values
+        (p_session_id, p_user_id, p_user_message, 'user', now()),
+        (p_session_id, p_user_id, p_bot_reply, 'bot', now() + interval '1 millisecond');
+
+    if p_gad7_response is not null then
+        insert into gad7_responses (
+            session_id, user_id, question_number, question_text, user_response, score
+        )
+        values (
+            p_session_id,
+            p_user_id,
+            (p_gad7_response ->> 'question_number')::integer,
+            p_gad7_response ->> 'question_text',
+            p_gad7_response ->> 'user_response',
+            (p_gad7_response ->> 'score')::integer
+        );
+    end if;
+
+    update chat_sessions
+    set message_count = message_count + 2,
+        protocol_state = coalesce(p_protocol_state, protocol_state),
+        updated_at = case when p_protocol_state is null then updated_at else now() end,
+        total_score = case when p_protocol_state is null then total_score
+                           else coalesce(p_total_score, total_score) end,
+        severity_level = case when p_protocol_state is null or p_total_score is null then severity_level
+                              else p_severity_level end,
+        protocol_completed = coalesce(protocol_completed, false)
+                             or (p_protocol_state is not null and p_completed),
+        title = case when p_title is not null and title in ('New Chat', 'GAD-7 Screening') then p_title
+                     else title end
+    where id = p_session_id
+    returning message_count into v_message_count;
+
+    return jsonb_build_object('session_id', p_session_id, 'message_count', v_message_count);
+end;
+$$;
@@ -0,0 +1,77 @@
+-- Write only what changed in a turn.
+--
+-- The API now tracks which protocol fields changed and sends null for the
+-- rest: protocol_state is only rewritten when the state changed, and the
+-- score/severity only when the score moved. p_touch_session says the turn
+-- went through the protocol (as opposed to a reply to a completed session)
+-- and bumps updated_at even when the state itself is unchanged, so session
+-- ordering is the same as before.
+--
+-- protocol_state is a text column holding an encoded state, so there is no
+-- jsonb_set-style partial update of the document itself.
+
+drop function if exists public.commit_chat_turn(
+    chat_sessions.id%type, chat_sessions.user_id%type, text, text, text,
+    integer, text, boolean, jsonb, text
+);
+
+create or replace function public.commit_chat_turn(
+    p_session_id chat_sessions.id%type,
+    p_user_id chat_sessions.user_id%type,
+    p_user_message text,
+    p_bot_reply text,
+    p_protocol_state text default null,
+    p_touch_session boolean default false,
+    p_total_score integer default null,
+    p_severity_level text default null,
+    p_completed boolean default false,
+    p_gad7_response jsonb default null,
+    p_title text default null
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    v_message_count integer;
+begin
+    -- Explicit timestamps keep the user message ordered before the reply
+    insert into chat_messages (session_id, user_id, message, sender, created_at)
+    values
+        (p_session_id, p_user_id, p_user_message, 'user', now()),
+        (p_session_id, p_user_id, p_bot_reply, 'bot', now() + interval '1 millisecond');
+
+    if p_gad7_response is not null then
+        insert into gad7_responses (
+            session_id, user_id, question_number, question_text, user_response, score
+        )
+        values (
+            p_session_id,
+            p_user_id,
+            (p_gad7_response ->> 'question_number')::integer,
+            p_gad7_response ->> 'question_text',
+            p_gad7_response ->> 'user_response',
+            (p_gad7_response ->> 'score')::integer
+        );
+    end if;
+
+    update chat_sessions
+    set message_count = message_count + 2,
+        protocol_state = coalesce(p_protocol_state, protocol_state),
+        updated_at = case when p_touch_session or p_protocol_state is not null then now()
+                          else updated_at end,
+        total_score = coalesce(p_total_score, total_score),
+        severity_level = case when p_total_score is null then severity_level
+                              else p_severity_level end,
+        protocol_completed = coalesce(protocol_completed, false) or coalesce(p_completed, false),
+        title = case when p_title is not null and title in ('New Chat', 'GAD-7 Screening', 'PHQ-9 Screening')
+                     then p_title
+                     else title end
+    where id = p_session_id
+    returning message_count into v_message_count;
+
+    return jsonb_build_object('session_id', p_session_id, 'message_count', v_message_count);
+end;
+$$;
+
+grant execute on function public.commit_chat_turn to anon, authenticated, service_role;
@@ -0,0 +1,92 @@
+-- Optimistic concurrency for the protocol state.
+--
+-- chat_sessions.state_version is bumped whenever a turn writes the state or
+-- completes the session. The API passes the version it read as
+-- p_expected_version; if another turn committed in between, nothing is
+-- written and the call fails with SQLSTATE PT409, which PostgREST returns
+-- as HTTP 409. The API then re-reads the state and retries the turn.
+
+alter table chat_sessions
+    add column if not exists state_version integer not null default 0;
+
+drop function if exists public.commit_chat_turn(
+    chat_sessions.id%type, chat_sessions.user_id%type, text, text, text,
+    boolean, integer, text, boolean, jsonb, text
+);
+
+create or replace function public.commit_chat_turn(
+    p_session_id chat_sessions.id%type,
+    p_user_id chat_sessions.user_id%type,
+    p_user_message text,
+    p_bot_reply text,
+    p_protocol_state text default null,
+    p_touch_session boolean default false,
+    p_total_score integer default null,
+    p_severity_level text default null,
+    p_completed boolean default false,
+    p_gad7_response jsonb default null,
+    p_title text default null,
+    p_expected_version integer default null
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    v_message_count integer;
+    v_state_version integer;
+begin
+    update chat_sessions
+    set message_count = message_count + 2,
+        protocol_state = coalesce(p_protocol_state, protocol_state),
+        state_version = state_version
+                        + case when p_protocol_state is not null or coalesce(p_completed, false)
+                               then 1 else 0 end,
+        updated_at = case when p_touch_session or p_protocol_state is not null then now()
+                          else updated_at end,
+        total_score = coalesce(p_total_score, total_score),
+        severity_level = case when p_total_score is null then severity_level
+                              else p_severity_level end,
+        protocol_completed = coalesce(protocol_completed, false) or coalesce(p_completed, false),
+        title = case when p_title is not null and title in ('New Chat', 'GAD-7 Screening', 'PHQ-9 Screening')
+                     then p_title
+                     else title end
+    where id = p_session_id
+      and (p_expected_version is null or state_version = p_expected_version)
+    returning message_count, state_version into v_message_count, v_state_version;
+
+    if not found and exists (select 1 from chat_sessions where id = p_session_id) then
+        raise exception 'protocol state of session % changed since it was read', p_session_id
+            using errcode = 'PT409',
+                  hint = 'Reload the session state and retry the turn';
+    end if;
+
+    -- Explicit timestamps keep the user message ordered before the reply
+    insert into chat_messages (session_id, user_id, message, sender, created_at)
+    values
+        (p_session_id, p_user_id, p_user_message, 'user', now()),
+        (p_session_id, p_user_id, p_bot_reply, 'bot', now() + interval '1 millisecond');
+
+    if p_gad7_response is not null then
+        insert into gad7_responses (
+            session_id, user_id, question_number, question_text, user_response, score
+        )
+        values (
+            p_session_id,
+            p_user_id,
+            (p_gad7_response ->> 'question_number')::integer,
+            p_gad7_response ->> 'question_text',
+            p_gad7_response ->> 'user_response',
+            (p_gad7_response ->> 'score')::integer
+        );
+    end if;
+
+    return jsonb_build_object(
+        'session_id', p_session_id,
+        'message_count', v_message_count,
+        'state_version', v_state_version
+    );
+end;
+$$;
+
+grant execute on function public.commit_chat_turn to anon, authenticated, service_role;
@@ -0,0 +1,155 @@
+-- Deferred turn writes (WRITE_BEHIND_PATH in the API).
+--
+-- With the write-behind queue enabled, commit_chat_turn is called with a
+-- null p_bot_reply and no p_gad7_response/p_title: it stores only the user
+-- message and the protocol state, which the next turn depends on, and
+-- returns the user message's created_at. The API queues the bot message,
+-- the gad7_responses row and the title refresh locally and sends them here
+-- in batches with flush_turn_writes.
+--
+-- Queued rows carry their own ids, so a batch that is retried after its
+-- response was lost is ignored instead of duplicated. Rows for sessions
+-- deleted in the meantime are skipped rather than failing the batch.
+
+create or replace function public.commit_chat_turn(
+    p_session_id chat_sessions.id%type,
+    p_user_id chat_sessions.user_id%type,
+    p_user_message text,
+    p_bot_reply text,
+    p_protocol_state text default null,
+    p_touch_session boolean default false,
+    p_total_score integer default null,
+    p_severity_level text default null,
+    p_completed boolean default false,
+    p_gad7_response jsonb default null,
+    p_title text default null,
+    p_expected_version integer default null
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    v_message_count integer;
+    v_state_version integer;
+    v_sent_at timestamptz := now();
+begin
+    update chat_sessions
+    set message_count = message_count + case when p_bot_reply is null then 1 else 2 end,
+        protocol_state = coalesce(p_protocol_state, protocol_state),
+        state_version = state_version
+                        + case when p_protocol_state is not null or coalesce(p_completed, false)
+                               then 1 else 0 end,
+        updated_at = case when p_touch_session or p_protocol_state is not null then now()
+                          else updated_at end,
+        total_score = coalesce(p_total_score, total_score),
+        severity_level = case when p_total_score is null then severity_level
+                              else p_severity_level end,
+        protocol_completed = coalesce(protocol_completed, false) or coalesce(p_completed, false),
+        title = case when p_title is not null and title in ('New Chat', 'GAD-7 Screening', 'PHQ-9 Screening')
+                     then p_title
+                     else title end
+    where id = p_session_id
+      and (p_expected_version is null or state_version = p_expected_version)
+    returning message_count, state_version into v_message_count, v_state_version;
+
+    if not found and exists (select 1 from chat_sessions where id = p_session_id) then
+        raise exception 'protocol state of session % changed since it was read', p_session_id
+            using errcode = 'PT409',
+                  hint = 'Reload the session state and retry the turn';
+    end if;
+
+    insert into chat_messages (session_id, user_id, message, sender, created_at)
+    values (p_session_id, p_user_id, p_user_message, 'user', v_sent_at);
+
+    -- A null reply is queued by the API and stored later by flush_turn_writes
+    if p_bot_reply is not null then
+        insert into chat_messages (session_id, user_id, message, sender, created_at)
+        values (p_session_id, p_user_id, p_bot_reply, 'bot', v_sent_at + interval '1 millisecond');
+    end if;
+
+    if p_gad7_response is not null then
+        insert into gad7_responses (
+            session_id, user_id, question_number, question_text, user_response, score
+        )
+        values (
+            p_session_id,
+            p_user_id,
+            (p_gad7_response ->> 'question_number')::integer,
+            p_gad7_response ->> 'question_text',
+            p_gad7_response ->> 'user_response',
+            (p_gad7_response ->> 'score')::integer
+        );
+    end if;
+
+    return jsonb_build_object(
+        'session_id', p_session_id,
+        'message_count', v_message_count,
+        'state_version', v_state_version,
+        'user_message_at', v_sent_at
+    );
+end;
+$$;
+
+create or replace function public.flush_turn_writes(
+    p_messages jsonb default '[]'::jsonb,
+    p_responses jsonb default '[]'::jsonb,
+    p_titles jsonb default '[]'::jsonb
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    v_messages integer;
+    v_responses integer;
+    v_titles integer;
+begin
+    with inserted as (
+        insert into chat_messages (id, session_id, user_id, message, sender, created_at)
+        select m.id, m.session_id, m.user_id, m.message, m.sender, m.created_at
+        from jsonb_populate_recordset(null::chat_messages, p_messages) as m
+        where exists (select 1 from chat_sessions s where s.id = m.session_id)
+        on conflict (id) do nothing
+        returning session_id
+    ),
+    counted as (
+        select session_id, count(*) as n from inserted group by session_id
+    ),
+    bumped as (
+        update chat_sessions s
+        set message_count = s.message_count + counted.n
+        from counted
+        where s.id = counted.session_id
+        returning counted.n
+    )
+    select coalesce(sum(n), 0) into v_messages from bumped;
+
+    with inserted as (
+        insert into gad7_responses (
+            id, session_id, user_id, question_number, question_text, user_response, score
+        )
+        select r.id, r.session_id, r.user_id, r.question_number, r.question_text, r.user_response, r.score
+        from jsonb_populate_recordset(null::gad7_responses, p_responses) as r
+        where exists (select 1 from chat_sessions s where s.id = r.session_id)
+        on conflict (id) do nothing
+        returning 1
+    )
+    select count(*) into v_responses from inserted;
+
+    update chat_sessions s
+    set title = t.title
+    from jsonb_populate_recordset(null::chat_sessions, p_titles) as t
+    where s.id = t.id
+      and s.title in ('New Chat', 'GAD-7 Screening', 'PHQ-9 Screening');
+    get diagnostics v_titles = row_count;
+
+    return jsonb_build_object(
+        'messages', v_messages,
+        'responses', v_responses,
+        'titles', v_titles
+    );
+end;
+$$;
+
+grant execute on function public.flush_turn_writes to anon, authenticated, service_role;
@@ -0,0 +1,13 @@
+-- Rolling conversation summary per session.
+--
+-- Clarification prompts carry the newest messages that fit the context
+-- token budget. Older messages are folded into conversation_summary once,
+-- in the background; summary_through / summary_through_id is the
+-- (created_at, id) of the last message the summary covers. The API only
+-- replaces a summary whose summary_through_id it read, so two concurrent
+-- folds cannot overwrite each other.
+
+alter table chat_sessions
+    add column if not exists conversation_summary text,
+    add column if not exists summary_through timestamptz,
+    add column if not exists summary_through_id uuid;
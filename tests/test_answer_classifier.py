@@ -0,0 +1,77 @@
+import pytest
+
+from api.answer_classifier import AnswerClassifier
+
+# Replies the classifier settles without the LLM
+SETTLED = [
+    ("yes", "YES"),
+    ("Yes!", "YES"),
+    ("y", "YES"),
+    ("yesss", "YES"),
+    ("yeah definitely", "YES"),
+    ("of course", "YES"),
+    ("absolutely", "YES"),
+    ("I have", "YES"),
+    ("I’ve", "YES"),
+    ("it really has", "YES"),
+    ("no", "NO"),
+    ("No.", "NO"),
+    ("nope", "NO"),
+    ("never", "NO"),
+    ("not really", "NO"),
+    ("absolutely not", "NO"),
+    ("nah not at all", "NO"),
+    ("I haven't", "NO"),
+    ("I have not", "NO"),
+    ("I'm not", "NO"),
+]
+
+# Replies left to the LLM (classify returns None)
+UNSETTLED = [
+    # Hedges
+    "maybe",
+    "sometimes",
+    "kinda",
+    "a little bit",
+    "not sure",
+    "I don't know",
+    "yes but only sometimes",
+    # Contradictions
+    "yes and no",
+    "yes, not at all",
+    "no, I have",
+    # "Not much" usually means a little
+    "not much",
+    "nothing much",
+    # A question back
+    "why?",
+    "am I?",
+    # Unknown words: "no problem" is not a "no"
+    "no problem",
+    "I guess",
+    # No yes-word or statement
+    "I",
+    # Too long to read locally
+    "yes yes yes yes yes yes yes yes yes",
+    "",
+    "   ",
+]
+
+@pytest.mark.parametrize("reply, label", SETTLED)
+def test_settles_clear_answers(reply, label):
+    assert AnswerClassifier().classify(reply) == label
+
+@pytest.mark.parametrize("reply", UNSETTLED)
+def test_leaves_unclear_answers_to_the_llm(reply):
+    assert AnswerClassifier().classify(reply) is None
+
+def test_stats_count_fast_path_and_fallbacks():
+    classifier = AnswerClassifier()
+    for reply in ("yes", "no", "nope", "maybe"):
+        classifier.classify(reply)
+
+    stats = classifier.stats()
+    assert stats["fast_path"] == 3
+    assert stats["fallbacks"] == 1
+    assert stats["fast_path_rate"] == 0.75
+    assert stats["labels"] == {"YES": 1, "NO": 2}
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from api.interpretation_cache import InterpretationCache
+
+# Raw LLM interpretations and the verdict cached for them (None = not cached)
+INTERPRETATIONS = [
+    ("YES", "YES"),
+    ("no", "NO"),
+    (" Unclear. ", "UNCLEAR"),
+    ('"YES"', "YES"),
+    ("YES, they have", None),
+    ("Error: rate limited", None),
+    ("", None),
+]
+
+@pytest.mark.parametrize("interpretation, verdict", INTERPRETATIONS)
+def test_caches_only_exact_verdicts(interpretation, verdict):
+    cache = InterpretationCache()
+    cache.put("GAD7", 1, "kind of", interpretation)
+    assert cache.get("GAD7", 1, "kind of") == verdict
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Kind of...", "kind of"),
+    ("KIND   OF", "kind of"),
+    ("kind of!!", "Kind of"),
+])
+def test_replies_are_normalized(stored, asked):
+    cache = InterpretationCache()
+    cache.put("GAD7", 1, stored, "YES")
+    assert cache.get("GAD7", 1, asked) == "YES"
+
+def test_verdicts_are_per_instrument_and_question():
+    cache = InterpretationCache()
+    cache.put("GAD7", 1, "sort of", "YES")
+    assert cache.get("GAD7", 2, "sort of") is None
+    assert cache.get("PHQ9", 1, "sort of") is None
+
+@pytest.mark.parametrize("reply", ["", "!!!", "x" * (InterpretationCache.MAX_REPLY_LENGTH + 1)])
+def test_empty_and_long_replies_are_not_cached(reply):
+    cache = InterpretationCache()
+    cache.put("GAD7", 1, reply, "YES")
+    assert cache.get("GAD7", 1, reply) is None
+
+def test_journal_is_replayed(tmp_path):
+    path = str(tmp_path / "interpretations.jsonl")
+    InterpretationCache(path=path).put("GAD7", 3, "sort of", "NO")
+    assert InterpretationCache(path=path).get("GAD7", 3, "sort of") == "NO"
+
+def test_entries_without_key_version_are_dropped(tmp_path):
+    path = tmp_path / "interpretations.jsonl"
+    path.write_text(json.dumps({"key": "3:sort of", "verdict": "NO"}) + "\n" + "not json\n")
+
+    cache = InterpretationCache(path=str(path))
+    assert len(cache._cache) == 0
+    assert path.read_text() == ""
+
+def test_journal_is_compacted(tmp_path):
+    path = tmp_path / "interpretations.jsonl"
+    cache = InterpretationCache(maxsize=2, path=str(path))
+    for number in range(1, 6):
+        cache.put("GAD7", number, "sort of", "YES")
+
+    lines = path.read_text().splitlines()
+    assert len(lines) <= 2 * cache._cache.maxsize
+    assert InterpretationCache(maxsize=2, path=str(path)).get("GAD7", 5, "sort of") == "YES"
@@ -0,0 +1,135 @@
+import pytest
+
+from api import instruments
+from api.gad7_protocol import GAD7Protocol
+from api.instruments import GAD7, PHQ9
+from api.protocol_engine import (
+    AGE_SCREENING, CONSENT, CRISIS_SCREENING, FINISHED, FIRST_MESSAGE, FREQUENCY, SYMPTOM, get_engine
+)
+
+def turn(engine, protocol, message):
+    """
+    Play one participant message and return the TurnResult
+
+    Symptom answers are passed as the LLM verdict (YES/NO/UNCLEAR), as
+    main.py does after interpreting them.
+    """
+    state = engine.state(protocol)
+    if message is FIRST_MESSAGE:
+        event, score = FIRST_MESSAGE, None
+    elif state == SYMPTOM:
+        event, score = engine.read_interpretation(message), None
+    else:
+        event, score = engine.read(state, message)
+    return engine.advance(protocol, state, event, score)
+
+def play(engine, protocol, transcript):
+    """Play (state, message, expected reply) steps; a reply of None means the LLM clarifies"""
+    results = []
+    for state, message, reply in transcript:
+        assert engine.state(protocol) == state, f"before {message!r}"
+        result = turn(engine, protocol, message)
+        assert result.reply == reply, f"after {message!r}"
+        results.append(result)
+    return results
+
+def opening(engine):
+    """First message, an unclear age answer, then 18+, not in crisis and consent"""
+    return [
+        (AGE_SCREENING, FIRST_MESSAGE, instruments.AGE_SCREENING),
+        (AGE_SCREENING, "what?", instruments.AGE_RETRY),
+        (AGE_SCREENING, "yes I am", instruments.CRISIS_SCREENING),
+        (CRISIS_SCREENING, "hmm", instruments.CRISIS_RETRY),
+        (CRISIS_SCREENING, "no", instruments.CONSENT),
+        (CONSENT, "yes", instruments.CONSENTED + engine.instrument.questions[0].text),
+    ]
+
+@pytest.mark.parametrize("instrument", [GAD7, PHQ9], ids=lambda instrument: instrument.code)
+def test_full_transcript(instrument):
+    engine = get_engine(instrument.code)
+    protocol = GAD7Protocol()
+    questions = instrument.questions
+    # Odd questions: yes, then frequency options 1-4 in turn; even questions: no.
+    # PHQ-9 item 9 is answered no, so the screening completes.
+    frequencies = ["not at all", "2", "more than half the days", "4"]
+    transcript = opening(engine)
+    expected = []
+    for index, question in enumerate(questions):
+        following = questions[index + 1].text if index + 1 < len(questions) else None
+        if question.number % 2 and question.number not in instrument.crisis_questions:
+            frequency = frequencies[(question.number // 2) % 4]
+            score = instrument.read_frequency(frequency)
+            transcript.append((SYMPTOM, "UNCLEAR", None))
+            transcript.append((SYMPTOM, "YES", instruments.FREQUENCY_QUESTION))
+            transcript.append((FREQUENCY, "often",
+                               instruments.FREQUENCY_RETRY + instruments.FREQUENCY_QUESTION))
+            reply = instruments.NEXT_QUESTION + following if following else None
+            transcript.append((FREQUENCY, frequency, reply))
+        else:
+            score = 0
+            transcript.append((SYMPTOM, "NO", following))
+        expected.append((question.number, question.text, score))
+
+    total = sum(score for _, _, score in expected)
+    transcript[-1] = transcript[-1][:2] + (instrument.completion_message(total),)
+    results = play(engine, protocol, transcript)
+
+    assert [result.response for result in results if result.response] == expected
+    assert results[-1].completed and not results[-1].crisis
+    assert protocol.completed and protocol.total_score == total
+    assert engine.state(protocol) == FINISHED
+    assert not any(result.completed for result in results[:-1])
+
+@pytest.mark.parametrize("instrument", [GAD7, PHQ9], ids=lambda instrument: instrument.code)
+@pytest.mark.parametrize("steps, reply", [
+    ([(AGE_SCREENING, "no")], instruments.UNDERAGE),
+    ([(AGE_SCREENING, "yes"), (CRISIS_SCREENING, "yes")], instruments.CRISIS_MESSAGE),
+    ([(AGE_SCREENING, "yes"), (CRISIS_SCREENING, "no"), (CONSENT, "no thanks")], instruments.DECLINED),
+], ids=["underage", "in crisis", "declined"])
+def test_screening_ends_early(instrument, steps, reply):
+    engine = get_engine(instrument.code)
+    protocol = GAD7Protocol()
+    turn(engine, protocol, FIRST_MESSAGE)
+    for state, message in steps[:-1]:
+        assert engine.state(protocol) == state
+        assert not turn(engine, protocol, message).completed
+
+    state, message = steps[-1]
+    assert engine.state(protocol) == state
+    result = turn(engine, protocol, message)
+    assert result.reply == reply
+    assert result.completed and result.response is None
+    assert protocol.current_question == 0
+
+def answer_until(engine, protocol, number):
+    """Open the screening and answer no up to question `number`"""
+    for _, message, _ in opening(engine)[2:]:
+        turn(engine, protocol, message)
+    while protocol.current_question < number:
+        turn(engine, protocol, "NO")
+
+def test_phq9_item_9_yes_ends_with_crisis_message():
+    engine = get_engine(PHQ9.code)
+    protocol = GAD7Protocol()
+    answer_until(engine, protocol, 9)
+
+    result = turn(engine, protocol, "YES")
+    assert result.reply == instruments.CRISIS_MESSAGE
+    assert result.completed and result.crisis
+    # No frequency is asked and no score stored for item 9
+    assert result.response is None
+    assert not protocol.awaiting_frequency and not protocol.completed
+
+def test_gad7_last_question_yes_asks_frequency():
+    engine = get_engine(GAD7.code)
+    protocol = GAD7Protocol()
+    answer_until(engine, protocol, 7)
+
+    result = turn(engine, protocol, "YES")
+    assert result.reply == instruments.FREQUENCY_QUESTION
+    assert not result.completed and not result.crisis
+    assert engine.state(protocol) == FREQUENCY
+
+def test_unknown_protocol_type_uses_gad7():
+    assert get_engine("nope").instrument is GAD7
+    assert get_engine(None).instrument is GAD7